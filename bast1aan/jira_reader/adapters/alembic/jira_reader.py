@@ -1,20 +1,30 @@
+import asyncio
+import fcntl
+import re
+import time
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
-from os.path import dirname
+from functools import cache
+from os import listdir
+from os.path import dirname, join
 
 import sqlalchemy
 import sqlalchemy.ext.asyncio
 
-from alembic.config import Config
-from alembic.runtime.environment import EnvironmentContext
-from alembic.script import ScriptDirectory
-
 from bast1aan.jira_reader.adapters import sqlstorage
 
+_REVISION = re.compile(r"^(down_revision|revision)\b.*=\s*'(\w+)'", re.MULTILINE)
+
 
 def run_migrations(connection: sqlalchemy.Connection, metadata: sqlalchemy.MetaData) -> None:
     """ version of alembic.command, but using same connection. this is needed
         for in-memory connections.
     """
+    # alembic is slow to import, and not needed when the schema is up to date
+    from alembic.config import Config
+    from alembic.runtime.environment import EnvironmentContext
+    from alembic.script import ScriptDirectory
+
     config = Config()
     config.set_main_option("script_location", dirname(__file__))
     script = ScriptDirectory.from_config(config)
@@ -27,10 +37,68 @@ def run_migrations(connection: sqlalchemy.Connection, metadata: sqlalchemy.MetaD
         with context.begin_transaction():
             context.run_migrations()
 
+@cache
+def head_revision() -> str | None:
+    """ The revision no migration revises, read from the migration scripts without alembic.
+        None if there is not exactly one.
+    """
+    revisions = set()
+    down_revisions = set()
+    versions = join(dirname(__file__), 'versions')
+    for name in listdir(versions):
+        if not name.endswith('.py'):
+            continue
+        with open(join(versions, name), encoding='utf-8') as f:
+            for kind, revision in _REVISION.findall(f.read()):
+                (revisions if kind == 'revision' else down_revisions).add(revision)
+    heads = revisions - down_revisions
+    return heads.pop() if len(heads) == 1 else None
+
+def is_at_head(connection: sqlalchemy.Connection) -> bool:
+    head = head_revision()
+    if not head or not sqlalchemy.inspect(connection).has_table('alembic_version'):
+        return False
+    versions = connection.execute(sqlalchemy.text('SELECT version_num FROM alembic_version')).scalars().all()
+    return versions == [head]
+
+class SchemaNotReady(Exception): pass
+
 @dataclass
 class AlembicSQLInitializer(sqlstorage.SQLInitializer):
-    """ SQL Storage Initializer implemented running Alembic migrations. """
+    """ SQL Storage Initializer implemented running Alembic migrations. Without migrate, the
+        migrations are left to another process, like the migrate entry point, and this only
+        waits up to timeout seconds for the schema to be at head.
+    """
     metadata: sqlalchemy.MetaData
+    migrate: bool = True
+    timeout: float = 60.0
+    poll_interval: float = 0.5
 
     async def __call__(self, conn: sqlalchemy.ext.asyncio.AsyncConnection) -> None:
-        await conn.run_sync(run_migrations, self.metadata)
+        if await conn.run_sync(is_at_head):
+            return
+        if not self.migrate:
+            await self._wait(conn)
+            return
+        async with _migration_lock(conn.engine.url.database):
+            # another process may have migrated while this one waited for the lock
+            if not await conn.run_sync(is_at_head):
+                await conn.run_sync(run_migrations, self.metadata)
+
+    async def _wait(self, conn: sqlalchemy.ext.asyncio.AsyncConnection) -> None:
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            if await conn.run_sync(is_at_head):
+                return
+        raise SchemaNotReady(f'Database schema not at revision {head_revision()} after {self.timeout} seconds')
+
+@asynccontextmanager
+async def _migration_lock(database: str | None):
+    """ Lets one process at a time migrate a database file """
+    if database in (None, '', ':memory:'):
+        yield  # only this process can see it
+        return
+    with open(f'{database}.migrate.lock', 'a') as lock:
+        await asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_EX)
+        yield  # closing the file releases the lock
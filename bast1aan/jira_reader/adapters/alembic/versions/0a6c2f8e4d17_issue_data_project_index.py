@@ -0,0 +1,27 @@
+"""issue data project index
+
+Revision ID: 0a6c2f8e4d17
+Revises: 5b0d9e7f3a21
+Create Date: 2026-10-19 21:05:37.219804
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6c2f8e4d17'
+down_revision: Union[str, None] = '5b0d9e7f3a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # in the order of the issue data pages, so pages of one project are read from the index only
+    op.create_index('ix_issue_data_project_id_issue_computed', 'issue_data', ['project_id', 'issue', 'computed'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_issue_data_project_id_issue_computed', table_name='issue_data')
@@ -0,0 +1,33 @@
+"""timeline_checkpoint
+
+Revision ID: 3f1c9e2a7b6d
+Revises: ab8add0fd4e9
+Create Date: 2026-10-19 14:02:47.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9e2a7b6d'
+down_revision: Union[str, None] = 'ab8add0fd4e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('timeline_checkpoint',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('issue', sa.String(length=255), nullable=False),
+    sa.Column('display_name', sa.String(length=255), nullable=False),
+    sa.Column('checkpoint', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('display_name', 'issue')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('timeline_checkpoint')
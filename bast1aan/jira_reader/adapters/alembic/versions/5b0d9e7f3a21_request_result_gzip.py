@@ -0,0 +1,41 @@
+"""request result gzip
+
+Revision ID: 5b0d9e7f3a21
+Revises: e91b7c3d5f08
+Create Date: 2026-10-19 18:40:12.583014
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0d9e7f3a21'
+down_revision: Union[str, None] = 'e91b7c3d5f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing rows keep their json result and are read from it
+    with op.batch_alter_table('requests') as batch_op:
+        batch_op.add_column(sa.Column('result_gzip', sa.LargeBinary(), nullable=True))
+        batch_op.alter_column('result', existing_type=sa.Text(), nullable=True)
+
+
+def downgrade() -> None:
+    import gzip
+
+    # convert compressed results back to json
+    conn = op.get_bind()
+    rows = conn.execute(sa.text('SELECT id, result_gzip FROM requests WHERE result_gzip IS NOT NULL'))
+    for id_, result_gzip in rows.fetchall():
+        conn.execute(
+            sa.text('UPDATE requests SET result = :result WHERE id = :id'),
+            {'result': gzip.decompress(result_gzip).decode('utf-8'), 'id': id_},
+        )
+    with op.batch_alter_table('requests') as batch_op:
+        batch_op.alter_column('result', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('result_gzip')
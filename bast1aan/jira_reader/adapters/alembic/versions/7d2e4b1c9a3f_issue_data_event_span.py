@@ -0,0 +1,35 @@
+"""issue_data event span
+
+Revision ID: 7d2e4b1c9a3f
+Revises: 3f1c9e2a7b6d
+Create Date: 2026-10-19 15:21:09.532871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e4b1c9a3f'
+down_revision: Union[str, None] = '3f1c9e2a7b6d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing rows get their span when they are recomputed, until then they are selected by computed
+    with op.batch_alter_table('issue_data') as batch_op:
+        batch_op.add_column(sa.Column('first_event', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('last_event', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_issue_data_first_event'), ['first_event'], unique=False)
+        batch_op.create_index(batch_op.f('ix_issue_data_last_event'), ['last_event'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('issue_data') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_issue_data_last_event'))
+        batch_op.drop_index(batch_op.f('ix_issue_data_first_event'))
+        batch_op.drop_column('last_event')
+        batch_op.drop_column('first_event')
@@ -0,0 +1,42 @@
+"""history_packed
+
+Revision ID: ab8add0fd4e9
+Revises: 898cce3383d8
+Create Date: 2026-10-19 10:12:31.417305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ab8add0fd4e9'
+down_revision: Union[str, None] = '898cce3383d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing rows keep their json history and are read from it until they are recomputed
+    with op.batch_alter_table('issue_data') as batch_op:
+        batch_op.add_column(sa.Column('history_packed', sa.LargeBinary(), nullable=True))
+        batch_op.alter_column('history', existing_type=sa.Text(), nullable=True)
+
+
+def downgrade() -> None:
+    from bast1aan.jira_reader import json_mapper
+    from bast1aan.jira_reader.adapters import history_codec
+
+    # convert packed histories back to json
+    conn = op.get_bind()
+    rows = conn.execute(sa.text('SELECT id, history_packed FROM issue_data WHERE history_packed IS NOT NULL'))
+    for id_, history_packed in rows.fetchall():
+        conn.execute(
+            sa.text('UPDATE issue_data SET history = :history WHERE id = :id'),
+            {'history': json_mapper.dumps(history_codec.unpack(history_packed)), 'id': id_},
+        )
+    with op.batch_alter_table('issue_data') as batch_op:
+        batch_op.alter_column('history', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('history_packed')
@@ -0,0 +1,50 @@
+"""timeline index
+
+Revision ID: c4a8f0e61d25
+Revises: 7d2e4b1c9a3f
+Create Date: 2026-10-19 16:40:12.804193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8f0e61d25'
+down_revision: Union[str, None] = '7d2e4b1c9a3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('timeline',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('issue', sa.String(length=255), nullable=False),
+    sa.Column('display_name', sa.String(length=255), nullable=False),
+    sa.Column('start', sa.String(length=40), nullable=False),
+    sa.Column('end', sa.String(length=40), nullable=False),
+    sa.Column('start_ts', sa.Float(), nullable=False),
+    sa.Column('end_ts', sa.Float(), nullable=False),
+    sa.Column('email', sa.Text(), nullable=False),
+    sa.Column('type', sa.String(length=40), nullable=False),
+    sa.Column('issue_summary', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_timeline_display_name'), 'timeline', ['display_name'], unique=False)
+    op.create_index(op.f('ix_timeline_issue'), 'timeline', ['issue'], unique=False)
+    # not part of the metadata, sqlalchemy has no notion of virtual tables
+    op.execute('CREATE VIRTUAL TABLE timeline_rtree USING rtree(id, start_ts, end_ts)')
+    # all issues get indexed on the first timeline query
+    with op.batch_alter_table('issue_data') as batch_op:
+        batch_op.add_column(sa.Column('timelines_indexed', sa.Boolean(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('issue_data') as batch_op:
+        batch_op.drop_column('timelines_indexed')
+    op.execute('DROP TABLE timeline_rtree')
+    op.drop_index(op.f('ix_timeline_issue'), table_name='timeline')
+    op.drop_index(op.f('ix_timeline_display_name'), table_name='timeline')
+    op.drop_table('timeline')
@@ -0,0 +1,31 @@
+"""storage generation
+
+Revision ID: e91b7c3d5f08
+Revises: c4a8f0e61d25
+Create Date: 2026-10-19 17:55:36.271905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e91b7c3d5f08'
+down_revision: Union[str, None] = 'c4a8f0e61d25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    storage_generation = op.create_table('storage_generation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('generation', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(storage_generation, [{'id': 1, 'generation': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('storage_generation')
@@ -1,20 +1,21 @@
 import json
 from typing import ClassVar
 
-import aiohttp
-
 from bast1aan.jira_reader.async_executor import HttpAdapter, JSON
 
 
 class AioHttpAdapter(HttpAdapter):
+    """ aiohttp is only imported on the first request, it is slow to import """
     unix_socket: ClassVar[str] = ''  # to overwrite to connect over unix socket when testing
 
     @property
-    def _connector(self) -> aiohttp.BaseConnector | None:
+    def _connector(self) -> 'aiohttp.BaseConnector | None':
+        import aiohttp
         if self.unix_socket:
             return aiohttp.UnixConnector(self.unix_socket)
 
     async def get(self, url: str, headers: dict[str, str], auth: HttpAdapter.Auth | None = None) -> tuple[int, JSON]:
+        import aiohttp
         if auth.login:
             auth = aiohttp.BasicAuth(login=auth.login, password=auth.password)
         else:
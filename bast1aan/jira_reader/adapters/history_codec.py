@@ -0,0 +1,200 @@
+""" Compact binary encoding of computed ticket histories.
+
+Layout (little endian), version 2:
+    header   magic b'JRHB', version byte
+    strings  count, utf-8 lengths, utf-8 data. Field names and people are stored once.
+    items    count, records of (id, email, display name, created, action offset, action count)
+    actions  count, records of (field, toString, fromString)
+    comments count, records of (id, email, display name, created, updated)
+
+Strings are referenced by index, -1 meaning None. Item ids are -1 for None. Timestamps are
+the wall clock time in microseconds since 1970-01-01 plus the utc offset in seconds, or NAIVE
+for naive datetimes. Version 1 items have no id.
+"""
+import struct
+import sys
+from datetime import datetime, timedelta, timezone
+
+from bast1aan.jira_reader.entities import JSONable
+from bast1aan.jira_reader.jira import ComputeTicketHistory
+
+Item = ComputeTicketHistory.Response.Item
+Action = ComputeTicketHistory.Response.Item.Action
+Comment = ComputeTicketHistory.Response.Comment
+
+MAGIC = b'JRHB'
+VERSION = 2
+NAIVE = -0x80000000
+
+_header = struct.Struct('<4sB')
+_count = struct.Struct('<I')
+_item = struct.Struct('<qiiqiII')
+_item_v1 = struct.Struct('<iiqiII')
+_action = struct.Struct('<iii')
+_comment = struct.Struct('<qiiqiqi')
+
+_EPOCH = datetime(1970, 1, 1)
+_epochs: dict[int, datetime] = {NAIVE: _EPOCH}  # 1970-01-01 in the time zone of each utc offset
+_MICROSECOND = timedelta(microseconds=1)  # multiplying it is faster than constructing timedeltas
+
+
+class HistoryFormatError(ValueError): pass
+
+
+class _Strings:
+    def __init__(self):
+        self.indexes: dict[str, int] = {}
+
+    def __call__(self, s: str | None) -> int:
+        if s is None:
+            return -1
+        if not isinstance(s, str):
+            raise TypeError(f'{s!r} is not a string')
+        index = self.indexes.get(s)
+        if index is None:
+            index = self.indexes[s] = len(self.indexes)
+        return index
+
+
+def _timestamp(dt: datetime | str) -> tuple[int, int]:
+    if isinstance(dt, str):
+        dt = datetime.fromisoformat(dt)
+    if not isinstance(dt, datetime):
+        raise TypeError(f'{dt!r} is not a datetime')
+    offset = dt.utcoffset()
+    wall = dt.replace(tzinfo=None) - _EPOCH
+    return (
+        (wall.days * 86400 + wall.seconds) * 1000000 + wall.microseconds,
+        NAIVE if offset is None else offset.days * 86400 + offset.seconds,
+    )
+
+
+def _datetime(micros: int, offset: int) -> datetime:
+    epoch = _epochs.get(offset)
+    if epoch is None:
+        epoch = _epochs[offset] = _EPOCH.replace(tzinfo=timezone(timedelta(seconds=offset)))
+    # adding to an aware datetime keeps its time zone and adds to the wall clock time
+    return epoch + _MICROSECOND * micros
+
+
+def _get(o: dict | object, name: str) -> object:
+    return o[name] if isinstance(o, dict) else getattr(o, name)
+
+
+def pack(history: JSONable) -> bytes | None:
+    """ Packs a history as computed by ComputeTicketHistory, with items and comments either
+        as dataclasses or as their json representation. Returns None if the history does not
+        have that shape, in which case it should be stored as json instead.
+    """
+    if not isinstance(history, dict) or history.keys() != {'items', 'comments'}:
+        return None
+    strings = _Strings()
+    items = bytearray()
+    actions = bytearray()
+    comments = bytearray()
+    action_count = 0
+    try:
+        for item in history['items']:
+            item_actions = _get(item, 'actions')
+            created, offset = _timestamp(_get(item, 'created'))
+            item_id = item.get('id') if isinstance(item, dict) else item.id  # absent in older histories
+            items += _item.pack(
+                -1 if item_id is None else item_id,
+                strings(_get(item, 'byEmailAddress')),
+                strings(_get(item, 'byDisplayName')),
+                created, offset, action_count, len(item_actions),
+            )
+            for action in item_actions:
+                actions += _action.pack(
+                    strings(_get(action, 'field')),
+                    strings(_get(action, 'toString')),
+                    strings(_get(action, 'fromString')),
+                )
+            action_count += len(item_actions)
+        for comment in history['comments']:
+            comments += _comment.pack(
+                _get(comment, 'id'),
+                strings(_get(comment, 'byEmailAddress')),
+                strings(_get(comment, 'byDisplayName')),
+                *_timestamp(_get(comment, 'created')),
+                *_timestamp(_get(comment, 'updated')),
+            )
+    except (KeyError, AttributeError, TypeError, ValueError, struct.error):
+        return None
+
+    encoded = [s.encode('utf-8') for s in strings.indexes]
+    return b''.join((
+        _header.pack(MAGIC, VERSION),
+        _count.pack(len(encoded)),
+        struct.pack(f'<{len(encoded)}I', *map(len, encoded)),
+        *encoded,
+        _count.pack(len(items) // _item.size), items,
+        _count.pack(action_count), actions,
+        _count.pack(len(comments) // _comment.size), comments,
+    ))
+
+
+def unpack(data: bytes) -> dict[str, list[Item] | list[Comment]]:
+    """ Unpacks a history into ComputeTicketHistory dataclasses. """
+    view = memoryview(data)
+    try:
+        magic, version = _header.unpack_from(view)
+    except struct.error as e:
+        raise HistoryFormatError('Truncated history') from e
+    if magic != MAGIC:
+        raise HistoryFormatError('Not a packed history')
+    if version not in (1, VERSION):
+        raise HistoryFormatError(f'Unsupported history format version {version}')
+    item_struct = _item if version == VERSION else _item_v1
+    pos = _header.size
+
+    try:
+        (count,), pos = _count.unpack_from(view, pos), pos + _count.size
+        lengths = struct.unpack_from(f'<{count}I', view, pos)
+        pos += 4 * count
+        strings: list[str | None] = []
+        for length in lengths:
+            strings.append(sys.intern(str(view[pos:pos + length], 'utf-8')))
+            pos += length
+        strings.append(None)  # index -1
+
+        (count,), pos = _count.unpack_from(view, pos), pos + _count.size
+        item_records = item_struct.iter_unpack(view[pos:pos + count * item_struct.size])
+        if version == 1:
+            item_records = ((-1, *record) for record in item_records)
+        pos += count * item_struct.size
+
+        (count,), pos = _count.unpack_from(view, pos), pos + _count.size
+        actions = [
+            Action(field=strings[field], toString=strings[to_string], fromString=strings[from_string])
+            for field, to_string, from_string in _action.iter_unpack(view[pos:pos + count * _action.size])
+        ]
+        pos += count * _action.size
+
+        items = [
+            Item(
+                byEmailAddress=strings[email],
+                byDisplayName=strings[display_name],
+                created=_datetime(created, offset),
+                actions=actions[action_offset:action_offset + action_count],
+                id=None if id_ == -1 else id_,
+            )
+            for id_, email, display_name, created, offset, action_offset, action_count in item_records
+        ]
+
+        (count,), pos = _count.unpack_from(view, pos), pos + _count.size
+        comments = [
+            Comment(
+                id=id_,
+                byEmailAddress=strings[email],
+                byDisplayName=strings[display_name],
+                created=_datetime(created, created_offset),
+                updated=_datetime(updated, updated_offset),
+            )
+            for id_, email, display_name, created, created_offset, updated, updated_offset
+            in _comment.iter_unpack(view[pos:pos + count * _comment.size])
+        ]
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise HistoryFormatError('Corrupt history') from e
+
+    return {'items': items, 'comments': comments}
@@ -0,0 +1,396 @@
+""" Storage keeping everything in memory, standalone or as a hot tier in front of another storage """
+import bisect
+import gzip
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime
+from itertools import count
+from typing import AsyncIterator, Collection, Iterable, Iterator
+
+from bast1aan.jira_reader import entities, json_mapper, Storage
+from bast1aan.jira_reader.jira import event_span
+
+from . import datetime as datetime_adapter
+
+
+@dataclass
+class _IssueDataRow:
+    id: int
+    data: entities.IssueData
+    first_event: float | None  # timestamps of the event span
+    last_event: float | None
+    timelines_indexed: bool = False
+
+
+class MemoryStorage(Storage):
+    """ Keeps the latest request and all issue data per issue in dicts, with the latest issue
+        data indexed per issue. Entities are returned as stored, without copying, so they must
+        not be changed other than to save them again.
+
+        With a backing storage, every write goes to the backing storage first, and load()
+        fills the memory from it. Reads are only served from memory, so this must then be the
+        only writer of the backing storage. The results of loaded requests are left in the
+        backing storage, and read from there when needed.
+    """
+
+    def __init__(self, backing: Storage | None = None):
+        self.backing = backing
+        self._lock = threading.RLock()
+        self._ids = count(1)
+        self._generation = 0
+        self._latest_requests: dict[str, entities.Request] = {}
+        self._results_gzip: dict[str, bytes] = {}
+        self._results_in_backing: set[str] = set()  # issues whose latest request is loaded without result
+        self._issues: list[str] = []  # requested issues, sorted
+        self._rows: dict[int, _IssueDataRow] = {}  # in order of id
+        self._rows_by_issue: dict[str, list[_IssueDataRow]] = {}
+        self._data_issues: list[str] = []  # issues with issue data, sorted
+        self._latest: dict[str, _IssueDataRow] = {}
+        self._timelines: dict[str, list[tuple[int, entities.Timeline]]] = {}  # by issue
+        self._checkpoints: dict[str, dict[str, entities.TimelineCheckpoint]] = {}  # by display name, issue
+        self._checkpoints_loaded: set[str] = set()  # display names whose checkpoints are read from the backing storage
+
+    async def load(self) -> None:
+        """ Fills the memory from the backing storage. This reads every request without its
+            result, and every issue data with its history, as all of them are read from memory;
+            memory use grows with the issue data of all issues, not only the latest ones.
+            The timeline checkpoints of a person are read when first asked for, as the backing
+            storage only lists them by person.
+        """
+        backing = self.backing
+        if not backing:
+            return
+        after = None
+        while requests := [
+            request async for request in backing.get_request_page(after=after, limit=1000, with_result=False)
+        ]:
+            for request in requests:
+                self._put_request(request, result_in_backing=True)
+            after = requests[-1].issue, requests[-1].requested
+        async for issue_data in backing.get_issue_datas():
+            self._put_issue_data(issue_data)
+        unindexed = {
+            (issue_data.issue, issue_data.computed)
+            async for issue_data in backing.get_unindexed_issue_datas()
+        }
+        timelines = {}
+        async for timeline in backing.get_timelines():
+            timelines.setdefault(timeline.issue, []).append(timeline)
+        with self._lock:
+            for row in self._latest.values():
+                row.timelines_indexed = (row.data.issue, row.data.computed) not in unindexed
+            for issue, issue_timelines in timelines.items():
+                self._timelines[issue] = [(next(self._ids), timeline) for timeline in issue_timelines]
+
+    async def dispose(self) -> None:
+        if self.backing:
+            await self.backing.dispose()
+
+    async def get_latest_request(self, issue: str) -> entities.Request | None:
+        if issue in self._results_in_backing:
+            return await self.backing.get_latest_request(issue)
+        return self._latest_requests.get(issue)
+
+    async def get_latest_result_gzip(self, issue: str) -> bytes | None:
+        if issue in self._results_in_backing:
+            return await self.backing.get_latest_result_gzip(issue)
+        with self._lock:
+            result_gzip = self._results_gzip.get(issue)
+            request = self._latest_requests.get(issue)
+        if result_gzip is None and request:
+            result_gzip = gzip.compress(json_mapper.dumps(request.result).encode('utf-8'), mtime=0)
+            with self._lock:
+                if self._latest_requests.get(issue) is request:
+                    self._results_gzip[issue] = result_gzip
+        return result_gzip
+
+    async def save_request(self, request: entities.Request) -> None:
+        if self.backing:
+            await self.backing.save_request(request)
+        self._put_request(request)
+
+    async def save_requests(self, requests: Iterable[entities.Request]) -> None:
+        requests = list(requests)
+        if self.backing:
+            await self.backing.save_requests(requests)
+        for request in requests:
+            self._put_request(request)
+
+    def _put_request(self, request: entities.Request, result_in_backing: bool = False) -> None:
+        if request.requested is None:
+            request = replace(request, requested=datetime.now())
+        with self._lock:
+            latest = self._latest_requests.get(request.issue)
+            if not latest:
+                bisect.insort(self._issues, request.issue)
+            if not latest or request.requested >= latest.requested:
+                self._latest_requests[request.issue] = request
+                self._results_gzip.pop(request.issue, None)
+                if result_in_backing:
+                    self._results_in_backing.add(request.issue)
+                else:
+                    self._results_in_backing.discard(request.issue)
+
+    async def get_outdated_requests(self, after_issue: str | None = None, limit: int | None = None) -> AsyncIterator[entities.Request]:
+        with self._lock:
+            start = bisect.bisect_right(self._issues, after_issue) if after_issue is not None else 0
+            outdated = []
+            for issue in self._issues[start:]:
+                if limit is not None and len(outdated) >= limit:
+                    break
+                if self._status(issue).history_is_outdated:
+                    outdated.append(self._latest_requests[issue])
+        for request in outdated:
+            yield await self.get_latest_request(request.issue) if request.issue in self._results_in_backing else request
+
+    async def get_issue_data(self, issue: str) -> entities.IssueData | None:
+        row = self._latest.get(issue)
+        return row.data if row else None
+
+    async def get_issue_status(self, issue: str) -> entities.IssueStatus:
+        with self._lock:
+            return self._status(issue)
+
+    async def get_issue_statuses(self) -> AsyncIterator[entities.IssueStatus]:
+        with self._lock:
+            statuses = [self._status(issue) for issue in self._issues]
+        for status in statuses:
+            yield status
+
+    def _status(self, issue: str) -> entities.IssueStatus:
+        request = self._latest_requests.get(issue)
+        row = self._latest.get(issue)
+        return entities.IssueStatus(
+            issue=issue,
+            requested=request.requested if request else None,
+            issue_data=row.data if row else None,
+        )
+
+    async def save_issue_data(self, data: entities.IssueData) -> entities.IssueData:
+        data = _stamped(data)
+        if self.backing:
+            data = await self.backing.save_issue_data(data)
+        return self._put_issue_data(data)
+
+    async def save_issue_datas(self, datas: Iterable[entities.IssueData]) -> None:
+        datas = [_stamped(data) for data in datas]
+        if self.backing:
+            await self.backing.save_issue_datas(datas)
+        for data in datas:
+            self._put_issue_data(data)
+
+    def _put_issue_data(self, data: entities.IssueData) -> entities.IssueData:
+        """ Replaces the row data was loaded from, or else the one of the same issue and
+            computed time, or adds a new row.
+        """
+        span = event_span(data)
+        with self._lock:
+            if data.issue not in self._rows_by_issue:
+                bisect.insort(self._data_issues, data.issue)
+            rows = self._rows_by_issue.setdefault(data.issue, [])
+            row = next((row for row in rows if row.data is data), None) \
+                or next((row for row in rows if row.data.computed == data.computed), None)
+            if row:
+                for other in [other for other in rows if other is not row and other.data.computed == data.computed]:
+                    rows.remove(other)
+                    del self._rows[other.id]
+                row.data = data
+                row.timelines_indexed = False
+            else:
+                row = _IssueDataRow(id=next(self._ids), data=data, first_event=None, last_event=None)
+                rows.append(row)
+                self._rows[row.id] = row
+            row.first_event, row.last_event = (span[0].timestamp(), span[1].timestamp()) if span else (None, None)
+            self._latest[data.issue] = max(rows, key=lambda row: row.data.computed)
+            self._generation += 1
+        return data
+
+    async def get_generation(self) -> int:
+        if self.backing:
+            return await self.backing.get_generation()
+        return self._generation
+
+    async def get_issue_datas(self) -> AsyncIterator[entities.IssueData]:
+        with self._lock:
+            datas = [row.data for row in self._rows.values()]
+        for data in datas:
+            yield data
+
+    async def get_recent_issue_datas(self, from_: datetime | None = None, to_: datetime | None = None) -> AsyncIterator[entities.IssueData]:
+        from_ts = from_.timestamp() if from_ else None
+        to_ts = to_.timestamp() if to_ else None
+
+        def in_window(row: _IssueDataRow) -> bool:
+            if from_ts is not None:
+                # rows without an event span fall back to when they were computed
+                last = row.last_event if row.last_event is not None else row.data.computed.timestamp()
+                if last < from_ts:
+                    return False
+            return to_ts is None or row.first_event is None or row.first_event < to_ts
+
+        for row in self._latest_rows():
+            if in_window(row):
+                yield row.data
+
+    async def get_unindexed_issue_datas(self, limit: int | None = None) -> AsyncIterator[entities.IssueData]:
+        rows = [row for row in self._latest_rows() if not row.timelines_indexed]
+        for row in rows[:limit]:
+            yield row.data
+
+    async def get_issue_data_page(
+            self,
+            after: tuple[str, datetime] | None = None,
+            limit: int = 100,
+            filter: entities.IssueDataFilter | None = None,
+            latest_only: bool = False,
+            with_history: bool = True
+    ) -> AsyncIterator[entities.IssueData]:
+        filter = filter or entities.IssueDataFilter()
+
+        def selected(data: entities.IssueData) -> bool:
+            if filter.project_id is not None and data.project_id != filter.project_id:
+                return False
+            return _within(data.created, filter.created_from, filter.created_to) \
+                and _within(data.computed, filter.computed_from, filter.computed_to)
+
+        page = []
+        with self._lock:
+            start = bisect.bisect_left(self._data_issues, after[0]) if after else 0
+            # without copying the rest of the issues, so a page costs the same anywhere
+            for issue in _from(self._data_issues, start):
+                if latest_only:
+                    row = self._latest.get(issue)
+                    datas = [row.data] if row else []
+                else:
+                    datas = sorted((row.data for row in self._rows_by_issue.get(issue, ())), key=lambda data: data.computed)
+                for data in datas:
+                    if after and (data.issue, _wall_clock(data.computed)) <= (after[0], _wall_clock(after[1])):
+                        continue
+                    if selected(data):
+                        page.append(data)
+                if len(page) >= limit:
+                    break
+        for data in page[:limit]:
+            yield data if with_history else replace(data, history=None)
+
+    async def get_request_page(
+            self,
+            after: tuple[str, datetime] | None = None,
+            limit: int = 100,
+            issue: str | None = None,
+            requested_from: datetime | None = None,
+            requested_to: datetime | None = None,
+            with_result: bool = True
+    ) -> AsyncIterator[entities.Request]:
+        if self.backing:
+            # only the latest request of each issue is kept, the others are in the backing storage
+            async for request in self.backing.get_request_page(
+                after, limit, issue, requested_from, requested_to, with_result
+            ):
+                yield request
+            return
+        page = []
+        with self._lock:
+            start = bisect.bisect_left(self._issues, after[0]) if after else 0
+            for request_issue in _from(self._issues, start):
+                if len(page) >= limit:
+                    break
+                request = self._latest_requests[request_issue]
+                if after and (request.issue, _wall_clock(request.requested)) <= (after[0], _wall_clock(after[1])):
+                    continue
+                if issue is not None and request.issue != issue:
+                    continue
+                if _within(request.requested, requested_from, requested_to):
+                    page.append(request)
+        for request in page:
+            yield request if with_result else replace(request, result=None)
+
+    def _latest_rows(self) -> list[_IssueDataRow]:
+        with self._lock:
+            return sorted(self._latest.values(), key=lambda row: row.id)
+
+    async def save_timelines(self, issue_data: entities.IssueData, timelines: Iterable[entities.Timeline]) -> None:
+        timelines = list(timelines)
+        if self.backing:
+            await self.backing.save_timelines(issue_data, timelines)
+        with self._lock:
+            self._timelines[issue_data.issue] = [(next(self._ids), timeline) for timeline in timelines]
+            for row in self._rows_by_issue.get(issue_data.issue, ()):
+                if row.data.computed == issue_data.computed:
+                    row.timelines_indexed = True
+            self._generation += 1
+
+    async def get_timelines(
+            self,
+            display_name: str | None = None,
+            issue: str | None = None,
+            from_: datetime | None = None,
+            to_: datetime | None = None,
+            display_names: Collection[str] | None = None
+    ) -> AsyncIterator[entities.Timeline]:
+        from_ts = from_.timestamp() if from_ else None
+        to_ts = to_.timestamp() if to_ else None
+        if display_names is not None:
+            display_names = set(display_names)
+        with self._lock:
+            if issue is not None:
+                indexed = list(self._timelines.get(issue, ()))
+            else:
+                indexed = sorted(
+                    (entry for issue_timelines in self._timelines.values() for entry in issue_timelines),
+                    key=lambda entry: entry[0]
+                )
+        for _, timeline in indexed:
+            if display_name is not None and timeline.display_name != display_name:
+                continue
+            if display_names is not None and timeline.display_name not in display_names:
+                continue
+            if from_ts is not None and timeline.end.timestamp() < from_ts:
+                continue
+            if to_ts is not None and timeline.start.timestamp() >= to_ts:
+                continue
+            yield timeline
+
+    async def get_timeline_checkpoints(self, display_name: str) -> AsyncIterator[entities.TimelineCheckpoint]:
+        if self.backing and display_name not in self._checkpoints_loaded:
+            loaded = {
+                checkpoint.issue: checkpoint
+                async for checkpoint in self.backing.get_timeline_checkpoints(display_name)
+            }
+            with self._lock:
+                # those saved meanwhile are at least as new as the ones read
+                loaded.update(self._checkpoints.get(display_name, {}))
+                self._checkpoints[display_name] = loaded
+                self._checkpoints_loaded.add(display_name)
+        with self._lock:
+            checkpoints = list(self._checkpoints.get(display_name, {}).values())
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def save_timeline_checkpoints(self, checkpoints: Iterable[entities.TimelineCheckpoint]) -> None:
+        checkpoints = list(checkpoints)
+        if self.backing:
+            await self.backing.save_timeline_checkpoints(checkpoints)
+        with self._lock:
+            for checkpoint in checkpoints:
+                self._checkpoints.setdefault(checkpoint.display_name, {})[checkpoint.issue] = checkpoint
+
+
+def _stamped(data: entities.IssueData) -> entities.IssueData:
+    # before saving to either tier, so both have the same computed time to find the row by
+    return data if data.computed is not None else replace(data, computed=datetime_adapter.now())
+
+def _from(items: list[str], start: int) -> Iterator[str]:
+    return (items[index] for index in range(start, len(items)))
+
+def _wall_clock(dt: datetime | None) -> datetime | None:
+    """ Times compared as the sql storage stores them, without time zone """
+    return dt.replace(tzinfo=None) if dt else dt
+
+def _within(dt: datetime | None, from_: datetime | None, to_: datetime | None) -> bool:
+    if from_ is None and to_ is None:
+        return True
+    if dt is None:
+        return False
+    dt = _wall_clock(dt)
+    return (from_ is None or dt >= _wall_clock(from_)) and (to_ is None or dt < _wall_clock(to_))
@@ -0,0 +1,97 @@
+""" Response cache tier in a local SQLite file, shared by all worker processes on a host """
+import sqlite3
+import threading
+import time
+
+from bast1aan.jira_reader.response_cache import SharedCache, CachedResponse
+
+
+class SQLiteSharedCache(SharedCache):
+    """ Responses in a SQLite file, the least recently used ones removed beyond max_bytes.
+
+        The file only holds rendered output; it can be deleted at any time, and should be
+        when the database is replaced, as generations then start over.
+
+        One connection is shared by the threads of the process, one at a time; close() closes it.
+    """
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, busy_timeout: float = 1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        try:
+            self._connection = self._connect()
+        except sqlite3.DatabaseError:
+            # unavailable, the shared tier is only an optimization
+            pass
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False
+        )
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS response ('
+                ' key TEXT PRIMARY KEY, generation INTEGER NOT NULL, etag TEXT NOT NULL,'
+                ' body BLOB NOT NULL, used REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS response_used ON response (used)')
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection:
+                self._connection.close()
+                self._connection = None
+
+    def get(self, key: str, generation: int) -> CachedResponse | None:
+        with self._lock:
+            if not self._connection:
+                return None
+            try:
+                row = self._connection.execute(
+                    'SELECT etag, body FROM response WHERE key = ? AND generation = ?', (key, generation)
+                ).fetchone()
+                if row:
+                    self._connection.execute('UPDATE response SET used = ? WHERE key = ?', (time.time(), key))
+            except sqlite3.DatabaseError:
+                # busy, unavailable or corrupt, the shared tier is only an optimization
+                return None
+        return CachedResponse(body=row[1], etag=row[0]) if row else None
+
+    def put(self, key: str, generation: int, response: CachedResponse) -> None:
+        if len(response.body) > self.max_bytes:
+            return
+        with self._lock:
+            connection = self._connection
+            if not connection:
+                return
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    connection.execute(
+                        'INSERT OR REPLACE INTO response (key, generation, etag, body, used) VALUES (?, ?, ?, ?, ?)',
+                        (key, generation, response.etag, response.body, time.time())
+                    )
+                    # responses of older generations are never read again
+                    connection.execute('DELETE FROM response WHERE generation < ?', (generation,))
+                    size = connection.execute('SELECT COALESCE(SUM(LENGTH(body)), 0) FROM response').fetchone()[0]
+                    if size > self.max_bytes:
+                        for evict_key, length in connection.execute(
+                                'SELECT key, LENGTH(body) FROM response ORDER BY used').fetchall():
+                            if size <= self.max_bytes:
+                                break
+                            connection.execute('DELETE FROM response WHERE key = ?', (evict_key,))
+                            size -= length
+                    connection.execute('COMMIT')
+                except BaseException:
+                    connection.execute('ROLLBACK')
+                    raise
+            except sqlite3.DatabaseError:
+                pass
@@ -1,19 +1,30 @@
+import asyncio
+import fcntl
+import gzip
+import hashlib
 import json
+import threading
 from abc import ABC, abstractmethod
-from dataclasses import InitVar, dataclass
-from datetime import datetime
+from dataclasses import InitVar, dataclass, fields
+from datetime import datetime, timezone
 from functools import cached_property, reduce
-from typing import AsyncIterator
+from itertools import islice
+from typing import AsyncIterator, ClassVar, Collection, Sequence, Iterable, Iterator, TextIO, TypeVar
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncConnection, AsyncSession, async_sessionmaker
 from typing_extensions import Self
 
-from sqlalchemy import String, Text, select, UniqueConstraint, DateTime, Integer, text
+from sqlalchemy import String, Text, select, UniqueConstraint, DateTime, Integer, LargeBinary, text, event, make_url, \
+    insert, update, func, literal, Float, Boolean, delete, Index, bindparam, TextClause, URL
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import DeclarativeBase, mapped_column, Mapped
 
 from bast1aan.jira_reader import settings, entities, Storage, json_mapper
+from bast1aan.jira_reader.jira import event_span
 
-from . import datetime as datetime_adapter
+from . import datetime as datetime_adapter, history_codec
+
+T = TypeVar('T')
 
 def _get_aio_url() -> str:
     url: str = settings.SQLSTORAGE_SQLITE
@@ -21,6 +32,48 @@ def _get_aio_url() -> str:
     return reduce(lambda a, b: a.replace(b[0], b[1]), replaces.items(), url)
 
 
+@dataclass(frozen=True)
+class SQLiteProfile:
+    """ Connection settings applied to every SQLite connection of the engine.
+        WAL lets readers continue while a write is in progress.
+    """
+    JOURNAL_MODES: ClassVar[frozenset[str]] = frozenset({'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'})
+    SYNCHRONOUS: ClassVar[frozenset[str]] = frozenset({'OFF', 'NORMAL', 'FULL', 'EXTRA'})
+
+    journal_mode: str = 'WAL'
+    synchronous: str = 'NORMAL'
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size: int = -64 * 1024  # negative is in KiB, see sqlite docs
+    busy_timeout: int = 5000  # milliseconds
+    pool_size: int = 8
+
+    def __post_init__(self):
+        if self.journal_mode.upper() not in self.JOURNAL_MODES:
+            raise ValueError(f'Invalid journal mode {self.journal_mode}')
+        if self.synchronous.upper() not in self.SYNCHRONOUS:
+            raise ValueError(f'Invalid synchronous setting {self.synchronous}')
+
+    @classmethod
+    def from_settings(cls) -> Self:
+        """ Defaults, overridable with SQLSTORAGE_SQLITE_<FIELD> settings. """
+        kwargs = {}
+        for field in fields(cls):
+            value = getattr(settings, f'SQLSTORAGE_SQLITE_{field.name.upper()}')
+            if value is not None:
+                kwargs[field.name] = int(value) if field.type is int else value
+        return cls(**kwargs)
+
+    @property
+    def pragmas(self) -> Sequence[str]:
+        return (
+            f'PRAGMA journal_mode={self.journal_mode.upper()}',
+            f'PRAGMA synchronous={self.synchronous.upper()}',
+            f'PRAGMA mmap_size={int(self.mmap_size)}',
+            f'PRAGMA cache_size={int(self.cache_size)}',
+            f'PRAGMA busy_timeout={int(self.busy_timeout)}',
+        )
+
+
 class Base(DeclarativeBase):
     entity: object
 
@@ -33,61 +86,146 @@ class Request(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     issue: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
     requested: Mapped[datetime] = mapped_column(DateTime(), index=True, nullable=False)
-    result: Mapped[str] = mapped_column(Text(), nullable=False)
+    result: Mapped[str | None] = mapped_column(Text(), nullable=True)
+    # the json result, gzip compressed, so it can also be served as is. Rows written before
+    # it was introduced only have result.
+    result_gzip: Mapped[bytes | None] = mapped_column(LargeBinary(), nullable=True)
+
+    # what entity needs, for reading rows without the orm
+    ENTITY_COLUMNS: ClassVar[tuple[str, ...]] = ('issue', 'requested', 'result', 'result_gzip')
 
     @property
     def entity(self) -> entities.Request:
+        return self.entity_from_row(tuple(getattr(self, name) for name in self.ENTITY_COLUMNS))
+
+    @staticmethod
+    def entity_from_row(row: Sequence) -> entities.Request:
+        """ The entity of a row of ENTITY_COLUMNS, or only of issue and requested for one without result """
+        issue, requested, *results = row
+        if not results:
+            return entities.Request(issue=issue, requested=requested, result=None)
+        result, result_gzip = results
         return entities.Request(
-            issue=self.issue,
-            requested=self.requested,
-            result=json.loads(self.result)
+            issue=issue,
+            requested=requested,
+            result=json.loads(gzip.decompress(result_gzip) if result_gzip is not None else result)
         )
 
     @classmethod
     def from_entity(cls, entity: entities.Request) -> Self:
-        return cls(
+        return cls(**cls.values_from_entity(entity))
+
+    @staticmethod
+    def values_from_entity(entity: entities.Request) -> dict[str, object]:
+        return dict(
             issue=entity.issue,
             requested=entity.requested or datetime.now(),
-            result=json_mapper.dumps(entity.result)
+            result=None,
+            result_gzip=gzip.compress(json_mapper.dumps(entity.result).encode('utf-8'), compresslevel=6, mtime=0),
         )
 
-@dataclass
+@dataclass(eq=False)  # keep the comparison of IssueData
 class SQLIssueDataEntity(entities.IssueData):
     id: InitVar[int | None] = None
+    history_hash: InitVar[bytes | None] = None
 
-    def __post_init__(self, id: int | None):
+    def __post_init__(self, id: int | None, history_hash: bytes | None):
         self.__id = id
+        self.__history_hash = history_hash
+
+    @property
+    def history(self) -> entities.JSONable:
+        # the history could be changed in place by whoever reads it, so the hash of the stored
+        # history only holds until then
+        self.__history_hash = None
+        return self.__history
+
+    @history.setter
+    def history(self, history: entities.JSONable) -> None:
+        self.__history = history
+        self.__history_hash = None
 
     def get_id(self) -> int | None:
         return self.__id
 
+    def content_hash(self, field_name: str) -> bytes | None:
+        return self.__history_hash if field_name == 'history' else None
+
 class IssueData(Base):
     __tablename__ = 'issue_data'
     __table_args__ = (
         UniqueConstraint('issue', 'computed'),
+        Index('ix_issue_data_project_id_issue_computed', 'project_id', 'issue', 'computed'),
     )
     id: Mapped[int] = mapped_column(primary_key=True)
     issue: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
     computed: Mapped[datetime] = mapped_column(DateTime(), index=True, nullable=False)
-    history: Mapped[str] = mapped_column(Text(), nullable=False)
+    history: Mapped[str | None] = mapped_column(Text(), nullable=True)
+    # history in the format of history_codec. Rows written before it was introduced, or histories
+    # not shaped like ComputeTicketHistory's, are stored in the json history column instead.
+    history_packed: Mapped[bytes | None] = mapped_column(LargeBinary(), nullable=True)
     issue_id: Mapped[int] = mapped_column(Integer(), nullable=True)
     project_id: Mapped[int] = mapped_column(Integer(), nullable=True)
     summary: Mapped[str] = mapped_column(Text(), nullable=True)
     created: Mapped[datetime] = mapped_column(DateTime(), nullable=True)
     created_by: Mapped[str] = mapped_column(Text(), nullable=True)
+    # span of the history events in utc, for selecting issues by time window
+    first_event: Mapped[datetime | None] = mapped_column(DateTime(), index=True, nullable=True)
+    last_event: Mapped[datetime | None] = mapped_column(DateTime(), index=True, nullable=True)
+    # whether the timelines calculated from this data are in the timeline table
+    timelines_indexed: Mapped[bool] = mapped_column(Boolean(), nullable=False, default=False, server_default='0')
+
+    # what entity needs, for reading rows without the orm
+    ENTITY_COLUMNS: ClassVar[tuple[str, ...]] = (
+        'id', 'issue', 'computed', 'history', 'history_packed', 'issue_id', 'project_id', 'summary', 'created',
+        'created_by',
+    )
 
     @property
     def entity(self) -> SQLIssueDataEntity:
+        return self.entity_from_row(tuple(getattr(self, name) for name in self.ENTITY_COLUMNS))
+
+    # ENTITY_COLUMNS without the history
+    SUMMARY_COLUMNS: ClassVar[tuple[str, ...]] = (
+        'issue', 'computed', 'issue_id', 'project_id', 'summary', 'created', 'created_by',
+    )
+
+    @staticmethod
+    def summary_from_row(row: Sequence) -> entities.IssueData:
+        """ The entity of a row of SUMMARY_COLUMNS, without history """
+        issue, computed, issue_id, project_id, summary, created, created_by = row
+        return entities.IssueData(
+            issue=issue,
+            computed=computed,
+            history=None,
+            issue_id=issue_id,
+            project_id=project_id,
+            summary=summary,
+            created=created,
+            created_by=created_by,
+        )
+
+    @staticmethod
+    def entity_from_row(row: Sequence) -> SQLIssueDataEntity:
+        """ The entity of a row of ENTITY_COLUMNS """
+        id_, issue, computed, history, history_packed, issue_id, project_id, summary, created, created_by = row
+        if history_packed is not None:
+            history_value = history_codec.unpack(history_packed)
+            stored = history_packed
+        else:
+            history_value = json.loads(history)
+            stored = history.encode('utf-8')
         return SQLIssueDataEntity(
-            id=self.id,
-            issue=self.issue,
-            computed=self.computed,
-            history=json.loads(self.history),
-            issue_id=self.issue_id,
-            project_id=self.project_id,
-            summary=self.summary,
-            created=self.created,
-            created_by=self.created_by,
+            id=id_,
+            issue=issue,
+            computed=computed,
+            history=history_value,
+            history_hash=hashlib.blake2b(stored, digest_size=16).digest(),
+            issue_id=issue_id,
+            project_id=project_id,
+            summary=summary,
+            created=created,
+            created_by=created_by,
         )
 
     @classmethod
@@ -97,35 +235,234 @@ class IssueData(Base):
         return self
 
     def update_from_entity(self, entity: entities.IssueData) -> None:
-        self.issue = entity.issue
-        self.computed = entity.computed or datetime_adapter.now()
-        self.history = json_mapper.dumps(entity.history)
-        self.issue_id = entity.issue_id
-        self.project_id = entity.project_id
-        self.summary = entity.summary
-        self.created = entity.created
-        self.created_by = entity.created_by
+        for name, value in self.values_from_entity(entity).items():
+            setattr(self, name, value)
+
+    @staticmethod
+    def values_from_entity(entity: entities.IssueData) -> dict[str, object]:
+        history_packed = history_codec.pack(entity.history)
+        span = event_span(entity)
+        return dict(
+            issue=entity.issue,
+            computed=entity.computed or datetime_adapter.now(),
+            history_packed=history_packed,
+            history=json_mapper.dumps(entity.history) if history_packed is None else None,
+            issue_id=entity.issue_id,
+            project_id=entity.project_id,
+            summary=entity.summary,
+            created=entity.created,
+            created_by=entity.created_by,
+            first_event=_utc(span[0]) if span else None,
+            last_event=_utc(span[1]) if span else None,
+            timelines_indexed=False,
+        )
+
+class TimelineCheckpoint(Base):
+    __tablename__ = 'timeline_checkpoint'
+    __table_args__ = (
+        UniqueConstraint('display_name', 'issue'),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    issue: Mapped[str] = mapped_column(String(255), nullable=False)
+    display_name: Mapped[str] = mapped_column(String(255), nullable=False)
+    # the rest of the checkpoint as json, keeping the time zones of its datetimes
+    checkpoint: Mapped[str] = mapped_column(Text(), nullable=False)
+
+    @property
+    def entity(self) -> entities.TimelineCheckpoint:
+        checkpoint = json.loads(self.checkpoint)
+        return entities.TimelineCheckpoint(
+            issue=self.issue,
+            display_name=self.display_name,
+            processed=datetime.fromisoformat(checkpoint['processed']),
+            item_count=checkpoint['item_count'],
+            states={name: datetime.fromisoformat(since) for name, since in checkpoint['states'].items()},
+            state_added={name: datetime.fromisoformat(added) for name, added in checkpoint['state_added'].items()},
+            digest=checkpoint.get('digest', ''),
+        )
+
+    @staticmethod
+    def values_from_entity(entity: entities.TimelineCheckpoint) -> dict[str, object]:
+        return dict(
+            issue=entity.issue,
+            display_name=entity.display_name,
+            checkpoint=json_mapper.dumps({
+                'processed': entity.processed,
+                'item_count': entity.item_count,
+                'states': entity.states,
+                'state_added': entity.state_added,
+                'digest': entity.digest,
+            }),
+        )
+
+class Timeline(Base):
+    """ Timelines calculated from the latest issue data of every issue, for all people on it.
+        Their time spans are indexed in the timeline_rtree R*Tree, by the same id.
+    """
+    __tablename__ = 'timeline'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    issue: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
+    display_name: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
+    # isoformat, keeping the time zone
+    start: Mapped[str] = mapped_column(String(40), nullable=False)
+    end: Mapped[str] = mapped_column(String(40), nullable=False)
+    # posix timestamps
+    start_ts: Mapped[float] = mapped_column(Float(), nullable=False)
+    end_ts: Mapped[float] = mapped_column(Float(), nullable=False)
+    email: Mapped[str] = mapped_column(Text(), nullable=False)
+    type: Mapped[str] = mapped_column(String(40), nullable=False)
+    issue_summary: Mapped[str | None] = mapped_column(Text(), nullable=True)
+
+    @property
+    def entity(self) -> entities.Timeline:
+        return entities.Timeline(
+            issue=self.issue,
+            start=datetime.fromisoformat(self.start),
+            end=datetime.fromisoformat(self.end),
+            display_name=self.display_name,
+            email=self.email,
+            type=self.type,
+            issue_summary=self.issue_summary,
+        )
+
+    @staticmethod
+    def values_from_entity(entity: entities.Timeline) -> dict[str, object]:
+        return dict(
+            issue=entity.issue,
+            display_name=entity.display_name,
+            start=entity.start.isoformat(),
+            end=entity.end.isoformat(),
+            start_ts=entity.start.timestamp(),
+            end_ts=entity.end.timestamp(),
+            email=entity.email,
+            type=entity.type,
+            issue_summary=entity.issue_summary,
+        )
+
+class StorageGeneration(Base):
+    """ A single row, counting the saves of issue data by any process """
+    __tablename__ = 'storage_generation'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    generation: Mapped[int] = mapped_column(Integer(), nullable=False)
+
+    @classmethod
+    def bump(cls):
+        return update(cls).values(generation=cls.generation + 1)
 
 class SQLInitializer(ABC):
     @abstractmethod
     async def __call__ (self, conn: AsyncConnection) -> None:...
 
+def _utc(dt: datetime) -> datetime:
+    """ Naive utc time, naive datetimes taken as local time """
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _select_text(sql: str, model: type[Base], names: Sequence[str], params: dict[str, object] | None) -> TextClause:
+    """ sql selecting {columns}, the names of the columns of model, with their types, also of
+        the datetime parameters, so they are compared in the format they are stored in.
+    """
+    table = model.__table__
+    columns = [table.c[name] for name in names]
+    stmt = text(sql.format(columns=', '.join(f'{table.name}.{name}' for name in names)))
+    datetime_params = [bindparam(name, type_=DateTime()) for name, value in (params or {}).items()
+                       if isinstance(value, datetime)]
+    if datetime_params:
+        stmt = stmt.bindparams(*datetime_params)
+    return stmt.columns(*columns)
+
+def _batched(iterable: Iterable[T], n: int) -> Iterator[list[T]]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
+
+class OtherWriter(Exception): pass
+
 class SQLStorage(Storage):
-    def __init__(self, sql_initializer: SQLInitializer):
+    BATCH_SIZE: ClassVar[int] = 500  # rows per transaction in bulk saves
+
+    def __init__(self, sql_initializer: SQLInitializer, sqlite_profile: SQLiteProfile | None = None):
         self._sql_initializer = sql_initializer
+        self._sqlite_profile = sqlite_profile or SQLiteProfile.from_settings()
+        self._engines: dict[asyncio.AbstractEventLoop | None, AsyncEngine] = {}
+        self._sessions: dict[AsyncEngine, async_sessionmaker[AsyncSession]] = {}
+        self._engines_lock = threading.Lock()
+        self._writer_lock: TextIO | None = None
+
+    def claim_writer(self, only: bool = False) -> None:
+        """ Registers this process as a writer of the database file until it exits. With only,
+            no other process may write, which fails with OtherWriter if one already does.
+        """
+        if self._url.database in (None, '', ':memory:') or self._writer_lock:
+            return
+        lock = open(f'{self._url.database}.writer.lock', 'a')
+        try:
+            fcntl.flock(lock, (fcntl.LOCK_EX if only else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            raise OtherWriter(
+                f'{self._url.database} is already written by another process' if only
+                else f'{self._url.database} is written by another process that must be its only writer'
+            )
+        self._writer_lock = lock  # closing the file releases the lock
 
     async def set_up(self) -> None:
         async with self._async_engine.begin() as conn:
             conn: AsyncConnection
             await self._sql_initializer(conn)
 
+    async def dispose(self) -> None:
+        """ Closes the connections of the running event loop """
+        with self._engines_lock:
+            engine = self._engines.pop(self._loop_key(), None)
+            self._sessions.pop(engine, None)
+        if engine:
+            await engine.dispose()
+
     @cached_property
+    def _url(self) -> URL:
+        return make_url(_get_aio_url())
+
+    def _loop_key(self) -> asyncio.AbstractEventLoop | None:
+        # an in-memory database exists only in the single connection of its engine
+        return None if self._url.database in (None, '', ':memory:') else asyncio.get_running_loop()
+
+    @property
     def _async_engine(self) -> AsyncEngine:
-        return create_async_engine(_get_aio_url())
+        """ The engine of the running event loop. Pooled connections belong to the loop that
+            opened them, and the pipeline, sync and webhook threads each run their own loop.
+        """
+        key = self._loop_key()
+        engine = self._engines.get(key)
+        if engine:
+            return engine
+        with self._engines_lock:
+            for loop in [loop for loop in self._engines if loop and loop.is_closed()]:
+                # their connections can not be closed anymore without their loop
+                self._sessions.pop(self._engines.pop(loop), None)
+            engine = self._engines.get(key)
+            if not engine:
+                kwargs = {}
+                if key is not None:
+                    kwargs.update(pool_size=self._sqlite_profile.pool_size, max_overflow=0)
+                engine = self._engines[key] = create_async_engine(self._url, **kwargs)
+                event.listen(engine.sync_engine, 'connect', self._on_connect)
+            return engine
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in self._sqlite_profile.pragmas:
+            cursor.execute(pragma)
+        cursor.close()
 
     @property
     def _async_session(self) -> async_sessionmaker[AsyncSession]:
-        return async_sessionmaker(self._async_engine, expire_on_commit=False)
+        engine = self._async_engine
+        session = self._sessions.get(engine)
+        if not session:
+            session = self._sessions[engine] = async_sessionmaker(engine, expire_on_commit=False)
+        return session
 
     async def get_latest_request(self, issue: str) -> entities.Request | None:
         async with self._async_session() as session:
@@ -133,53 +470,361 @@ class SQLStorage(Storage):
             model = await session.scalar(stmt)
             return model.entity if model else None
 
+    async def get_latest_result_gzip(self, issue: str) -> bytes | None:
+        stmt = select(Request.result, Request.result_gzip).where(Request.issue == issue) \
+            .order_by(Request.requested.desc()).limit(1)
+        async with self._async_session() as session:
+            row = (await session.execute(stmt)).first()
+        if not row:
+            return None
+        result, result_gzip = row
+        return result_gzip if result_gzip is not None else gzip.compress(result.encode('utf-8'), mtime=0)
+
     async def save_request(self, request: entities.Request) -> None:
         async with self._async_session() as session:
             request_model = Request.from_entity(request)
             session.add(request_model)
             await session.commit()
 
+    async def get_outdated_requests(self, after_issue: str | None = None, limit: int | None = None) -> AsyncIterator[entities.Request]:
+        where = ''
+        limit_clause = ''
+        params = {}
+        if after_issue is not None:
+            where = 'AND requests.issue > :after_issue'
+            params['after_issue'] = after_issue
+        if limit is not None:
+            limit_clause = 'LIMIT :limit'
+            params['limit'] = limit
+        sql = f"""SELECT requests.* FROM requests
+        INNER JOIN (SELECT issue, MAX(requested) AS max_requested FROM requests GROUP BY issue) latest_request
+            ON requests.issue = latest_request.issue AND requests.requested = latest_request.max_requested
+        LEFT JOIN (SELECT issue, MAX(computed) AS max_computed FROM issue_data GROUP BY issue) latest_computed
+            ON requests.issue = latest_computed.issue
+        LEFT JOIN issue_data
+            ON issue_data.issue = latest_computed.issue AND issue_data.computed = latest_computed.max_computed
+        WHERE (issue_data.id IS NULL OR requests.requested > issue_data.computed
+            OR issue_data.created IS NULL OR issue_data.created_by IS NULL)
+        {where}
+        ORDER BY requests.issue ASC
+        {limit_clause}"""
+
+        async with self._async_session() as session:
+            stmt = select(Request).from_statement(text(sql))
+            async for model in await session.stream_scalars(stmt, params=params or None):
+                model: Request
+                yield model.entity
+
     async def get_issue_data(self, issue: str) -> SQLIssueDataEntity:
         async with self._async_session() as session:
             stmt = select(IssueData).where(IssueData.issue.is_(issue)).order_by(IssueData.computed.desc()).limit(1)
             model = await session.scalar(stmt)
             return model.entity if model else None
 
+    async def save_requests(self, requests: Iterable[entities.Request]) -> None:
+        """ Inserts in batches, in one transaction: when one fails, none are saved. """
+        async with self._async_session() as session:
+            for batch in _batched(requests, self.BATCH_SIZE):
+                await session.execute(insert(Request), [Request.values_from_entity(request) for request in batch])
+            await session.commit()
+
+    async def get_issue_status(self, issue: str) -> entities.IssueStatus:
+        requested = select(func.max(Request.requested)).where(Request.issue == issue).scalar_subquery()
+        latest_id = select(IssueData.id).where(IssueData.issue == issue) \
+            .order_by(IssueData.computed.desc()).limit(1).scalar_subquery()
+        # one row, also when there is no issue data yet
+        stmt = select(requested, IssueData) \
+            .select_from(select(literal(1)).subquery()) \
+            .outerjoin(IssueData, IssueData.id == latest_id)
+        async with self._async_session() as session:
+            requested, model = (await session.execute(stmt)).one()
+            return entities.IssueStatus(
+                issue=issue,
+                requested=requested,
+                issue_data=model.entity if model else None,
+            )
+
+    async def get_issue_statuses(self) -> AsyncIterator[entities.IssueStatus]:
+        latest_request = select(Request.issue, func.max(Request.requested).label('requested')) \
+            .group_by(Request.issue).subquery()
+        # sqlite returns the other columns of the row with the max value
+        latest_computed = select(IssueData.id, IssueData.issue, func.max(IssueData.computed)) \
+            .group_by(IssueData.issue).subquery()
+        stmt = select(latest_request.c.issue, latest_request.c.requested, IssueData) \
+            .select_from(latest_request) \
+            .outerjoin(latest_computed, latest_computed.c.issue == latest_request.c.issue) \
+            .outerjoin(IssueData, IssueData.id == latest_computed.c.id) \
+            .order_by(latest_request.c.issue.asc())
+        async with self._async_session() as session:
+            async for issue, requested, model in await session.stream(stmt):
+                yield entities.IssueStatus(
+                    issue=issue,
+                    requested=requested,
+                    issue_data=model.entity if model else None,
+                )
+
     async def save_issue_data(self, data: entities.IssueData) -> SQLIssueDataEntity:
         async with self._async_session() as session:
             if isinstance(data, SQLIssueDataEntity) and (id_ := data.get_id()):
-                # update existing
-                data_model: IssueData = await session.scalar(
-                    select(IssueData).where(IssueData.id == id_)
-                )
-                data_model.update_from_entity(data)
+                # update existing, without loading it first
+                values = IssueData.values_from_entity(data)
+                await session.execute(update(IssueData).where(IssueData.id == id_).values(**values))
+                data_model = IssueData(id=id_, **values)
             else:
                 data_model = IssueData.from_entity(data)
-            session.add(data_model)
+                session.add(data_model)
+            await session.execute(StorageGeneration.bump())
             await session.commit()
             return data_model.entity
 
-    async def get_issue_datas(self) -> AsyncIterator[SQLIssueDataEntity]:
+    async def save_issue_datas(self, datas: Iterable[entities.IssueData]) -> None:
+        """ Updates the datas loaded from this storage, inserts the others. A new data for an
+            issue and computed time that are already stored replaces the stored one. All in one
+            transaction.
+        """
+        upsert = sqlite_insert(IssueData)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[IssueData.issue, IssueData.computed],
+            set_={
+                column.name: upsert.excluded[column.name]
+                for column in IssueData.__table__.columns if column.name not in ('id', 'issue', 'computed')
+            }
+        )
         async with self._async_session() as session:
-            stmt = select(IssueData).order_by(IssueData.id.asc())
-            async for model in await session.stream_scalars(stmt):
-                model: IssueData
-                yield model.entity
+            for batch in _batched(datas, self.BATCH_SIZE):
+                updates = []
+                inserts = []
+                for data in batch:
+                    values = IssueData.values_from_entity(data)
+                    if isinstance(data, SQLIssueDataEntity) and (id_ := data.get_id()):
+                        updates.append({'id': id_, **values})
+                    else:
+                        inserts.append(values)
+                if updates:
+                    # bulk update by primary key
+                    await session.execute(update(IssueData), updates)
+                if inserts:
+                    await session.execute(upsert, inserts)
+            await session.execute(StorageGeneration.bump())
+            await session.commit()
 
-    async def get_recent_issue_datas(self, from_: datetime | None = None) -> AsyncIterator[entities.IssueData]:
-        where = ''
+    async def get_generation(self) -> int:
+        async with self._async_session() as session:
+            return await session.scalar(select(StorageGeneration.generation))
+
+    async def get_issue_datas(self) -> AsyncIterator[SQLIssueDataEntity]:
+        async for entity in self._stream_issue_datas('SELECT {columns} FROM issue_data ORDER BY issue_data.id ASC'):
+            yield entity
+
+    async def _stream_issue_datas(
+            self,
+            sql: str,
+            params: dict[str, object] | None = None,
+            with_history: bool = True
+    ) -> AsyncIterator[entities.IssueData]:
+        """ Entities from the rows of a select of {columns} of issue_data, built from plain rows
+            rather than orm models, which costs a lot per row on full scans.
+        """
+        names = IssueData.ENTITY_COLUMNS if with_history else IssueData.SUMMARY_COLUMNS
+        from_row = IssueData.entity_from_row if with_history else IssueData.summary_from_row
+        async with self._async_engine.connect() as conn:
+            async for row in await conn.stream(_select_text(sql, IssueData, names, params), params):
+                yield from_row(row)
+
+    async def get_issue_data_page(
+            self,
+            after: tuple[str, datetime] | None = None,
+            limit: int = 100,
+            filter: entities.IssueDataFilter | None = None,
+            latest_only: bool = False,
+            with_history: bool = True
+    ) -> AsyncIterator[entities.IssueData]:
+        # seeks in the unique (issue, computed) index, or in the one of project_id, issue and computed
+        conditions = []
+        params: dict[str, object] = {'limit': limit}
+        if after:
+            conditions.append('(issue_data.issue, issue_data.computed) > (:after_issue, :after_computed)')
+            params.update(after_issue=after[0], after_computed=after[1])
+        filter = filter or entities.IssueDataFilter()
+        if filter.project_id is not None:
+            conditions.append('issue_data.project_id = :project_id')
+            params['project_id'] = filter.project_id
+        for column in ('created', 'computed'):
+            if (from_ := getattr(filter, f'{column}_from')) is not None:
+                conditions.append(f'issue_data.{column} >= :{column}_from')
+                params[f'{column}_from'] = from_
+            if (to_ := getattr(filter, f'{column}_to')) is not None:
+                conditions.append(f'issue_data.{column} < :{column}_to')
+                params[f'{column}_to'] = to_
+        if latest_only:
+            conditions.append(
+                'issue_data.computed = (SELECT MAX(latest.computed) FROM issue_data latest WHERE latest.issue = issue_data.issue)'
+            )
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        sql = f"""SELECT {{columns}} FROM issue_data
+        {where}
+        ORDER BY issue_data.issue ASC, issue_data.computed ASC
+        LIMIT :limit"""
+
+        async for entity in self._stream_issue_datas(sql, params, with_history):
+            yield entity
+
+    async def get_request_page(
+            self,
+            after: tuple[str, datetime] | None = None,
+            limit: int = 100,
+            issue: str | None = None,
+            requested_from: datetime | None = None,
+            requested_to: datetime | None = None,
+            with_result: bool = True
+    ) -> AsyncIterator[entities.Request]:
+        # seeks in the unique (issue, requested) index
+        conditions = []
+        params: dict[str, object] = {'limit': limit}
+        if after:
+            conditions.append('(requests.issue, requests.requested) > (:after_issue, :after_requested)')
+            params.update(after_issue=after[0], after_requested=after[1])
+        if issue is not None:
+            conditions.append('requests.issue = :issue')
+            params['issue'] = issue
+        if requested_from is not None:
+            conditions.append('requests.requested >= :requested_from')
+            params['requested_from'] = requested_from
+        if requested_to is not None:
+            conditions.append('requests.requested < :requested_to')
+            params['requested_to'] = requested_to
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        sql = f"""SELECT {{columns}} FROM requests
+        {where}
+        ORDER BY requests.issue ASC, requests.requested ASC
+        LIMIT :limit"""
+
+        names = Request.ENTITY_COLUMNS if with_result else Request.ENTITY_COLUMNS[:2]
+        async with self._async_engine.connect() as conn:
+            async for row in await conn.stream(_select_text(sql, Request, names, params), params):
+                yield Request.entity_from_row(row)
+
+    async def get_recent_issue_datas(
+            self,
+            from_: datetime | None = None,
+            to_: datetime | None = None
+    ) -> AsyncIterator[entities.IssueData]:
+        conditions = []
         params = {}
         if from_:
-            where = 'WHERE issue_data.computed >= :from_'
-            params['from_'] = from_
-        sql = f"""SELECT issue_data.* FROM issue_data 
+            # rows stored before event spans were known fall back to when they were computed
+            conditions.append(
+                '(issue_data.last_event >= :from_utc '
+                'OR issue_data.last_event IS NULL AND issue_data.computed >= :from_)'
+            )
+            params.update(from_utc=_utc(from_), from_=from_)
+        if to_:
+            conditions.append('(issue_data.first_event < :to_utc OR issue_data.first_event IS NULL)')
+            params['to_utc'] = _utc(to_)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        sql = f"""SELECT {{columns}} FROM issue_data
         INNER JOIN (SELECT id, issue, MAX(computed) AS max_computed FROM issue_data GROUP BY issue) latest
             ON issue_data.id = latest.id
-        {where}    
+        {where}
         ORDER BY issue_data.id ASC"""
 
+        async for entity in self._stream_issue_datas(sql, params or None):
+            yield entity
+
+    async def get_timeline_checkpoints(self, display_name: str) -> AsyncIterator[entities.TimelineCheckpoint]:
+        async with self._async_session() as session:
+            stmt = select(TimelineCheckpoint).where(TimelineCheckpoint.display_name == display_name)
+            async for model in await session.stream_scalars(stmt):
+                model: TimelineCheckpoint
+                yield model.entity
+
+    async def save_timeline_checkpoints(self, checkpoints: Iterable[entities.TimelineCheckpoint]) -> None:
+        upsert = sqlite_insert(TimelineCheckpoint)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[TimelineCheckpoint.display_name, TimelineCheckpoint.issue],
+            set_={'checkpoint': upsert.excluded.checkpoint},
+        )
+        async with self._async_session() as session:
+            for batch in _batched(checkpoints, self.BATCH_SIZE):
+                await session.execute(upsert, [TimelineCheckpoint.values_from_entity(checkpoint) for checkpoint in batch])
+            await session.commit()
+
+    async def get_unindexed_issue_datas(self, limit: int | None = None) -> AsyncIterator[entities.IssueData]:
+        sql = f"""SELECT {{columns}} FROM issue_data
+        INNER JOIN (SELECT id, issue, MAX(computed) AS max_computed FROM issue_data GROUP BY issue) latest
+            ON issue_data.id = latest.id
+        WHERE NOT issue_data.timelines_indexed
+        ORDER BY issue_data.id ASC
+        {'LIMIT :limit' if limit is not None else ''}"""
+
+        async for entity in self._stream_issue_datas(sql, {'limit': limit} if limit is not None else None):
+            yield entity
+
+    async def save_timelines(self, issue_data: entities.IssueData, timelines: Iterable[entities.Timeline]) -> None:
+        async with self._async_session() as session:
+            await session.execute(
+                text('DELETE FROM timeline_rtree WHERE id IN (SELECT id FROM timeline WHERE issue = :issue)'),
+                {'issue': issue_data.issue}
+            )
+            await session.execute(delete(Timeline).where(Timeline.issue == issue_data.issue))
+            for batch in _batched(timelines, self.BATCH_SIZE):
+                ids = (await session.scalars(
+                    insert(Timeline).returning(Timeline.id, sort_by_parameter_order=True),
+                    [Timeline.values_from_entity(timeline) for timeline in batch]
+                )).all()
+                await session.execute(
+                    text('INSERT INTO timeline_rtree (id, start_ts, end_ts) VALUES (:id, :start_ts, :end_ts)'),
+                    [
+                        {'id': id_, 'start_ts': timeline.start.timestamp(), 'end_ts': timeline.end.timestamp()}
+                        for id_, timeline in zip(ids, batch)
+                    ]
+                )
+            await session.execute(
+                update(IssueData)
+                .where(IssueData.issue == issue_data.issue, IssueData.computed == issue_data.computed)
+                .values(timelines_indexed=True)
+            )
+            # responses rendered from the index before are outdated
+            await session.execute(StorageGeneration.bump())
+            await session.commit()
+
+    async def get_timelines(
+            self,
+            display_name: str | None = None,
+            issue: str | None = None,
+            from_: datetime | None = None,
+            to_: datetime | None = None,
+            display_names: Collection[str] | None = None
+    ) -> AsyncIterator[entities.Timeline]:
+        conditions = []
+        params = {}
+        if display_name is not None:
+            conditions.append('timeline.display_name = :display_name')
+            params['display_name'] = display_name
+        if display_names is not None:
+            names = {f'display_name_{i}': name for i, name in enumerate(display_names)}
+            conditions.append(f"timeline.display_name IN ({', '.join(':' + param for param in names) or 'NULL'})")
+            params.update(names)
+        if issue is not None:
+            conditions.append('timeline.issue = :issue')
+            params['issue'] = issue
+        join = ''
+        if from_ or to_:
+            join = 'INNER JOIN timeline_rtree ON timeline_rtree.id = timeline.id'
+        if from_:
+            # the r*tree stores 32 bit floats, rounded outwards, so check exactly as well
+            conditions.append('timeline_rtree.end_ts >= :from_ts AND timeline.end_ts >= :from_ts')
+            params['from_ts'] = from_.timestamp()
+        if to_:
+            conditions.append('timeline_rtree.start_ts < :to_ts AND timeline.start_ts < :to_ts')
+            params['to_ts'] = to_.timestamp()
+        sql = f"""SELECT timeline.* FROM timeline
+        {join}
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY timeline.id ASC"""
+
         async with self._async_session() as session:
-            stmt = select(IssueData).from_statement(text(sql))
+            stmt = select(Timeline).from_statement(text(sql))
             async for model in await session.stream_scalars(stmt, params=params or None):
-                model: IssueData
+                model: Timeline
                 yield model.entity
@@ -1,10 +1,10 @@
 """ Calendar domain logic """
 import hashlib
-from dataclasses import dataclass, asdict
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from typing import Sequence
 
-from bast1aan.jira_reader import json_mapper, settings
+from bast1aan.jira_reader import settings
 from bast1aan.jira_reader.entities import Timeline
 
 
@@ -20,23 +20,39 @@ class Event:
     categories: Sequence[str]
     summary: str
     url: str
+    content_hash: str = ''  # changes whenever anything else of the event changes
 
 def event_from_timeline(timeline: Timeline) -> Event:
-    return Event(
-        id=_hash(timeline),
+    event = Event(
+        id=_uid(timeline),
         start=timeline.start,
         end=timeline.end,
         categories=_get_categories(timeline),
         summary='%s %s (%s)' % (timeline.issue, timeline.issue_summary, timeline.type),
         url='https://%s/browse/%s' % (settings.JIRA_HOST, timeline.issue),
     )
+    event.content_hash = _content_hash(event)
+    return event
 
-def _hash(timeline: Timeline) -> str:
-    return hashlib.md5(
-        json_mapper.dumps(
-            asdict(timeline)
-        ).encode('utf-8')
-    ).hexdigest()
+def _uid(timeline: Timeline) -> str:
+    """ Identifies the event by what it is about and when it started, so an edited summary or
+        a timeline that is still open and grows keeps its UID and is updated in calendars,
+        rather than deleted and created again. That is when it started before being clipped
+        to the requested window, which moves along with a rolling from.
+    """
+    return _digest(
+        timeline.issue, timeline.display_name, timeline.type, _utc(timeline.unclipped_start or timeline.start)
+    )
+
+def _content_hash(event: Event) -> str:
+    return _digest(event.id, _utc(event.start), _utc(event.end), event.summary, event.url, *event.categories)
+
+def _utc(dt: datetime) -> str:
+    # the same moment, whatever the timezone it is expressed in; naive times are local
+    return dt.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%S.%f')
+
+def _digest(*parts: str) -> str:
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
 
 
 def _get_categories(timeline: Timeline) -> Sequence[str]:
@@ -0,0 +1,88 @@
+""" Compression of response bodies, in the encoding the client prefers.
+
+Brotli is used when the brotli package is installed, gzip otherwise.
+"""
+import zlib
+from typing import Iterable, Iterator
+
+from flask import Response, request as flask_request
+
+from . import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP = 'gzip'
+BROTLI = 'br'
+
+MIN_SIZE = 1024  # smaller bodies hardly shrink, or even grow
+COMPRESSIBLE = ('text/', 'application/json')
+
+
+def available_encodings() -> tuple[str, ...]:
+    """ In order of preference, when the client likes them equally """
+    return (BROTLI, GZIP) if brotli else (GZIP,)
+
+
+def negotiate(size: int) -> str | None:
+    """ The encoding for a body of size bytes to the current request, None to send it as is. """
+    if settings.COMPRESSION == 'off' or size < int(settings.COMPRESSION_MIN_SIZE or MIN_SIZE):
+        return None
+    return flask_request.accept_encodings.best_match(available_encodings())
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    return b''.join(compress_stream((data,), encoding))
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """ Compresses chunk by chunk, so a streamed body is never held in memory as a whole. """
+    if encoding == BROTLI:
+        compressor = brotli.Compressor(quality=5)
+        compress_chunk, flush = compressor.process, compressor.finish
+    elif encoding == GZIP:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress_chunk, flush = compressor.compress, compressor.flush
+    else:
+        raise ValueError(f'Unsupported encoding {encoding}')
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        compressed = compress_chunk(chunk)
+        if compressed:
+            yield compressed
+    yield flush()
+
+
+def compress_response(response: Response) -> Response:
+    """ after_request hook compressing text and json bodies. Responses that already have a
+        Content-Encoding, like stored compressed bodies, are passed on as they are.
+    """
+    if not response.mimetype.startswith(COMPRESSIBLE) or response.status_code in (204, 304) \
+            or response.status_code < 200:
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'Content-Encoding' in response.headers or response.direct_passthrough:
+        return response
+
+    if response.is_streamed:
+        encoding = negotiate(MIN_SIZE)
+        if not encoding:
+            return response
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        encoding = negotiate(len(body))
+        if not encoding:
+            return response
+        response.set_data(compress(body, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # the compressed body is a different representation of the same content
+        response.set_etag(etag, weak=True)
+    return response
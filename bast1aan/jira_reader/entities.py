@@ -1,8 +1,8 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import AsyncIterator
+from typing import AsyncIterator, Collection, Iterable
 
 from bast1aan.jira_reader.overridable import overridable
 
@@ -12,15 +12,85 @@ class Storage(ABC):
     @abstractmethod
     async def get_latest_request(self, issue: str) -> Request | None: ...
     @abstractmethod
+    async def get_latest_result_gzip(self, issue: str) -> bytes | None:
+        """ The json result of the latest request, gzip compressed, without decoding it. """
+    @abstractmethod
     async def save_request(self, request: Request) -> None: ...
     @abstractmethod
+    async def save_requests(self, requests: Iterable[Request]) -> None: ...
+    @abstractmethod
+    async def get_outdated_requests(self, after_issue: str | None = None, limit: int | None = None) -> AsyncIterator[Request]:
+        """ Latest requests of issues without issue data computed from them, ordered by issue. """
+    @abstractmethod
     async def get_issue_data(self, issue: str) -> IssueData: ...
     @abstractmethod
+    async def get_issue_status(self, issue: str) -> IssueStatus:
+        """ Latest issue data and the time of the latest request, without the request itself. """
+    @abstractmethod
+    async def get_issue_statuses(self) -> AsyncIterator[IssueStatus]:
+        """ Status of every requested issue, ordered by issue. """
+    @abstractmethod
     async def save_issue_data(self, data: IssueData) -> IssueData: ...
     @abstractmethod
+    async def save_issue_datas(self, datas: Iterable[IssueData]) -> None: ...
+    @abstractmethod
+    async def get_generation(self) -> int:
+        """ Changes with every save of issue data or indexed timelines, by any user of the storage. """
+    @abstractmethod
     async def get_issue_datas(self) -> AsyncIterator[IssueData]: ...
     @abstractmethod
-    async def get_recent_issue_datas(self, from_: datetime | None = None) -> AsyncIterator[IssueData]: ...
+    async def get_issue_data_page(
+            self,
+            after: tuple[str, datetime] | None = None,
+            limit: int = 100,
+            filter: IssueDataFilter | None = None,
+            latest_only: bool = False,
+            with_history: bool = True
+    ) -> AsyncIterator[IssueData]:
+        """ Up to limit issue datas ordered by issue and computed time, following the (issue,
+            computed) key after. latest_only gives only the latest issue data of each issue.
+            Without history, history is None, and the issue datas must not be saved again.
+        """
+    @abstractmethod
+    async def get_request_page(
+            self,
+            after: tuple[str, datetime] | None = None,
+            limit: int = 100,
+            issue: str | None = None,
+            requested_from: datetime | None = None,
+            requested_to: datetime | None = None,
+            with_result: bool = True
+    ) -> AsyncIterator[Request]:
+        """ Up to limit requests ordered by issue and requested time, following the (issue,
+            requested) key after, requested within [requested_from, requested_to). Without
+            result, result is None.
+        """
+    @abstractmethod
+    async def get_recent_issue_datas(self, from_: datetime | None = None, to_: datetime | None = None) -> AsyncIterator[IssueData]:
+        """ Latest issue data of the issues with history events within [from_, to_). """
+    @abstractmethod
+    async def get_unindexed_issue_datas(self, limit: int | None = None) -> AsyncIterator[IssueData]:
+        """ Latest issue data of the issues whose timelines are not indexed from it. """
+    @abstractmethod
+    async def save_timelines(self, issue_data: IssueData, timelines: Iterable[Timeline]) -> None:
+        """ Replaces the indexed timelines of the issue by the ones calculated from issue_data. """
+    @abstractmethod
+    async def get_timelines(
+            self,
+            display_name: str | None = None,
+            issue: str | None = None,
+            from_: datetime | None = None,
+            to_: datetime | None = None,
+            display_names: Collection[str] | None = None
+    ) -> AsyncIterator[Timeline]:
+        """ Indexed timelines overlapping [from_, to_), unclipped. """
+    @abstractmethod
+    async def get_timeline_checkpoints(self, display_name: str) -> AsyncIterator[TimelineCheckpoint]: ...
+    @abstractmethod
+    async def save_timeline_checkpoints(self, checkpoints: Iterable[TimelineCheckpoint]) -> None:
+        """ Replaces the stored checkpoints of the same issues and persons. """
+    async def dispose(self) -> None:
+        """ Releases what the storage holds for the running event loop, before that closes. """
 
 @dataclass
 class Request:
@@ -28,7 +98,7 @@ class Request:
     result: JSONable
     requested: datetime | None = None
 
-@overridable
+@overridable(expensive=('history',))
 @dataclass
 class IssueData:
     issue: str
@@ -41,6 +111,27 @@ class IssueData:
     created_by: str | None = None
 
 @dataclass(frozen=True)
+class IssueDataFilter:
+    """ Selects issue datas by project, and by created and computed time within [from, to) """
+    project_id: int | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    computed_from: datetime | None = None
+    computed_to: datetime | None = None
+
+@dataclass
+class IssueStatus:
+    issue: str
+    requested: datetime | None
+    issue_data: IssueData | None
+
+    @property
+    def history_is_outdated(self) -> bool:
+        return not self.issue_data or not self.requested or \
+            self.requested > self.issue_data.computed or \
+            self.issue_data.created_by is None or self.issue_data.created is None
+
+@dataclass(frozen=True, slots=True)
 class Timeline:
     TYPE_ASSIGNED_2ND_DEVELOPER = 'assigned_2nd_developer'
     TYPE_ASSIGNED = 'assigned'
@@ -54,3 +145,18 @@ class Timeline:
     email: str
     type: str
     issue_summary: str
+    # the start before it was clipped to a window, which still identifies the timeline; not in its json
+    unclipped_start: datetime | None = field(default=None, compare=False, metadata={'json': False})
+
+@dataclass
+class TimelineCheckpoint:
+    """ State of calculating the timelines of an issue for a person, after processing the
+        item_count history items created up to processed.
+    """
+    issue: str
+    display_name: str
+    processed: datetime
+    item_count: int
+    states: dict[str, datetime]  # since when, by state name
+    state_added: dict[str, datetime]  # start of open timelines, by processor name
+    digest: str = ''  # of those item_count history items, to tell whether they changed since
@@ -1,11 +1,11 @@
 """ implementation to create ical file from calendar objects """
 from typing import Iterable
 
-import icalendar
-
 from . import calendar
 
 def to_ical(calendar: calendar.Calendar, events: Iterable[calendar.Event]) -> bytes:
+    import icalendar  # slow to import, only needed once a feed is rendered
+
     ical_calendar = icalendar.Calendar()
     ical_calendar['X-WR-CALNAME'] = calendar.calendar_name
     for event in events:
@@ -16,6 +16,8 @@ def to_ical(calendar: calendar.Calendar, events: Iterable[calendar.Event]) -> by
         ical_event.add('categories', event.categories)
         ical_event['summary'] = event.summary
         ical_event['url'] = event.url
+        # the UID stays when an event changes, this tells clients and caches that it did
+        ical_event['X-JIRA-READER-CONTENT-HASH'] = event.content_hash
 
         ical_calendar.add_component(ical_event)
     return ical_calendar.to_ical()
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import hashlib
+from bisect import bisect_right
 from collections import defaultdict
 from dataclasses import dataclass, asdict, replace
 from datetime import datetime, timedelta
@@ -7,7 +9,7 @@ from enum import Enum, auto as a
 from itertools import chain
 from typing import Mapping, TypeVar, Iterator, Iterable, ClassVar, Callable, Literal, Sequence, Final
 
-from .entities import IssueData, Timeline
+from .entities import IssueData, Request, Timeline, TimelineCheckpoint
 from .json_mapper import JsonMapper, into, asdataclass
 from .reader import Action
 from . import settings
@@ -31,11 +33,11 @@ class RequestTicketData(JiraAction[object]):
         return data
 
 class ComputeTicketHistory(JiraAction["ComputeTicketHistory.Response"]):
-    @dataclass
+    @dataclass(slots=True)
     class Response:
-        @dataclass
+        @dataclass(slots=True)
         class Item:
-            @dataclass
+            @dataclass(slots=True)
             class Action:
                 field: str
                 toString: str | None
@@ -45,7 +47,8 @@ class ComputeTicketHistory(JiraAction["ComputeTicketHistory.Response"]):
             byDisplayName: str
             created: datetime
             actions: list[ComputeTicketHistory.Response.Item.Action]
-        @dataclass
+            id: int | None = None
+        @dataclass(slots=True)
         class Comment:
             id: int
             byEmailAddress: str
@@ -65,6 +68,7 @@ class ComputeTicketHistory(JiraAction["ComputeTicketHistory.Response"]):
     mapper = JsonMapper({
         'changelog': {
             'histories': [{
+                'id': into(Response.Item).id,
                 'author': {
                     'emailAddress': into(Response.Item).byEmailAddress,
                     'displayName': into(Response.Item).byDisplayName,
@@ -103,7 +107,134 @@ class ComputeTicketHistory(JiraAction["ComputeTicketHistory.Response"]):
         },
     }, convert_null_to_empty_value=True)
 
-def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:datetime|None=None) -> Iterator[Timeline]:
+def compute_issue_data(request: Request, previous: IssueData | None = None) -> IssueData:
+    """ Computes the history of a fetched ticket. Module level, so it can be run in a process pool.
+
+        Given the previous issue data of the ticket, only changelog entries and comments that are
+        new or updated since are mapped, the others are taken from the previous history.
+    """
+    history = _incremental_history(request.result, previous) if previous else None
+    if not history:
+        history = ComputeTicketHistory().get_response(request.result)
+    return IssueData(
+        issue=request.issue,
+        history={
+            "items": history.items,
+            "comments": history.comments,
+        },
+        issue_id=history.issue_id,
+        project_id=history.project_id,
+        summary=history.summary,
+        created=history.created,
+        created_by=history.created_by,
+    )
+
+def _incremental_history(result: object, previous: IssueData) -> ComputeTicketHistory.Response | None:
+    Item = ComputeTicketHistory.Response.Item
+    Comment = ComputeTicketHistory.Response.Comment
+
+    def as_id(value: object) -> int | None:
+        return None if value is None else int(value)
+
+    def if_unchanged(comment: Comment | None, raw_comment: dict) -> Comment | None:
+        # rendered dates are human-readable, parse them the way the mapper does
+        import dateutil.parser
+        return comment if comment and comment.updated == dateutil.parser.parse(raw_comment['updated']) else None
+
+    if not isinstance(previous.history, dict):
+        return None
+    try:
+        histories = result['changelog']['histories']
+        raw_comments = result['renderedFields']['comment']['comments']
+        known_items = {
+            item.id: item for item in previous.history['items'] if isinstance(item, Item) and item.id is not None
+        }
+        known_comments = {
+            comment.id: comment for comment in previous.history['comments'] if isinstance(comment, Comment)
+        }
+        reused_items = [known_items.get(as_id(raw_item.get('id'))) for raw_item in histories]
+        reused_comments = [
+            if_unchanged(known_comments.get(as_id(raw_comment.get('id'))), raw_comment) for raw_comment in raw_comments
+        ]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+    if not any(reused_items) and not any(reused_comments):
+        return None
+
+    rendered_fields = result['renderedFields']
+    history = ComputeTicketHistory().get_response(dict(
+        result,
+        changelog=dict(
+            result['changelog'],
+            histories=[raw_item for raw_item, item in zip(histories, reused_items) if item is None],
+        ),
+        renderedFields=dict(rendered_fields, comment=dict(
+            rendered_fields['comment'],
+            comments=[raw_comment for raw_comment, comment in zip(raw_comments, reused_comments) if comment is None],
+        )),
+    ))
+    new_items = iter(history.items)
+    new_comments = iter(history.comments)
+    history.items = [next(new_items) if item is None else item for item in reused_items]
+    history.comments = [next(new_comments) if comment is None else comment for comment in reused_comments]
+    return history
+
+def event_span(issue_data: IssueData) -> tuple[datetime, datetime] | None:
+    """ First and last moment of what calculate_timelines replays, so all timelines of the
+        issue lie within it. None if the history is not shaped like ComputeTicketHistory's.
+    """
+    current_timezone = datetime.now().astimezone().tzinfo
+
+    def created(entry: object) -> datetime:
+        value = entry['created'] if isinstance(entry, dict) else entry.created
+        value = datetime.fromisoformat(value) if isinstance(value, str) else value
+        return value if value.tzinfo else value.replace(tzinfo=current_timezone)
+
+    history = issue_data.history
+    if not isinstance(history, dict) or not issue_data.created:
+        return None
+    try:
+        # creating the ticket and writing comments take 15 minutes, in the current timezone
+        moments = [created(item) for item in history['items']]
+        for start in chain((issue_data.created,), map(created, history['comments'])):
+            start = start.replace(tzinfo=current_timezone)
+            moments += (start, start + timedelta(minutes=15))
+        return min(moments), max(moments)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+
+def timeline_people(issue_data: IssueData) -> set[str]:
+    """ Everyone calculate_timelines can find timelines of on the issue. """
+    def get(o: object, name: str) -> object:
+        return o[name] if isinstance(o, dict) else getattr(o, name)
+
+    people = {issue_data.created_by}
+    history = issue_data.history
+    if isinstance(history, dict):
+        for item in history.get('items') or ():
+            for action in get(item, 'actions'):
+                if get(action, 'field') in ('assignee', '2nd Developer'):
+                    people.update((get(action, 'toString'), get(action, 'fromString')))
+        people.update(get(comment, 'byDisplayName') for comment in history.get('comments') or ())
+    people.difference_update((None, ''))
+    return people
+
+def calculate_timelines(
+        issue_data: IssueData,
+        filter_display_name: str,
+        from_: datetime | None = None,
+        checkpoint: TimelineCheckpoint | None = None,
+        on_checkpoint: Callable[[TimelineCheckpoint], None] | None = None,
+        to_: datetime | None = None
+) -> Iterator[Timeline]:
+    """ Timelines of a person on an issue within [from_, to_), clipped to it, the same as those
+        of the whole history clipped. Replaying the history stops after to_ once no timeline
+        that started before it is open.
+
+        With from_, the calculation resumes from checkpoint if that was taken before from_ and
+        the history up to it is unchanged. on_checkpoint then receives the state just before
+        from_, if that differs from checkpoint, to resume from next time.
+    """
     class State(Enum):
         IN_PROGRESS=a()
         SECOND_DEVELOPER=a()
@@ -115,15 +246,18 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
     to: Final[StateChange] = True
     no_longer: Final[StateChange] = False
 
+    current_timezone = datetime.now().astimezone().tzinfo
+
     def assume_current_timezone_for_naive_datetime(input: datetime) -> datetime:
         # this could be wrong because of daylight saving time
-        return input.replace(tzinfo=datetime.now().astimezone().tzinfo)
+        return input.replace(tzinfo=current_timezone)
 
     def convert_comment_to_items_with_actions(comment: ComputeTicketHistory.Response.Comment) -> Iterable[ComputeTicketHistory.Response.Item]:
+        created = assume_current_timezone_for_naive_datetime(comment.created)
         return ComputeTicketHistory.Response.Item(
             byEmailAddress=comment.byEmailAddress,
             byDisplayName=comment.byDisplayName,
-            created=assume_current_timezone_for_naive_datetime(comment.created),
+            created=created,
             actions=[
                 ComputeTicketHistory.Response.Item.Action(
                     field='comment',
@@ -134,7 +268,7 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
         ), ComputeTicketHistory.Response.Item(
             byEmailAddress=comment.byEmailAddress,
             byDisplayName=comment.byDisplayName,
-            created=assume_current_timezone_for_naive_datetime(comment.created) + timedelta(minutes=15),
+            created=created + timedelta(minutes=15),
             actions=[
                 ComputeTicketHistory.Response.Item.Action(
                     field='comment',
@@ -145,10 +279,11 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
         )
 
     def create_creating_items(created: datetime, created_by: str) -> Iterable[ComputeTicketHistory.Response.Item]:
+        created = assume_current_timezone_for_naive_datetime(created)
         return ComputeTicketHistory.Response.Item(
             byEmailAddress='',
             byDisplayName=created_by,
-            created=assume_current_timezone_for_naive_datetime(created),
+            created=created,
             actions=[
                 ComputeTicketHistory.Response.Item.Action(
                     field='creating_ticket',
@@ -159,7 +294,7 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
         ), ComputeTicketHistory.Response.Item(
             byEmailAddress='',
             byDisplayName=created_by,
-            created=assume_current_timezone_for_naive_datetime(created) + timedelta(minutes=15),
+            created=created + timedelta(minutes=15),
             actions=[
                 ComputeTicketHistory.Response.Item.Action(
                     field='creating_ticket',
@@ -172,6 +307,7 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
     class Processor:
         state_observers: ClassVar[Mapping[tuple[StateChange, State]: Callable]]
         field_name: ClassVar[str]
+        _state_added: datetime | None = None
         def __init__(self, main: CalculateTimelines):
             self.main = main
         def process(self, item: ComputeTicketHistory.Response.Item, action: ComputeTicketHistory.Response.Item.Action):
@@ -188,7 +324,6 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
     class SimpleProcessor(Processor):
         state: ClassVar[State]
         timeline_type: ClassVar[str]
-        _state_added: datetime | None = None
         def process(self, item: ComputeTicketHistory.Response.Item, action: ComputeTicketHistory.Response.Item.Action):
             if action.toString == self.main.filter_display_name:
                 self.main.change_state(to, self.state, item.created)
@@ -254,7 +389,6 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
 
     class StatusProcessor(Processor):
         field_name = 'status'
-        _state_added: datetime | None = None
 
         def process(self, item: ComputeTicketHistory.Response.Item, action: ComputeTicketHistory.Response.Item.Action):
             if action.toString == 'In Progress':
@@ -330,17 +464,43 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
             self.filter_display_name = filter_display_name
             self._states = {}
             self._processors: Sequence[Processor] = tuple(cls(self) for cls in self.processors)
+            self._processors_by_field: Mapping[str, Sequence[Processor]] = defaultdict(tuple)
+            for processor in self._processors:
+                self._processors_by_field[processor.field_name] += (processor,)
             self._state_changes = []
-
-        def _process_state_changes(self) -> Iterator[Timeline]:
-
-            all_state_observers = defaultdict(list)
+            self._all_state_observers = defaultdict(list)
             for processor in self._processors:
                 for state_change_state, method in processor.get_state_observers().items():
-                    all_state_observers[state_change_state].append(method)
+                    self._all_state_observers[state_change_state].append(method)
+
+        def save_checkpoint(self, processed: datetime, item_count: int, digest: str) -> TimelineCheckpoint:
+            return TimelineCheckpoint(
+                issue=self.issue_data.issue,
+                display_name=self.filter_display_name,
+                processed=processed,
+                item_count=item_count,
+                states={state.name: since for state, since in self._states.items()},
+                state_added={
+                    type(processor).__name__: processor._state_added
+                    for processor in self._processors if processor._state_added
+                },
+                digest=digest,
+            )
+
+        def restore_checkpoint(self, checkpoint: TimelineCheckpoint) -> None:
+            self._states = {State[name]: since for name, since in checkpoint.states.items()}
+            for processor in self._processors:
+                processor._state_added = checkpoint.state_added.get(type(processor).__name__)
 
+        def _started_before(self, timestamp: datetime) -> bool:
+            """ Whether a timeline that started before timestamp is still open """
+            return any(
+                processor._state_added and processor._state_added < timestamp for processor in self._processors
+            )
+
+        def _process_state_changes(self) -> Iterator[Timeline]:
             for state_change, state, timestamp in self._state_changes:
-                 for method in all_state_observers.get((state_change, state)):
+                 for method in self._all_state_observers.get((state_change, state)):
                     yield from method(timestamp)
             self._state_changes.clear()
             #
@@ -374,14 +534,37 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
                 ),
                 key=lambda item: item.created
             )
+            start = 0
             last_created = None
-            for item in items:
+            digest = hashlib.blake2b(digest_size=16)
+            if resume_from and bisect_right(items, resume_from.processed, key=lambda item: item.created) == resume_from.item_count:
+                resumed_digest = digest.copy()
+                for item in items[:resume_from.item_count]:
+                    _update_digest(resumed_digest, item)
+                if resumed_digest.hexdigest() == resume_from.digest:
+                    self.restore_checkpoint(resume_from)
+                    start = resume_from.item_count
+                    last_created = resume_from.processed
+                    digest = resumed_digest
+            checkpoint_before = from_ if on_checkpoint else None
+            end = len(items)
+            for index in range(start, len(items)):
+                item = items[index]
+                if to_ and item.created >= to_ and not self._started_before(to_):
+                    # whatever the rest of the history adds starts at or after to_
+                    end = index
+                    break
+                if checkpoint_before and item.created >= checkpoint_before:
+                    if last_created:
+                        report_checkpoint(self.save_checkpoint(last_created, index, digest.hexdigest()))
+                    checkpoint_before = None
+                if checkpoint_before:
+                    _update_digest(digest, item)
                 last_created = item.created
                 for action in item.actions:
                     action: ComputeTicketHistory.Response.Item.Action
-                    for processor in self._processors:
-                        if action.field == processor.field_name:
-                            processor.process(item, action)
+                    for processor in self._processors_by_field.get(action.field, ()):
+                        processor.process(item, action)
                     yield from self._process_state_changes()
                     #       yield from
                     # if action.field == '2nd Developer':
@@ -415,7 +598,9 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
                     #                            Timeline.TYPE_ASSIGNED_2ND_DEVELOPER)
                     #             self._second_developer = None
                     #         self._in_progress = item.created
-            if last_created:
+            if checkpoint_before and last_created:
+                report_checkpoint(self.save_checkpoint(last_created, end, digest.hexdigest()))
+            if last_created and end == len(items):
                 for state in tuple(self.states.keys()):
                     self.change_state(no_longer, state, last_created)
                 yield from self._process_state_changes()
@@ -429,15 +614,40 @@ def calculate_timelines(issue_data: IssueData, filter_display_name: str, from_:d
                 # if self._in_progress:
                 #     yield Timeline(self.issue_data.issue, self._in_progress, self._last_created, self.filter_display_name, '',
                 #                    Timeline.TYPE_IN_PROGESS)
+    def report_checkpoint(new_checkpoint: TimelineCheckpoint) -> None:
+        if not checkpoint or new_checkpoint != checkpoint and new_checkpoint.processed >= checkpoint.processed:
+            on_checkpoint(new_checkpoint)
+
+    resume_from = checkpoint if (
+        from_ and checkpoint and checkpoint.processed < from_ and (not to_ or checkpoint.processed < to_)
+        and (checkpoint.issue, checkpoint.display_name) == (issue_data.issue, filter_display_name)
+    ) else None
     calculate_timelines_iterator = iter(CalculateTimelines(issue_data, filter_display_name))
     if from_:
         calculate_timelines_iterator = limit_earliest_date(calculate_timelines_iterator, from_=from_)
+    if to_:
+        calculate_timelines_iterator = limit_latest_date(calculate_timelines_iterator, to_=to_)
     return calculate_timelines_iterator
 
+def _update_digest(digest: hashlib.blake2b, item: ComputeTicketHistory.Response.Item) -> None:
+    digest.update(repr((
+        item.created.isoformat(),
+        item.byDisplayName,
+        [(action.field, action.toString, action.fromString) for action in item.actions],
+    )).encode())
+
 def limit_earliest_date(timeline: Iterator[Timeline], from_: datetime) -> Iterator[Timeline]:
     for item in timeline:
         if item.end >= from_:
             if item.start < from_:
-                yield replace(item, start=from_)
+                yield replace(item, start=from_, unclipped_start=item.unclipped_start or item.start)
+            else:
+                yield item
+
+def limit_latest_date(timeline: Iterator[Timeline], to_: datetime) -> Iterator[Timeline]:
+    for item in timeline:
+        if item.start < to_:
+            if item.end > to_:
+                yield replace(item, end=to_)
             else:
                 yield item
@@ -1,15 +1,20 @@
 import json
+import json.encoder
+import sys
 import types
 from collections import defaultdict
-from dataclasses import is_dataclass, Field, fields, asdict
+from dataclasses import is_dataclass, Field, fields
 from datetime import datetime
 from functools import cached_property
 from typing import TypeVar, Generic, Mapping, Any, get_args, get_origin, ClassVar, get_type_hints, NamedTuple
 from typing_extensions import Self
-import dateutil.parser
 
 T = TypeVar('T')
 
+_c_make_encoder = json.encoder.c_make_encoder
+_encode_str = json.encoder.encode_basestring_ascii
+_INFINITY = float('inf')
+
 
 def _fix_field_types(cls):
     hints = get_type_hints(cls, globalns=None, localns=None)
@@ -74,6 +79,7 @@ class JsonMapper(Generic[T]):
 
     def _factory(self, t: type, input: Any) -> Any:
         if t is datetime:
+            import dateutil.parser  # only imported when mapping the first datetime
             return dateutil.parser.parse(input)
         if get_origin(t) is types.UnionType:
             # handle optional types (str | None)
@@ -87,6 +93,9 @@ class JsonMapper(Generic[T]):
             if self._convert_null_to_empty_value:
                 return t()
             raise NoneTypeError(f'instance of {t} must not be None')
+        if t is str:
+            # field names and people repeat a lot in histories, share them
+            return sys.intern(str(input))
         return t(input)
 
     def _walk(self, mapping: dict | list | tuple, input: object) -> None:
@@ -133,16 +142,160 @@ class DecodingError(Exception): pass
 
 class NoneTypeError(TypeError): pass
 
+_dataclass_plans: dict[type, tuple[tuple[str, str], ...]] = {}
+
+def _dataclass_plan(cls: type) -> tuple[tuple[str, str], ...]:
+    """ Per dataclass, in field order: the field name and the json text preceding its value.
+        Fields with json False in their metadata are left out.
+    """
+    plan = _dataclass_plans.get(cls)
+    if plan is None:
+        plan = _dataclass_plans[cls] = tuple(
+            (f.name, ('{' if i == 0 else ', ') + _encode_str(f.name) + ': ')
+            for i, f in enumerate(f for f in fields(cls) if f.metadata.get('json', True))
+        )
+    return plan
+
+def _default(o: object) -> object:
+    cls = type(o)
+    plan = _dataclass_plans.get(cls)
+    if plan is None and is_dataclass(o) and not isinstance(o, type):
+        plan = _dataclass_plan(cls)
+    if plan is not None:
+        # shallow: nested values are written by the encoder itself, no deep copy like asdict()
+        return {name: getattr(o, name) for name, _ in plan}
+    if isinstance(o, datetime):
+        return o.isoformat()
+    raise TypeError(f'Object of type {cls.__name__} is not JSON serializable')
+
 class JSONEncoder(json.JSONEncoder):
     def default(self, o):
-        if is_dataclass(o):
-            return asdict(o)
-        if isinstance(o, datetime):
-            return o.isoformat()
-        return super().default(o)
+        return _default(o)
+
+def _floatstr(o: float) -> str:
+    # same as json.encoder with allow_nan=True
+    if o != o:
+        return 'NaN'
+    if o == _INFINITY:
+        return 'Infinity'
+    if o == -_INFINITY:
+        return '-Infinity'
+    return float.__repr__(o)
+
+def _key(k: object) -> str:
+    if isinstance(k, str):
+        return k
+    if isinstance(k, float):
+        return _floatstr(k)
+    if k is True:
+        return 'true'
+    if k is False:
+        return 'false'
+    if k is None:
+        return 'null'
+    if isinstance(k, int):
+        return int.__repr__(k)
+    raise TypeError(f'keys must be str, int, float, bool or None, not {k.__class__.__name__}')
+
+def _write(o: object, out: list[str], markers: dict[int, object]) -> None:
+    """ Writes o as json text chunks into out, like json.dumps(o, cls=JSONEncoder) would.
+        markers holds the containers being written, to detect circular references. They are
+        not unmarked when writing fails, as the whole dumps() fails then.
+    """
+    if isinstance(o, str):
+        out.append(_encode_str(o))
+    elif o is None:
+        out.append('null')
+    elif o is True:
+        out.append('true')
+    elif o is False:
+        out.append('false')
+    elif isinstance(o, int):
+        out.append(int.__repr__(o))
+    elif isinstance(o, float):
+        out.append(_floatstr(o))
+    elif isinstance(o, datetime):
+        out.append(_encode_str(o.isoformat()))
+    elif isinstance(o, (list, tuple)):
+        if not o:
+            out.append('[]')
+        elif _c_make_encoder is not None and _is_plain(o):
+            # plain json data, like stored histories and Jira payloads
+            out.extend(_native_encoder(markers)(o, 0))
+        else:
+            marker = _mark(o, markers)
+            separator = '['
+            for item in o:
+                out.append(separator)
+                _write(item, out, markers)
+                separator = ', '
+            out.append(']')
+            del markers[marker]
+    elif isinstance(o, dict):
+        if not o:
+            out.append('{}')
+        elif _c_make_encoder is not None and all(_is_plain(v) for v in o.values()):
+            out.extend(_native_encoder(markers)(o, 0))
+        else:
+            marker = _mark(o, markers)
+            separator = '{'
+            for k, v in o.items():
+                out.append(separator)
+                out.append(_encode_str(_key(k)))
+                out.append(': ')
+                _write(v, out, markers)
+                separator = ', '
+            out.append('}')
+            del markers[marker]
+    else:
+        plan = _dataclass_plans.get(type(o))
+        if plan is None and is_dataclass(o) and not isinstance(o, type):
+            plan = _dataclass_plan(type(o))
+        if plan is None:
+            marker = _mark(o, markers)
+            _write(_default(o), out, markers)
+            del markers[marker]
+        elif not plan:
+            out.append('{}')
+        else:
+            marker = _mark(o, markers)
+            for name, prefix in plan:
+                out.append(prefix)
+                _write(getattr(o, name), out, markers)
+            out.append('}')
+            del markers[marker]
+
+def _mark(o: object, markers: dict[int, object]) -> int:
+    # same check and message as the json module
+    marker = id(o)
+    if marker in markers:
+        raise ValueError('Circular reference detected')
+    markers[marker] = o
+    return marker
+
+def _has_plan(o: object) -> bool:
+    return type(o) in _dataclass_plans or (is_dataclass(o) and not isinstance(o, type))
+
+def _is_plain(o: object) -> bool:
+    """ Whether o is worth leaving to the native encoder: no dataclass, or list of them, at its top.
+        Deeper dataclasses are still written correctly by it, through _default.
+    """
+    if isinstance(o, (list, tuple)):
+        return not o or not _has_plan(o[0])
+    return not _has_plan(o)
+
+def _native_encoder(markers: dict[int, object]):
+    # the C accelerated encoder of the json module, with the arguments json.dumps() passes by default
+    return _c_make_encoder(markers, _default, _encode_str, None, ': ', ', ', False, False, True)
 
 def dumps(o: object) -> str:
-    return json.dumps(o, cls=JSONEncoder)
+    """ Same output as json.dumps(o, cls=JSONEncoder), but writes dataclasses field by field
+        instead of copying them with asdict(). Plain json data is left to the native encoder
+        of the json module when that is available.
+    """
+    out = []
+    _write(o, out, {})
+    return ''.join(out)
 
 def asdataclass(t: type[T], data: dict[str, Any]) -> T:
     # convert deferred type hint strings to real types for this dataclass
@@ -162,7 +315,7 @@ def _convert_to_type(t: type[T], data: object) -> T:
         else:
             t = t_not_none
     if is_dataclass(t):
-        return asdataclass(t, data)
+        return data if isinstance(data, t) else asdataclass(t, data)
     elif t is datetime:
         return data if isinstance(data, datetime) else datetime.fromisoformat(data)
     elif get_origin(t) is list:
@@ -171,6 +324,8 @@ def _convert_to_type(t: type[T], data: object) -> T:
         for item in data:
             result.append(_convert_to_type(type_in_list, item))
         return result
+    if t is str:
+        return sys.intern(str(data))
     return t(data)
 
 def _is_optional(t: type) -> type | None:
@@ -0,0 +1,23 @@
+""" Migrates the database schema to the latest revision.
+
+Run with python -m bast1aan.jira_reader.migrate before starting the app workers, together
+with MIGRATIONS=external so the workers only wait for it.
+"""
+import asyncio
+import logging
+
+from .adapters.alembic.jira_reader import AlembicSQLInitializer
+from .adapters.sqlstorage import SQLStorage, Base
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    storage = SQLStorage(AlembicSQLInitializer(Base.metadata))
+    await storage.set_up()
+    logger.info('Database schema is up to date')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,15 +1,51 @@
-from dataclasses import is_dataclass, astuple
-from typing import TypeVar
+from dataclasses import is_dataclass, fields
+from typing import TypeVar, Callable, Hashable, Sequence
 
 T = TypeVar('T')
 
-def overridable(cls: type[T]) -> type[T]:
-    """ Override the comparison behaviour to allow subclasses """
+def overridable(cls: type[T] | None = None, *, expensive: Sequence[str] = ()) -> type[T] | Callable[[type[T]], type[T]]:
+    """ Override the comparison behaviour to allow subclasses.
+
+        Fields are compared one by one, those named in expensive last. For those, objects can
+        offer a content_hash(field_name) method; equal hashes are taken as equal values. A hash
+        must only be offered while the value can not have changed since it was taken.
+    """
+    if cls is None:
+        return lambda cls: overridable(cls, expensive=expensive)
     if not is_dataclass(cls):
         raise TypeError(f'{cls} must be dataclass')
 
+    names = tuple(f.name for f in fields(cls))
+    unknown = set(expensive) - set(names)
+    if unknown:
+        raise TypeError(f'{", ".join(sorted(unknown))} not fields of {cls}')
+    cheap = tuple(name for name in names if name not in expensive)
+    expensive = tuple(name for name in names if name in expensive)
+
     def __eq__(self: T, other: T) -> bool:
-        return is_dataclass(other) and (self is other or astuple(self) == astuple(other))
+        if self is other:
+            return True
+        if not is_dataclass(other) or len(fields(other)) != len(names):
+            return False
+        try:
+            for name in cheap:
+                if getattr(self, name) != getattr(other, name):
+                    return False
+            for name in expensive:
+                # before reading the values, which may invalidate the hashes
+                content_hash = _content_hash(self, name)
+                if content_hash is not None and content_hash == _content_hash(other, name):
+                    continue
+                value, other_value = getattr(self, name), getattr(other, name)
+                if value is not other_value and value != other_value:
+                    return False
+        except AttributeError:
+            return False
+        return True
 
     cls.__eq__ = __eq__
     return cls
+
+def _content_hash(o: object, field_name: str) -> Hashable | None:
+    content_hash = getattr(o, 'content_hash', None)
+    return content_hash(field_name) if content_hash else None
@@ -0,0 +1,153 @@
+""" Keeps computed histories up to date in the background """
+import asyncio
+import logging
+import queue
+import threading
+from typing import Awaitable, Callable, ClassVar
+
+from .entities import Storage, Request, IssueData
+from .jira import compute_issue_data
+from .timeline_index import update_timeline_index
+
+logger = logging.getLogger(__name__)
+
+# computes the issue data of a request, incrementally if given the previous issue data
+Compute = Callable[[Request, IssueData | None], Awaitable[IssueData]]
+
+async def compute_in_process(request: Request, previous: IssueData | None = None) -> IssueData:
+    return compute_issue_data(request, previous)
+
+async def compute_outdated_histories(
+        storage: Storage,
+        compute: Compute = compute_in_process,
+        batch_size: int = 500
+) -> tuple[list[str], dict[str, str]]:
+    """ Computes the history of every issue that has a request newer than its issue data.
+        Returns the computed issues and the errors per issue that could not be computed.
+    """
+    computed = []
+    errors = {}
+    after_issue = None
+    while requests := [
+        request async for request in storage.get_outdated_requests(after_issue=after_issue, limit=batch_size)
+    ]:
+        after_issue = requests[-1].issue
+        results = await asyncio.gather(*(compute(request, None) for request in requests), return_exceptions=True)
+        issue_datas = []
+        for request, result in zip(requests, results):
+            if isinstance(result, Exception):
+                errors[request.issue] = f'{type(result).__name__}: {result}'
+            else:
+                issue_datas.append(result)
+                computed.append(request.issue)
+        await storage.save_issue_datas(issue_datas)
+    return computed, errors
+
+
+class HistoryPipeline:
+    """ Computes histories in a background thread, so requests never wait for it.
+
+        eager: the history of an issue is computed as soon as a request of it is saved.
+        lazy: reading histories triggers computing all outdated ones.
+        off: histories are only computed on explicit compute-history calls.
+
+        Work is deduplicated and bounded by max_queue; what does not fit is dropped, to
+        be picked up by the next trigger.
+
+        With index_timelines, the timeline index is brought up to date after computing, and
+        whenever issue data is saved elsewhere, so reading timelines never calculates them.
+    """
+    EAGER: ClassVar[str] = 'eager'
+    LAZY: ClassVar[str] = 'lazy'
+    OFF: ClassVar[str] = 'off'
+
+    _ALL_OUTDATED: ClassVar[None] = None  # queue item for computing every outdated history
+    _TIMELINES: ClassVar[str] = ''  # queue item for indexing timelines, no issue key is empty
+
+    def __init__(
+            self,
+            storage: Callable[[], Awaitable[Storage]],
+            mode: str = EAGER,
+            max_queue: int = 1000,
+            compute: Compute = compute_in_process,
+            index_timelines: bool = False
+    ):
+        if mode not in (self.EAGER, self.LAZY, self.OFF):
+            raise ValueError(f'Invalid history pipeline mode {mode}')
+        self.mode = mode
+        self._storage = storage
+        self._compute = compute
+        self.index_timelines = index_timelines
+        self._queue: queue.Queue[str | None] = queue.Queue(maxsize=max_queue)
+        self._pending: set[str | None] = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def request_saved(self, issue: str) -> None:
+        if self.mode == self.EAGER:
+            self._put(issue)
+
+    def histories_read(self) -> None:
+        if self.mode == self.LAZY:
+            self._put(self._ALL_OUTDATED)
+
+    def issue_data_saved(self) -> None:
+        if self.index_timelines:
+            self._put(self._TIMELINES)
+
+    def join(self) -> None:
+        """ Waits until all scheduled work is done. """
+        self._queue.join()
+
+    def _put(self, item: str | None) -> None:
+        with self._lock:
+            if item in self._pending:
+                return
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                logger.warning('History pipeline queue full, dropping %s', _describe(item))
+                return
+            self._pending.add(item)
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='history-pipeline', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                item = self._queue.get()
+                with self._lock:
+                    # new requests arriving from now on need a new computation
+                    self._pending.discard(item)
+                try:
+                    loop.run_until_complete(self._process(item))
+                except Exception:
+                    logger.exception('Processing %s failed', _describe(item))
+                finally:
+                    self._queue.task_done()
+        finally:
+            loop.close()
+
+    async def _process(self, item: str | None) -> None:
+        storage = await self._storage()
+        if item is self._ALL_OUTDATED:
+            computed, errors = await compute_outdated_histories(storage, self._compute)
+            for issue, error in errors.items():
+                logger.warning('Computing history of %s failed: %s', issue, error)
+        elif item != self._TIMELINES:
+            status = await storage.get_issue_status(item)
+            if status.history_is_outdated and status.requested:
+                request = await storage.get_latest_request(item)
+                await storage.save_issue_data(await self._compute(request, status.issue_data))
+        if self.index_timelines:
+            await update_timeline_index(storage)
+
+
+def _describe(item: str | None) -> str:
+    if item is HistoryPipeline._ALL_OUTDATED:
+        return 'all outdated histories'
+    if item == HistoryPipeline._TIMELINES:
+        return 'the timeline index'
+    return f'the history of {item}'
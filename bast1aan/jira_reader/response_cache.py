@@ -0,0 +1,85 @@
+""" Rendered responses kept in memory, until the data they were rendered from changes """
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str  # strong, without quotes
+
+    @classmethod
+    def of(cls, body: str | bytes) -> 'CachedResponse':
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return cls(body, hashlib.blake2b(body, digest_size=16).hexdigest())
+
+
+class SharedCache(ABC):
+    """ A cache tier shared by all worker processes on a host """
+    @abstractmethod
+    def get(self, key: str, generation: int) -> CachedResponse | None:
+        """ The response stored under key at generation, None if absent or of another generation """
+    @abstractmethod
+    def put(self, key: str, generation: int, response: CachedResponse) -> None: ...
+
+
+class ResponseCache:
+    """ Least recently used responses, their bodies together at most max_bytes. An entry is
+        only valid for the storage generation it was rendered at.
+
+        With a shared cache, local misses are looked up there and new responses are stored
+        there too, so a response rendered by one worker process is reused by the others.
+    """
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, shared: SharedCache | None = None):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries: OrderedDict[Hashable, tuple[int, CachedResponse]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, generation: int) -> CachedResponse | None:
+        response = self._get_local(key, generation)
+        if response or not self.shared:
+            return response
+        response = self.shared.get(repr(key), generation)
+        if response:
+            self._put_local(key, generation, response)
+        return response
+
+    def put(self, key: Hashable, generation: int, body: str | bytes) -> CachedResponse:
+        response = CachedResponse.of(body)
+        if self.shared:
+            self.shared.put(repr(key), generation, response)
+        self._put_local(key, generation, response)
+        return response
+
+    def _get_local(self, key: Hashable, generation: int) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            if entry[0] != generation:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _put_local(self, key: Hashable, generation: int, response: CachedResponse) -> None:
+        if len(response.body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = generation, response
+            self._size += len(response.body)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable) -> None:
+        _, response = self._entries.pop(key)
+        self._size -= len(response.body)
@@ -1,19 +1,46 @@
+import asyncio
+import atexit
+import base64
+import concurrent.futures
+import gzip
+import hmac
 import json
-from dataclasses import asdict
+import re
+import threading
 from datetime import datetime
+from typing import Any, Callable, Awaitable, Coroutine, Hashable, Sequence, TypeVar
 
 from flask import Flask, Response, request as flask_request
 
-from bast1aan.jira_reader import json_mapper, calendar
+from bast1aan.jira_reader import json_mapper, calendar, compression, settings
 from bast1aan.jira_reader.adapters.alembic.jira_reader import AlembicSQLInitializer
 from bast1aan.jira_reader.adapters.async_executor import AioHttpAdapter
+from bast1aan.jira_reader.adapters.shared_cache import SQLiteSharedCache
+from bast1aan.jira_reader.adapters.memorystorage import MemoryStorage
 from bast1aan.jira_reader.adapters.sqlstorage import SQLStorage, Base
 from bast1aan.jira_reader.async_executor import Executor, ExecutorException
-from bast1aan.jira_reader.entities import Request, IssueData, JSONable
+from bast1aan.jira_reader.entities import Request, IssueData, IssueDataFilter, JSONable, Timeline, Storage
 from bast1aan.jira_reader.ical import to_ical
-from bast1aan.jira_reader.jira import RequestTicketData, ComputeTicketHistory, calculate_timelines
+from bast1aan.jira_reader.jira import RequestTicketData, calculate_timelines, compute_issue_data
+from bast1aan.jira_reader.pipeline import HistoryPipeline, compute_outdated_histories
+from bast1aan.jira_reader.response_cache import ResponseCache
+from bast1aan.jira_reader.sync import SyncWorker, worker_from_settings
+from bast1aan.jira_reader.timeline_index import query_timelines
+from bast1aan.jira_reader.webhook import WebhookInbox
 
-app = Flask(__name__)
+T = TypeVar('T')
+
+class _App(Flask):
+    def async_to_sync(self, func: Callable[..., Coroutine[Any, Any, T]]) -> Callable[..., T]:
+        """ Runs async views on the event loop of the app, instead of on a new loop per request,
+            so the storage keeps its engine and pooled connections between requests.
+        """
+        def run(*args, **kwargs) -> T:
+            return _run_in_app_loop(func(*args, **kwargs))
+        return run
+
+app = _App(__name__)
+app.after_request(compression.compress_response)
 
 @app.post("/api/jira/fetch-data/<issue>")
 async def fetch_data_post(issue: str) -> Response:
@@ -23,6 +50,7 @@ async def fetch_data_post(issue: str) -> Response:
     try:
         result = await execute(action)
         await storage.save_request(Request(issue=issue, result=result))
+        (await _history_pipeline()).request_saved(issue)
     except ExecutorException as e:
         return _result_response(e.args[1], status=e.args[0])
     return _result_response(result, status=201)
@@ -30,10 +58,15 @@ async def fetch_data_post(issue: str) -> Response:
 @app.get("/api/jira/fetch-data/<issue>")
 async def fetch_data_get(issue: str) -> Response:
     storage = await _sql_storage()
-    latest_request = await storage.get_latest_request(issue)
-    if not latest_request:
+    result_gzip = await storage.get_latest_result_gzip(issue)
+    if result_gzip is None:
         return _result_response({"error": "Issue not found in database"}, status=404)
-    return _result_response(latest_request.result)
+    if compression.negotiate(len(result_gzip)) and flask_request.accept_encodings[compression.GZIP]:
+        # as stored, without compressing again
+        response = app.response_class(result_gzip, mimetype="application/json")
+        response.headers['Content-Encoding'] = compression.GZIP
+        return response
+    return app.response_class(gzip.decompress(result_gzip), mimetype="application/json")
 
 def _result_response(result: JSONable, status: int = 200) -> Response:
     return app.response_class(json.dumps(result), mimetype="application/json", status=status)
@@ -41,85 +74,471 @@ def _result_response(result: JSONable, status: int = 200) -> Response:
 @app.post("/api/jira/compute-history/<issue>")
 async def compute_history(issue: str) -> Response:
     storage = await _sql_storage()
-    latest_issue_data = await storage.get_issue_data(issue)
-    latest_request = await storage.get_latest_request(issue)
+    status = await storage.get_issue_status(issue)
+    latest_issue_data = status.issue_data
     created = False
-    if _history_is_outdated(latest_request, latest_issue_data):
+    if status.history_is_outdated:
+        # only now load the request, with its possibly large result
+        latest_request = await storage.get_latest_request(issue) if status.requested else None
         if not latest_request:
             return app.response_class('{"error": "Issue not found in database"}', mimetype="application/json",
                                       status=404)
-        result = latest_request.result
-        action = ComputeTicketHistory()
-        history = action.get_response(result)
-        latest_issue_data = IssueData(
-            issue=issue,
-            history={
-                "items": [asdict(item) for item in history.items],
-                "comments": [asdict(comment) for comment in history.comments],
-            },
-            issue_id=history.issue_id,
-            project_id=history.project_id,
-            summary=history.summary,
-            created=history.created,
-            created_by=history.created_by,
-        )
-        latest_issue_data = await storage.save_issue_data(latest_issue_data)
+        latest_issue_data = await storage.save_issue_data(compute_issue_data(latest_request, status.issue_data))
+        (await _history_pipeline()).issue_data_saved()
         created = True
     return app.response_class(json_mapper.dumps(latest_issue_data), status=201 if created else 200, mimetype="application/json")
 
-def _history_is_outdated(latest_request: Request | None, latest_issue_data: IssueData | None) -> bool:
-    return not latest_issue_data or not latest_request or \
-        latest_request.requested > latest_issue_data.computed or \
-        latest_issue_data.created_by is None or latest_issue_data.created is None
+@app.post("/api/jira/compute-history")
+async def compute_histories() -> Response:
+    """ Computes the history of every issue that has a request newer than its issue data. """
+    storage = await _sql_storage()
+    computed, errors = await compute_outdated_histories(storage, _compute_in_pool, COMPUTE_BATCH_SIZE)
+    if computed:
+        (await _history_pipeline()).issue_data_saved()
+    return _result_response({'computed': computed, 'errors': errors}, status=201 if computed else 200)
+
+@app.post("/api/jira/webhook")
+async def webhook() -> Response:
+    """ Receiver for Jira issue updated and comment webhooks.
+
+        The delivery must carry WEBHOOK_SECRET, in the X-Webhook-Token header or the token query argument.
+        Without that setting no delivery is accepted.
+    """
+    token = flask_request.headers.get('X-Webhook-Token') or flask_request.args.get('token')
+    if not token:
+        return _result_response({'error': 'Missing webhook token'}, status=401)
+    if not settings.WEBHOOK_SECRET or not hmac.compare_digest(token.encode(), settings.WEBHOOK_SECRET.encode()):
+        return _result_response({'error': 'Invalid webhook token'}, status=403)
+    event = flask_request.get_json(silent=True)
+    if not isinstance(event, dict):
+        return _result_response({'error': 'Expected a json object'}, status=400)
+    inbox = await _webhook_inbox()
+    result = await inbox.receive(event, delivery_id=flask_request.headers.get('X-Atlassian-Webhook-Identifier'))
+    return _result_response({'result': result}, status=202)
 
 @app.route("/api/jira/timeline/<display_name>")
 async def timeline(display_name: str) -> Response:
     storage = await _sql_storage()
+    (await _history_pipeline()).histories_read()
 
-    from_ = None
-    if 'from' in flask_request.args:
-        from_ = datetime.fromisoformat(flask_request.args['from'])
+    from_, to_ = _window()
 
-    results = [
-        timeline
-            async for issue_data in storage.get_recent_issue_datas(from_=from_)
-            for timeline in calculate_timelines(issue_data, display_name, from_=from_)
-    ]
+    async def render() -> str:
+        return json_mapper.dumps({'results': (await _timelines(storage, [display_name], from_, to_))[display_name]})
+
+    return await _cached_response(storage, ('timeline', display_name, from_, to_), render, mimetype="application/json")
+
+@app.get("/api/jira/timelines")
+async def timelines() -> Response:
+    """ Indexed timelines, optionally of one person and one issue, within [from, to) """
+    storage = await _sql_storage()
+    (await _history_pipeline()).histories_read()
+
+    from_, to_ = _window()
+    results = await query_timelines(
+        storage,
+        display_name=flask_request.args.get('person'),
+        issue=flask_request.args.get('issue'),
+        from_=from_,
+        to_=to_,
+    )
     return app.response_class(json_mapper.dumps({'results': results}), mimetype="application/json")
 
 @app.route("/api/jira/timeline-ical/<display_name>")
 async def timeline_as_ical(display_name: str) -> Response:
     storage = await _sql_storage()
+    (await _sync_worker()).subscribed(display_name)
+    (await _history_pipeline()).histories_read()
 
-    from_ = None
-    if 'from' in flask_request.args:
-        from_ = datetime.fromisoformat(flask_request.args['from'])
+    from_, to_ = _window()
+
+    async def render() -> bytes:
+        return _ical(display_name, (await _timelines(storage, [display_name], from_, to_))[display_name])
+
+    return await _cached_response(
+        storage,
+        ('timeline-ical', display_name, from_, to_),
+        render,
+        mimetype="text/calendar",
+        headers={'Content-Disposition': 'attachment; filename="jira-reader {}.ics"'.format(display_name)}
+    )
+
+@app.get("/api/jira/team-timeline")
+@app.get("/api/jira/team-timeline/<team>")
+async def team_timeline(team: str | None = None) -> Response:
+    """ Timelines of the people in the person query parameters, or of a team, by person """
+    people = _people(team)
+    if not people:
+        return _result_response({'error': 'Unknown team' if team else 'No person given'}, status=404 if team else 400)
+    storage = await _sql_storage()
+    (await _history_pipeline()).histories_read()
+
+    from_, to_ = _window()
+
+    async def render() -> str:
+        return json_mapper.dumps({'results': await _timelines(storage, people, from_, to_)})
+
+    return await _cached_response(storage, ('team-timeline', people, from_, to_), render, mimetype="application/json")
+
+@app.get("/api/jira/team-timeline-ical")
+@app.get("/api/jira/team-timeline-ical/<team>")
+async def team_timeline_as_ical(team: str | None = None) -> Response:
+    """ One calendar with the timelines of the people in the person query parameters, or of a team """
+    people = _people(team)
+    if not people:
+        return _result_response({'error': 'Unknown team' if team else 'No person given'}, status=404 if team else 400)
+    storage = await _sql_storage()
+    sync_worker = await _sync_worker()
+    for display_name in people:
+        sync_worker.subscribed(display_name)
+    (await _history_pipeline()).histories_read()
+
+    from_, to_ = _window()
+    name = team or ', '.join(people)
+
+    async def render() -> bytes:
+        timelines = await _timelines(storage, people, from_, to_)
+        return _ical(name, [timeline for display_name in people for timeline in timelines[display_name]])
+
+    return await _cached_response(
+        storage,
+        ('team-timeline-ical', people, from_, to_),
+        render,
+        mimetype="text/calendar",
+        headers={'Content-Disposition': 'attachment; filename="jira-reader {}.ics"'.format(name)}
+    )
+
+@app.get("/api/jira/issues")
+async def issues() -> Response:
+    """ Latest issue data of the stored issues, a page at a time """
+    return await _issue_data_page(latest_only=True)
+
+@app.get("/api/jira/issue-data")
+async def issue_datas() -> Response:
+    """ Every stored issue data, all history snapshots of each issue, a page at a time """
+    return await _issue_data_page(latest_only=False)
+
+async def _issue_data_page(latest_only: bool) -> Response:
+    """ Filtered by project and [created_from, created_to) and [computed_from, computed_to),
+        with history only if history=1.
+    """
+    storage = await _sql_storage()
+    try:
+        after, limit = _page()
+        project = flask_request.args.get('project')
+        filter = IssueDataFilter(
+            project_id=int(project) if project is not None else None,
+            created_from=_datetime_arg('created_from'),
+            created_to=_datetime_arg('created_to'),
+            computed_from=_datetime_arg('computed_from'),
+            computed_to=_datetime_arg('computed_to'),
+        )
+    except ValueError as e:
+        return _result_response({'error': str(e)}, status=400)
+    results = [
+        issue_data async for issue_data in storage.get_issue_data_page(
+            after=after,
+            limit=limit,
+            filter=filter,
+            latest_only=latest_only,
+            with_history=flask_request.args.get('history') == '1',
+        )
+    ]
+    return _page_response(results, limit, lambda issue_data: (issue_data.issue, issue_data.computed))
 
-    events = [
-        calendar.event_from_timeline(timeline)
-            async for issue_data in storage.get_recent_issue_datas(from_=from_)
-            for timeline in calculate_timelines(issue_data, display_name, from_=from_)
+@app.get("/api/jira/requests")
+async def requests() -> Response:
+    """ Stored requests, optionally of one issue and within [requested_from, requested_to), a
+        page at a time, with result only if result=1.
+    """
+    storage = await _sql_storage()
+    try:
+        after, limit = _page()
+        requested_from = _datetime_arg('requested_from')
+        requested_to = _datetime_arg('requested_to')
+    except ValueError as e:
+        return _result_response({'error': str(e)}, status=400)
+    results = [
+        request async for request in storage.get_request_page(
+            after=after,
+            limit=limit,
+            issue=flask_request.args.get('issue'),
+            requested_from=requested_from,
+            requested_to=requested_to,
+            with_result=flask_request.args.get('result') == '1',
+        )
     ]
+    return _page_response(results, limit, lambda request: (request.issue, request.requested))
 
-    ical_body = to_ical(
+def _page() -> tuple[tuple[str, datetime] | None, int]:
+    """ The key to continue after, from the cursor query parameter, and the page size """
+    limit = int(flask_request.args.get('limit', PAGE_SIZE))
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    cursor = flask_request.args.get('cursor')
+    if not cursor:
+        return None, limit
+    try:
+        issue, time = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (issue, datetime.fromisoformat(time)), limit
+    except (TypeError, ValueError, UnicodeError) as e:  # binascii.Error is a ValueError
+        raise ValueError('Invalid cursor') from e
+
+def _page_response(results: Sequence[T], limit: int, key: Callable[[T], tuple[str, datetime]]) -> Response:
+    """ The results with the cursor of the next page, None on the last page. The cursor is the
+        key of the last result, for seeking rather than counting past the previous pages.
+    """
+    cursor = None
+    if len(results) >= limit:
+        issue, time = key(results[-1])
+        cursor = base64.urlsafe_b64encode(json.dumps([issue, time.isoformat()]).encode('utf-8')).decode('ascii')
+    return app.response_class(json_mapper.dumps({'results': results, 'next': cursor}), mimetype="application/json")
+
+def _datetime_arg(name: str) -> datetime | None:
+    value = flask_request.args.get(name)
+    return datetime.fromisoformat(value) if value is not None else None
+
+def _ical(name: str, timelines: Sequence[Timeline]) -> bytes:
+    return to_ical(
         calendar.Calendar(
-            calendar_name='jira-reader %s' % display_name
+            calendar_name='jira-reader %s' % name
         ),
-        events
+        [calendar.event_from_timeline(timeline) for timeline in timelines]
     )
 
-    return app.response_class(
-        response=ical_body,
-        mimetype="text/calendar",
-        headers={'Content-Disposition': 'attachment; filename="jira-reader {}.ics"'.format(display_name)}
-    )
+def _people(team: str | None) -> tuple[str, ...]:
+    """ The person query parameters, or the comma separated people of setting TEAM_<team> """
+    if team is None:
+        return tuple(dict.fromkeys(flask_request.args.getlist('person')))
+    members = getattr(settings, 'TEAM_' + re.sub(r'\W', '_', team).upper())
+    return tuple(dict.fromkeys(name.strip() for name in (members or '').split(',') if name.strip()))
 
+async def _cached_response(
+        storage: Storage,
+        key: Hashable,
+        render: Callable[[], Awaitable[str | bytes]],
+        mimetype: str,
+        headers: dict[str, str] | None = None
+) -> Response:
+    """ The rendered body from the response cache, rendered again after any issue data was saved.
+        Compressed bodies are cached as well. Answers 304 Not Modified if the client already has it.
+    """
+    cache = _response_cache()
+    # read before rendering, so data saved while rendering invalidates the entry
+    generation = await storage.get_generation()
+    cached = cache.get(key, generation)
+    if not cached:
+        cached = cache.put(key, generation, await render())
+    encoding = compression.negotiate(len(cached.body))
+    if encoding:
+        uncompressed = cached
+        cached = cache.get((key, encoding), generation)
+        if not cached:
+            cached = cache.put((key, encoding), generation, compression.compress(uncompressed.body, encoding))
+    response = app.response_class(response=cached.body, mimetype=mimetype, headers=headers)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(cached.etag)
+    return response.make_conditional(flask_request)
+
+def _window() -> tuple[datetime | None, datetime | None]:
+    """ The [from, to) query parameters """
+    from_ = to_ = None
+    if 'from' in flask_request.args:
+        from_ = datetime.fromisoformat(flask_request.args['from'])
+    if 'to' in flask_request.args:
+        to_ = datetime.fromisoformat(flask_request.args['to'])
+    return from_, to_
+
+async def _timelines(
+        storage: Storage,
+        display_names: Sequence[str],
+        from_: datetime | None,
+        to_: datetime | None
+) -> dict[str, list[Timeline]]:
+    """ By person, from the timeline index, or calculated on each request with TIMELINE_INDEX=off """
+    if settings.TIMELINE_INDEX == 'off':
+        return await _calculate_timelines(storage, display_names, from_, to_)
+    results = {display_name: [] for display_name in display_names}
+    for timeline in await query_timelines(storage, from_=from_, to_=to_, display_names=display_names):
+        results[timeline.display_name].append(timeline)
+    return results
+
+async def _calculate_timelines(
+        storage: Storage,
+        display_names: Sequence[str],
+        from_: datetime | None,
+        to_: datetime | None
+) -> dict[str, list[Timeline]]:
+    """ Timelines of all issues within [from_, to_) by person, in a single pass over the issues.
+        With from_, resumed from and saving checkpoints before from_.
+    """
+    checkpoints = {}
+    if from_:
+        for display_name in display_names:
+            async for checkpoint in storage.get_timeline_checkpoints(display_name):
+                checkpoints[display_name, checkpoint.issue] = checkpoint
+    new_checkpoints = []
+    results = {display_name: [] for display_name in display_names}
+    async for issue_data in storage.get_recent_issue_datas(from_=from_, to_=to_):
+        for display_name in display_names:
+            results[display_name].extend(calculate_timelines(
+                issue_data,
+                display_name,
+                from_=from_,
+                checkpoint=checkpoints.get((display_name, issue_data.issue)),
+                on_checkpoint=new_checkpoints.append,
+                to_=to_,
+            ))
+    if new_checkpoints:
+        await storage.save_timeline_checkpoints(new_checkpoints)
+    return results
+
+COMPUTE_BATCH_SIZE = 500
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+_loop = None
 _storage = None
+_pool = None
+_pipeline = None
+_sync = None
+_inbox = None
+_cache = None
+
+# the singletons are reached from request handlers and from the pipeline, sync and webhook
+# threads, each with their own event loop. _lock guards those created without awaiting,
+# _storage_lock the storage, which is awaited while set up.
+_lock = threading.Lock()
+_storage_lock = threading.Lock()
+
+def _app_loop() -> asyncio.AbstractEventLoop:
+    """ One event loop per app for the async views and startup, running in a thread of its own """
+    global _loop
+    with _lock:
+        if not _loop:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='app-loop', daemon=True).start()
+        return _loop
+
+def _run_in_app_loop(coro: Coroutine[Any, Any, T]) -> T:
+    # the task runs in a copy of the context of the calling thread, with its flask request
+    return asyncio.run_coroutine_threadsafe(coro, _app_loop()).result()
+
+def _compute_pool() -> concurrent.futures.Executor:
+    """ One process pool per app for cpu bound history computation """
+    global _pool
+    with _lock:
+        if not _pool:
+            workers = settings.COMPUTE_HISTORY_WORKERS
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=int(workers) if workers else None)
+            atexit.register(_pool.shutdown, cancel_futures=True)
+        return _pool
 
-async def _sql_storage() -> SQLStorage:
-    """ One storage instance per app """
+async def _compute_in_pool(request: Request, previous: IssueData | None = None) -> IssueData:
+    return await asyncio.get_running_loop().run_in_executor(_compute_pool(), compute_issue_data, request, previous)
+
+def _response_cache() -> ResponseCache:
+    """ One response cache per app, of RESPONSE_CACHE_SIZE bytes. With RESPONSE_CACHE_FILE, backed
+        by a cache file of RESPONSE_CACHE_FILE_SIZE bytes shared with the other worker processes.
+    """
+    global _cache
+    with _lock:
+        if not _cache:
+            size = settings.RESPONSE_CACHE_SIZE
+            shared = None
+            if settings.RESPONSE_CACHE_FILE:
+                file_size = settings.RESPONSE_CACHE_FILE_SIZE
+                shared = SQLiteSharedCache(
+                    settings.RESPONSE_CACHE_FILE,
+                    max_bytes=int(file_size) if file_size else 256 * 1024 * 1024,
+                )
+                atexit.register(shared.close)
+            _cache = ResponseCache(max_bytes=int(size) if size else 32 * 1024 * 1024, shared=shared)
+        return _cache
+
+async def _history_pipeline() -> HistoryPipeline:
+    """ One history pipeline per app, mode and queue size from settings """
+    global _pipeline
+    with _lock:
+        if not _pipeline:
+            _pipeline = HistoryPipeline(
+                _sql_storage,
+                mode=settings.HISTORY_PIPELINE or HistoryPipeline.EAGER,
+                max_queue=int(settings.HISTORY_PIPELINE_QUEUE_SIZE or 1000),
+                compute=_compute_in_pool,
+                index_timelines=settings.TIMELINE_INDEX != 'off',
+            )
+        return _pipeline
+
+async def _sql_storage() -> Storage:
+    """ One storage instance per app. With MIGRATIONS=external, the database is migrated by the
+        migrate entry point and the app only waits for it. With STORAGE_TIER=memory, reads are
+        served from memory, loaded from and written through to the database. That requires the
+        app to be the only writer: with SYNC_WORKER=app, in one worker process, and no sync process.
+    """
     global _storage
-    if not _storage:
-        _storage = SQLStorage(AlembicSQLInitializer(Base.metadata))
-        await _storage.set_up()
-    return _storage
+    if _storage:
+        return _storage
+    # without blocking the event loop while another thread sets up the storage
+    await asyncio.to_thread(_storage_lock.acquire)
+    try:
+        if not _storage:
+            storage = SQLStorage(AlembicSQLInitializer(Base.metadata, migrate=settings.MIGRATIONS != 'external'))
+            if settings.STORAGE_TIER == 'memory':
+                # reads from memory would not see what other processes write
+                if settings.SYNC_WORKER != 'app':
+                    raise ValueError('STORAGE_TIER=memory needs SYNC_WORKER=app, the app must be the only writer')
+                storage.claim_writer(only=True)
+            else:
+                storage.claim_writer()
+            await storage.set_up()
+            if settings.STORAGE_TIER == 'memory':
+                storage = MemoryStorage(backing=storage)
+                await storage.load()
+            _storage = storage
+        return _storage
+    finally:
+        _storage_lock.release()
+
+def startup() -> None:
+    """ Prepares the storage before serving, so no request waits for the migrations, starts
+        the sync worker if SYNC_WORKER=app and brings the timeline index up to date in the background.
+    """
+    async def prepare() -> None:
+        await _sync_worker()
+        (await _history_pipeline()).issue_data_saved()
+        await _sql_storage()
+
+    _run_in_app_loop(prepare())
+
+def create_app() -> Flask:
+    """ The app after startup, for serving with hypercorn 'bast1aan.jira_reader.rest_api:create_app()' """
+    startup()
+    return app
+
+async def _sync_worker() -> SyncWorker:
+    """ One sync worker per app, running next to it if SYNC_WORKER=app """
+    global _sync
+    pipeline = await _history_pipeline()
+    with _lock:
+        if not _sync:
+            _sync = worker_from_settings(_sql_storage, Executor(AioHttpAdapter()), pipeline.request_saved)
+            if settings.SYNC_WORKER == 'app':
+                _sync.start_in_thread()
+        return _sync
+
+async def _webhook_inbox() -> WebhookInbox:
+    """ One webhook inbox per app, fetching through the sync worker """
+    global _inbox
+    sync = await _sync_worker()
+    pipeline = await _history_pipeline()
+    with _lock:
+        if not _inbox:
+            _inbox = WebhookInbox(
+                _sql_storage,
+                sync.fetch,
+                window=float(settings.WEBHOOK_COALESCE_WINDOW or 5),
+                on_applied=pipeline.issue_data_saved,
+            )
+        return _inbox
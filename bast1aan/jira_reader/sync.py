@@ -0,0 +1,225 @@
+""" Keeps fetched issues fresh, refreshing hot issues more often than the long tail.
+
+Run as a separate process with python -m bast1aan.jira_reader.sync, or inside the
+app with SYNC_WORKER=app.
+"""
+import asyncio
+import heapq
+import logging
+import threading
+from dataclasses import dataclass, field, is_dataclass
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Awaitable, Callable, Iterable, ClassVar
+
+from typing_extensions import Self
+
+from . import settings
+from .adapters import datetime as datetime_adapter
+from .async_executor import Executor, ExecutorException
+from .entities import IssueData, IssueStatus, Request, Storage
+from .jira import RequestTicketData
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RefreshPolicy:
+    """ Issues active right now are refreshed every min_interval, an issue that has been
+        inactive for a day every 2 * min_interval, and so on, up to max_interval. Issues
+        involving people with a calendar subscription are refreshed subscriber_factor
+        times as often.
+    """
+    min_interval: timedelta = timedelta(minutes=5)
+    max_interval: timedelta = timedelta(days=1)
+    activity_unit: timedelta = timedelta(days=1)
+    subscriber_factor: float = 4.0
+
+    @classmethod
+    def from_settings(cls) -> Self:
+        policy = cls()
+        if settings.SYNC_MIN_INTERVAL:
+            policy.min_interval = timedelta(seconds=int(settings.SYNC_MIN_INTERVAL))
+        if settings.SYNC_MAX_INTERVAL:
+            policy.max_interval = timedelta(seconds=int(settings.SYNC_MAX_INTERVAL))
+        return policy
+
+    def due(self, status: IssueStatus, now: datetime, subscribers: set[str]) -> datetime:
+        """ When the issue should be fetched again. """
+        if not status.requested:
+            return now
+        interval = self.max_interval
+        if status.issue_data:
+            last_activity = _last_activity(status.issue_data)
+            if last_activity:
+                inactive = max(now - last_activity, timedelta(0))
+                interval = self.min_interval * (1 + inactive / self.activity_unit)
+            if subscribers and not subscribers.isdisjoint(_people(status.issue_data)):
+                interval /= self.subscriber_factor
+        return status.requested + min(max(interval, self.min_interval), self.max_interval)
+
+
+def _get(o: dict | object, name: str) -> object:
+    return getattr(o, name) if is_dataclass(o) else o[name]
+
+def _local_naive(dt: datetime | str) -> datetime:
+    # requested and computed times are stored as naive local times
+    if isinstance(dt, str):
+        dt = datetime.fromisoformat(dt)
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+
+def _items(issue_data: IssueData) -> Iterable[object]:
+    return issue_data.history.get('items') or () if isinstance(issue_data.history, dict) else ()
+
+def _comments(issue_data: IssueData) -> Iterable[object]:
+    return issue_data.history.get('comments') or () if isinstance(issue_data.history, dict) else ()
+
+def _last_activity(issue_data: IssueData) -> datetime | None:
+    last = _local_naive(issue_data.created) if issue_data.created else None
+    for entry in chain(_items(issue_data), _comments(issue_data)):
+        created = _local_naive(_get(entry, 'created'))
+        if not last or created > last:
+            last = created
+    return last
+
+def _people(issue_data: IssueData) -> set[str]:
+    people = {issue_data.created_by}
+    for item in _items(issue_data):
+        people.add(_get(item, 'byDisplayName'))
+        for action in _get(item, 'actions'):
+            people.add(_get(action, 'toString'))
+            people.add(_get(action, 'fromString'))
+    for comment in _comments(issue_data):
+        people.add(_get(comment, 'byDisplayName'))
+    people.discard(None)
+    return people
+
+
+@dataclass
+class SyncWorker:
+    """ Fetches issues from Jira in order of when they are due, at most concurrency at a time,
+        counting the fetches of the webhook inbox and any other thread calling fetch().
+    """
+    storage: Callable[[], Awaitable[Storage]]
+    execute: Executor
+    policy: RefreshPolicy = field(default_factory=RefreshPolicy)
+    concurrency: int = 4
+    poll_interval: float = 60.0
+    on_saved: Callable[[str], None] = lambda issue: None
+    subscription_ttl: ClassVar[timedelta] = timedelta(days=1)
+
+    def __post_init__(self):
+        self._subscribers: dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        # shared by the event loops of all threads fetching through this worker
+        self._budget = threading.Semaphore(self.concurrency)
+
+    def subscribed(self, display_name: str) -> None:
+        """ Records a calendar subscriber, whose issues get priority. """
+        with self._lock:
+            self._subscribers[display_name] = datetime_adapter.now()
+
+    def _current_subscribers(self, now: datetime) -> set[str]:
+        with self._lock:
+            for display_name, seen in tuple(self._subscribers.items()):
+                if now - seen > self.subscription_ttl:
+                    del self._subscribers[display_name]
+            return set(self._subscribers)
+
+    async def due_issues(self) -> list[str]:
+        """ Issues due for refreshing, most overdue first. """
+        storage = await self.storage()
+        now = datetime_adapter.now()
+        subscribers = self._current_subscribers(now)
+        queue = []
+        async for status in storage.get_issue_statuses():
+            due = self.policy.due(status, now, subscribers)
+            if due <= now:
+                heapq.heappush(queue, (due, status.issue))
+        return [heapq.heappop(queue)[1] for _ in range(len(queue))]
+
+    async def fetch(self, issue: str) -> bool:
+        """ Fetches and saves a single issue, returns whether Jira returned it. """
+        storage = await self.storage()
+        if not self._budget.acquire(blocking=False):
+            # without blocking the event loop while other fetches use up the budget
+            await asyncio.to_thread(self._budget.acquire)
+        try:
+            result = await self.execute(RequestTicketData(issue))
+        except ExecutorException as e:
+            logger.warning('Fetching %s failed with status %s', issue, e.args[0])
+            return False
+        finally:
+            self._budget.release()
+        await storage.save_request(Request(issue=issue, result=result))
+        self.on_saved(issue)
+        return True
+
+    async def sync_once(self) -> list[str]:
+        """ Fetches all due issues, returns the ones successfully fetched. """
+        # so no more than concurrency of them wait for the budget of fetch()
+        budget = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(issue: str) -> str | None:
+            async with budget:
+                return issue if await self.fetch(issue) else None
+
+        results = await asyncio.gather(*(fetch(issue) for issue in await self.due_issues()), return_exceptions=True)
+        fetched = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error('Fetching failed', exc_info=result)
+            elif result:
+                fetched.append(result)
+        return fetched
+
+    async def run(self) -> None:
+        while True:
+            try:
+                fetched = await self.sync_once()
+                if fetched:
+                    logger.info('Fetched %d issues', len(fetched))
+            except Exception:
+                logger.exception('Sync failed')
+            await asyncio.sleep(self.poll_interval)
+
+    def start_in_thread(self) -> None:
+        """ Runs the worker in a thread with its own event loop, next to the app. """
+        with self._lock:
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=lambda: asyncio.run(self.run()), name='sync-worker', daemon=True)
+                self._thread.start()
+
+
+def worker_from_settings(storage: Callable[[], Awaitable[Storage]], execute: Executor, on_saved: Callable[[str], None]) -> SyncWorker:
+    return SyncWorker(
+        storage=storage,
+        execute=execute,
+        policy=RefreshPolicy.from_settings(),
+        concurrency=int(settings.SYNC_CONCURRENCY or 4),
+        poll_interval=float(settings.SYNC_POLL_INTERVAL or 60),
+        on_saved=on_saved,
+    )
+
+
+async def main() -> None:
+    from .adapters.alembic.jira_reader import AlembicSQLInitializer
+    from .adapters.async_executor import AioHttpAdapter
+    from .adapters.sqlstorage import SQLStorage, Base
+    from .pipeline import HistoryPipeline
+
+    storage = SQLStorage(AlembicSQLInitializer(Base.metadata))
+    storage.claim_writer()
+    await storage.set_up()
+
+    async def get_storage() -> Storage:
+        return storage
+
+    pipeline = HistoryPipeline(get_storage, mode=HistoryPipeline.EAGER, index_timelines=settings.TIMELINE_INDEX != 'off')
+    await worker_from_settings(get_storage, Executor(AioHttpAdapter()), pipeline.request_saved).run()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+""" Keeps the timelines of everyone on every issue indexed, for range and overlap queries """
+import logging
+from dataclasses import replace
+from datetime import datetime
+from typing import Collection, Iterable, Iterator
+
+from .entities import Storage, Timeline
+from .jira import calculate_timelines, timeline_people
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+
+async def update_timeline_index(storage: Storage, batch_size: int = BATCH_SIZE) -> int:
+    """ Indexes the timelines of issues with new issue data, returns the number of issues indexed.
+        Issue data whose timelines cannot be calculated is left unindexed, to be tried again next time.
+    """
+    indexed = 0
+    failed = set()
+    # past the ones failed in this run, which are still unindexed
+    while issue_datas := [
+        issue_data async for issue_data in storage.get_unindexed_issue_datas(limit=batch_size + len(failed))
+        if (issue_data.issue, issue_data.computed) not in failed
+    ]:
+        for issue_data in issue_datas:
+            try:
+                timelines = [
+                    timeline
+                    for display_name in sorted(timeline_people(issue_data))
+                    for timeline in calculate_timelines(issue_data, display_name)
+                ]
+            except Exception:
+                logger.exception('Calculating timelines of %s failed', issue_data.issue)
+                failed.add((issue_data.issue, issue_data.computed))
+                continue
+            await storage.save_timelines(issue_data, timelines)
+            indexed += 1
+    return indexed
+
+
+async def query_timelines(
+        storage: Storage,
+        display_name: str | None = None,
+        issue: str | None = None,
+        from_: datetime | None = None,
+        to_: datetime | None = None,
+        display_names: Collection[str] | None = None
+) -> list[Timeline]:
+    """ Timelines within [from_, to_), clipped to it, from the index as updated by update_timeline_index.
+        Of one person, or of any of display_names.
+    """
+    return list(clip(
+        [
+            timeline async for timeline in storage.get_timelines(
+                display_name, issue, from_=from_, to_=to_, display_names=display_names
+            )
+        ],
+        from_,
+        to_,
+    ))
+
+
+def clip(timelines: Iterable[Timeline], from_: datetime | None, to_: datetime | None) -> Iterator[Timeline]:
+    for timeline in timelines:
+        if from_ and timeline.start.timestamp() < from_.timestamp():
+            timeline = replace(timeline, start=from_, unclipped_start=timeline.unclipped_start or timeline.start)
+        if to_ and timeline.end.timestamp() > to_.timestamp():
+            timeline = replace(timeline, end=to_)
+        yield timeline
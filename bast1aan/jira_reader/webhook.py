@@ -0,0 +1,204 @@
+""" Turns Jira webhook deliveries into as little Jira traffic as possible """
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, ClassVar
+
+from .adapters import datetime as datetime_adapter
+from .entities import Storage, JSONable
+from .jira import ComputeTicketHistory
+
+logger = logging.getLogger(__name__)
+
+Item = ComputeTicketHistory.Response.Item
+Action = ComputeTicketHistory.Response.Item.Action
+Comment = ComputeTicketHistory.Response.Comment
+
+
+class WebhookInbox:
+    """ Receives Jira issue and comment events.
+
+        Deliveries seen before are dropped. A changelog or comment is added to the latest
+        issue data directly when that is up to date; otherwise the issue is fetched again,
+        window seconds after the first event, so a burst of edits becomes one fetch.
+    """
+    DUPLICATE: ClassVar[str] = 'duplicate'
+    IGNORED: ClassVar[str] = 'ignored'
+    APPLIED: ClassVar[str] = 'applied'
+    SCHEDULED: ClassVar[str] = 'scheduled'
+    COALESCED: ClassVar[str] = 'coalesced'
+
+    ISSUE_UPDATED: ClassVar[str] = 'jira:issue_updated'
+    COMMENT_CREATED: ClassVar[str] = 'comment_created'
+    COMMENT_UPDATED: ClassVar[str] = 'comment_updated'
+    COMMENT_DELETED: ClassVar[str] = 'comment_deleted'
+
+    def __init__(
+            self,
+            storage: Callable[[], Awaitable[Storage]],
+            fetch: Callable[[str], Awaitable[object]],
+            window: float = 5.0,
+            seen_size: int = 10000,
+            on_applied: Callable[[], None] = lambda: None
+    ):
+        self._storage = storage
+        self._fetch = fetch
+        self.window = window
+        self._seen_size = seen_size
+        self._on_applied = on_applied
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        self._scheduled: dict[str, float] = {}  # issue by deadline, in order of deadline
+        self._fetching: str | None = None
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    async def receive(self, event: dict, delivery_id: str | None = None) -> str:
+        """ Handles one delivery, returns what was done with it. """
+        webhook_event = event.get('webhookEvent')
+        issue = (event.get('issue') or {}).get('key')
+        if webhook_event not in (self.ISSUE_UPDATED, self.COMMENT_CREATED, self.COMMENT_UPDATED, self.COMMENT_DELETED) \
+                or not issue:
+            return self.IGNORED
+        keys = [key for key in (_delivery_key(event), delivery_id) if key]
+        if not self._first_delivery(keys):
+            return self.DUPLICATE
+        try:
+            try:
+                if await self._apply(issue, event):
+                    return self.APPLIED
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning('Could not apply %s to %s: %s', webhook_event, issue, e)
+            return self._schedule(issue)
+        except BaseException:
+            # neither applied nor scheduled, so a retry of this delivery is not a duplicate
+            self._forget(keys)
+            raise
+
+    def join(self) -> None:
+        """ Waits until all scheduled fetches are done. """
+        with self._condition:
+            while self._scheduled or self._fetching:
+                self._condition.wait()
+
+    def _first_delivery(self, keys: list[str]) -> bool:
+        """ Deliveries are known by their identifier, which retries share, and by their content. """
+        with self._condition:
+            first = not any(key in self._seen for key in keys)
+            for key in keys:
+                self._seen[key] = None
+                self._seen.move_to_end(key)
+            while len(self._seen) > self._seen_size:
+                self._seen.popitem(last=False)
+            return first
+
+    def _forget(self, keys: list[str]) -> None:
+        with self._condition:
+            for key in keys:
+                self._seen.pop(key, None)
+
+    async def _apply(self, issue: str, event: dict) -> bool:
+        """ Adds the change in the event to the latest issue data, if that is up to date. """
+        webhook_event = event['webhookEvent']
+        if webhook_event == self.COMMENT_DELETED or (webhook_event == self.ISSUE_UPDATED and not event.get('changelog')):
+            return False
+        storage = await self._storage()
+        status = await storage.get_issue_status(issue)
+        if status.history_is_outdated or not isinstance(status.issue_data.history, dict):
+            return False
+        issue_data = status.issue_data
+        items = list(issue_data.history['items'])
+        comments = list(issue_data.history['comments'])
+
+        if webhook_event == self.ISSUE_UPDATED:
+            item = _item(event)
+            # created comes from the delivery, so a fetch of the same change may differ in it
+            if any(_id(known) == item.id for known in items):
+                return True
+            items.append(item)
+            summary = ((event['issue'].get('fields') or {}).get('summary'))
+            if summary:
+                issue_data.summary = summary
+        else:
+            comment = _comment(event['comment'])
+            if comment in comments:
+                return True
+            comments = [c for c in comments if _id(c) != comment.id]
+            comments.append(comment)
+
+        # a new history object, so the stored content hash no longer applies
+        issue_data.history = {'items': items, 'comments': comments}
+        issue_data.computed = datetime_adapter.now()
+        await storage.save_issue_data(issue_data)
+        self._on_applied()
+        return True
+
+    def _schedule(self, issue: str) -> str:
+        with self._condition:
+            if issue in self._scheduled:
+                return self.COALESCED
+            self._scheduled[issue] = time.monotonic() + self.window
+            self._condition.notify_all()
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='webhook-inbox', daemon=True)
+                self._thread.start()
+            return self.SCHEDULED
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                with self._condition:
+                    self._fetching = None
+                    self._condition.notify_all()
+                    while not self._scheduled:
+                        self._condition.wait()
+                    issue, deadline = next(iter(self._scheduled.items()))
+                    timeout = deadline - time.monotonic()
+                    if timeout > 0:
+                        self._condition.wait(timeout)
+                        continue
+                    # events arriving from now on need a new fetch
+                    del self._scheduled[issue]
+                    self._fetching = issue
+                try:
+                    loop.run_until_complete(self._fetch(issue))
+                except Exception:
+                    logger.exception('Fetching %s failed', issue)
+        finally:
+            loop.close()
+
+
+def _delivery_key(event: dict) -> str:
+    change = event.get('changelog') or event.get('comment') or {}
+    return f"{event['webhookEvent']}:{event['issue']['key']}:{change.get('id')}:{event.get('timestamp')}"
+
+def _item(event: dict) -> Item:
+    user = event.get('user') or {}
+    return Item(
+        byEmailAddress=user.get('emailAddress'),
+        byDisplayName=user.get('displayName'),
+        created=datetime.fromtimestamp(event['timestamp'] / 1000).astimezone(),
+        actions=[
+            Action(field=action['field'], toString=action.get('toString'), fromString=action.get('fromString'))
+            for action in event['changelog']['items']
+        ],
+        id=int(event['changelog']['id']),
+    )
+
+def _comment(comment: dict) -> Comment:
+    author = comment.get('author') or {}
+    return Comment(
+        id=int(comment['id']),
+        byEmailAddress=author.get('emailAddress'),
+        byDisplayName=author.get('displayName'),
+        # fetched comments are in naive local time, which calculate_timelines assumes
+        created=datetime.fromisoformat(comment['created']).astimezone().replace(tzinfo=None),
+        updated=datetime.fromisoformat(comment['updated']).astimezone().replace(tzinfo=None),
+    )
+
+def _id(entry: Item | Comment | JSONable) -> int | None:
+    id_ = entry.get('id') if isinstance(entry, dict) else entry.id
+    return None if id_ is None else int(id_)
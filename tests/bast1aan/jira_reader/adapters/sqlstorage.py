@@ -8,3 +8,6 @@ class TestSQLStorage(SQLStorage):
         async with self._async_session() as session:
             await session.execute(text('DELETE FROM requests'))
             await session.execute(text('DELETE FROM issue_data'))
+            await session.execute(text('DELETE FROM timeline_checkpoint'))
+            await session.execute(text('DELETE FROM timeline'))
+            await session.execute(text('DELETE FROM timeline_rtree'))
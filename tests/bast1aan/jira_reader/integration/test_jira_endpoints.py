@@ -1,24 +1,36 @@
 import asyncio
+import concurrent.futures
+import gzip
 import json
 import os
+import tempfile
 import unittest
 from asyncio import sleep
 from datetime import datetime, timedelta
+from unittest import mock
 
 import aiohttp.web
+from sqlalchemy.ext.asyncio import create_async_engine
 
 import bast1aan.jira_reader.adapters.async_executor
+import bast1aan.jira_reader.adapters.sqlstorage
 import bast1aan.jira_reader.rest_api
 from bast1aan.jira_reader import entities
 from bast1aan.jira_reader.adapters.alembic.jira_reader import AlembicSQLInitializer
 from bast1aan.jira_reader.adapters.sqlstorage import Base
 from bast1aan.jira_reader.entities import Request
+from bast1aan.jira_reader.jira import ComputeTicketHistory
+from bast1aan.jira_reader.timeline_index import update_timeline_index
+from bast1aan.jira_reader.webhook import WebhookInbox
 
 from tests.bast1aan.jira_reader.adapters.setup_flask import setup_flask
 from tests.bast1aan.jira_reader.adapters.sqlstorage import TestSQLStorage
 from tests.bast1aan.jira_reader.integration.base import AsyncHttpRequestMixin
 from tests.bast1aan.jira_reader.util import scriptdir, exists
 
+Item = ComputeTicketHistory.Response.Item
+Action = ComputeTicketHistory.Response.Item.Action
+
 
 class JiraTestCase(AsyncHttpRequestMixin, unittest.IsolatedAsyncioTestCase):
     maxDiff = None
@@ -413,3 +425,252 @@ class TimelineTestCase(AsyncHttpRequestMixin, unittest.IsolatedAsyncioTestCase):
         finally:
             flask_task.cancel()
             os.unlink(flask_sock)
+
+
+class SingletonsTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._saved = bast1aan.jira_reader.rest_api._storage, bast1aan.jira_reader.rest_api._sync
+        bast1aan.jira_reader.rest_api._storage = None
+        bast1aan.jira_reader.rest_api._sync = None
+
+    def tearDown(self) -> None:
+        bast1aan.jira_reader.rest_api._storage, bast1aan.jira_reader.rest_api._sync = self._saved
+
+    def test_storage_is_set_up_once_from_several_threads(self) -> None:
+        set_ups = []
+
+        class SlowStorage(TestSQLStorage):
+            async def set_up(self) -> None:
+                set_ups.append(self)
+                await sleep(0.1)
+                await super().set_up()
+
+        with mock.patch.object(bast1aan.jira_reader.rest_api, 'SQLStorage', SlowStorage), \
+                concurrent.futures.ThreadPoolExecutor(4) as executor:
+            storages = list(executor.map(lambda _: asyncio.run(bast1aan.jira_reader.rest_api._sql_storage()), range(4)))
+
+        self.assertEqual(1, len(set_ups))
+        self.assertEqual([set_ups[0]] * 4, storages)
+
+    def test_memory_tier_needs_the_sync_worker_in_the_app(self) -> None:
+        with mock.patch.dict(os.environ, {'STORAGE_TIER': 'memory', 'SYNC_WORKER': 'process'}), \
+                self.assertRaises(ValueError):
+            asyncio.run(bast1aan.jira_reader.rest_api._sql_storage())
+
+    def test_requests_do_not_create_the_sync_worker(self) -> None:
+        storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        asyncio.run(storage.set_up())
+        bast1aan.jira_reader.rest_api._storage = storage
+
+        response = bast1aan.jira_reader.rest_api.app.test_client().get('/api/jira/issues')
+
+        self.assertEqual(200, response.status_code)
+        self.assertIsNone(bast1aan.jira_reader.rest_api._sync)
+
+    def test_requests_share_one_engine(self) -> None:
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(os.environ, SQLSTORAGE_SQLITE=f'sqlite:///{directory}/jira_reader.db'):
+            storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+
+            async def set_up() -> None:
+                await storage.set_up()
+                await storage.dispose()
+
+            asyncio.run(set_up())
+            bast1aan.jira_reader.rest_api._storage = storage
+            client = bast1aan.jira_reader.rest_api.app.test_client()
+
+            with mock.patch.object(
+                    bast1aan.jira_reader.adapters.sqlstorage, 'create_async_engine', wraps=create_async_engine
+            ) as create_engine:
+                for _ in range(3):
+                    self.assertEqual(404, client.get('/api/jira/fetch-data/ABC-1').status_code)
+
+            self.assertEqual(1, create_engine.call_count)
+
+
+class WebhookEndpointTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.client = bast1aan.jira_reader.rest_api.app.test_client()
+
+    def test_rejects_missing_or_wrong_token(self) -> None:
+        event = {'webhookEvent': 'jira:issue_deleted', 'issue': {'key': 'ABC-1'}}
+        with mock.patch.dict(os.environ, {'WEBHOOK_SECRET': 'secret'}):
+            self.assertEqual(401, self.client.post('/api/jira/webhook', json=event).status_code)
+            self.assertEqual(403, self.client.post('/api/jira/webhook?token=wrong', json=event).status_code)
+            self.assertEqual(403, self.client.post(
+                '/api/jira/webhook', json=event, headers={'X-Webhook-Token': 'wrong'}
+            ).status_code)
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop('WEBHOOK_SECRET', None)
+            self.assertEqual(403, self.client.post('/api/jira/webhook?token=secret', json=event).status_code)
+
+    def test_accepts_token(self) -> None:
+        event = {'webhookEvent': 'jira:issue_deleted', 'issue': {'key': 'ABC-1'}}
+        with mock.patch.dict(os.environ, {'WEBHOOK_SECRET': 'secret'}), \
+                mock.patch.object(bast1aan.jira_reader.rest_api, '_inbox', WebhookInbox(None, None)):
+            response = self.client.post('/api/jira/webhook', json=event, headers={'X-Webhook-Token': 'secret'})
+            self.assertEqual(202, response.status_code)
+            self.assertEqual({'result': WebhookInbox.IGNORED}, response.get_json())
+            self.assertEqual(202, self.client.post('/api/jira/webhook?token=secret', json=event).status_code)
+
+
+class EndpointsTestCase(unittest.TestCase):
+    """ Through the Flask test client, with the storage and response cache of the app replaced """
+    created = datetime(2024, 1, 18, 9, 0).astimezone()
+
+    def setUp(self) -> None:
+        self._saved = bast1aan.jira_reader.rest_api._storage, bast1aan.jira_reader.rest_api._cache
+        self.storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        asyncio.run(self.storage.set_up())
+        asyncio.run(self.storage.clean_up())
+        for issue, assignee in (('ABC-1', 'Someone'), ('ABC-2', 'Another'), ('ABC-3', 'Someone')):
+            asyncio.run(self.storage.save_issue_data(self.issue_data(issue, assignee)))
+        asyncio.run(update_timeline_index(self.storage))
+        bast1aan.jira_reader.rest_api._storage = self.storage
+        bast1aan.jira_reader.rest_api._cache = None
+        self.client = bast1aan.jira_reader.rest_api.app.test_client()
+
+    def tearDown(self) -> None:
+        bast1aan.jira_reader.rest_api._storage, bast1aan.jira_reader.rest_api._cache = self._saved
+
+    def issue_data(self, issue: str, assignee: str, summary: str = 'Fix this') -> entities.IssueData:
+        return entities.IssueData(
+            issue=issue,
+            history={'items': [
+                Item(None, 'Someone Else', self.created + timedelta(hours=1), [Action('assignee', assignee, None)]),
+                Item(None, assignee, self.created + timedelta(hours=2), [Action('status', 'In Progress', 'Open')]),
+                Item(None, assignee, self.created + timedelta(hours=5), [Action('assignee', None, assignee)]),
+            ], 'comments': []},
+            issue_id=int(issue[4:]),
+            project_id=45,
+            summary=summary,
+            computed=datetime.now(),
+            created=self.created,
+            created_by='Someone Else',
+        )
+
+    def test_etag_and_not_modified(self) -> None:
+        for url in ('/api/jira/timeline/Someone', '/api/jira/timeline-ical/Someone', '/api/jira/team-timeline?person=Someone'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(200, response.status_code)
+                etag = response.headers['ETag']
+
+                not_modified = self.client.get(url, headers={'If-None-Match': etag})
+                self.assertEqual(304, not_modified.status_code)
+                self.assertEqual(b'', not_modified.data)
+                self.assertEqual(200, self.client.get(url, headers={'If-None-Match': '"other"'}).status_code)
+
+        asyncio.run(self.storage.save_issue_data(self.issue_data('ABC-1', 'Someone', summary='Renamed')))
+        # read before the index is updated, as when the pipeline has not caught up yet
+        before_indexing = self.client.get('/api/jira/timeline/Someone')
+        self.assertNotIn('Renamed', before_indexing.get_data(as_text=True))
+        asyncio.run(update_timeline_index(self.storage))
+        response = self.client.get('/api/jira/timeline/Someone', headers={'If-None-Match': before_indexing.headers['ETag']})
+        self.assertEqual(200, response.status_code)
+        self.assertIn('Renamed', response.get_data(as_text=True))
+
+    def test_team_people(self) -> None:
+        response = self.client.get('/api/jira/team-timeline?person=Someone&person=Another&person=Someone')
+        self.assertEqual(200, response.status_code)
+        results = response.get_json()['results']
+        self.assertEqual(['Someone', 'Another'], list(results))
+        self.assertEqual(['ABC-1', 'ABC-3'], sorted({timeline['issue'] for timeline in results['Someone']}))
+
+        with mock.patch.dict(os.environ, {'TEAM_BACK_END': ' Another, Someone,,Another '}):
+            response = self.client.get('/api/jira/team-timeline/back-end')
+            self.assertEqual(['Another', 'Someone'], list(response.get_json()['results']))
+            ical = self.client.get('/api/jira/team-timeline-ical/back-end')
+            self.assertEqual(200, ical.status_code)
+            self.assertIn(b'X-WR-CALNAME:jira-reader back-end', ical.data)
+            timelines = response.get_json()['results']
+            self.assertEqual(sum(map(len, timelines.values())), ical.data.count(b'BEGIN:VEVENT'))
+
+    def test_team_errors(self) -> None:
+        for url, status in (
+                ('/api/jira/team-timeline', 400),
+                ('/api/jira/team-timeline-ical', 400),
+                ('/api/jira/team-timeline/nobody', 404),
+                ('/api/jira/team-timeline-ical/nobody', 404),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(status, response.status_code)
+                self.assertIn('error', response.get_json())
+
+    def test_accept_encoding(self) -> None:
+        with mock.patch.dict(os.environ, {'COMPRESSION_MIN_SIZE': '1'}):
+            plain = self.client.get('/api/jira/timeline/Someone', headers={'Accept-Encoding': 'identity'})
+            compressed = self.client.get('/api/jira/timeline/Someone', headers={'Accept-Encoding': 'gzip'})
+            refused = self.client.get('/api/jira/timeline/Someone', headers={'Accept-Encoding': 'gzip;q=0'})
+
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual('gzip', compressed.headers['Content-Encoding'])
+        self.assertEqual(plain.data, gzip.decompress(compressed.data))
+        self.assertNotEqual(plain.headers['ETag'], compressed.headers['ETag'])
+        self.assertIn('Accept-Encoding', compressed.headers['Vary'])
+        self.assertNotIn('Content-Encoding', refused.headers)
+
+    def test_ical_uid_does_not_move_with_from(self) -> None:
+        def uids(from_: datetime) -> list[str]:
+            response = self.client.get('/api/jira/timeline-ical/Someone', query_string={
+                'from': from_.isoformat(), 'to': (self.created + timedelta(days=1)).isoformat(),
+            })
+            self.assertEqual(200, response.status_code)
+            return sorted(line for line in response.get_data(as_text=True).splitlines() if line.startswith('UID:'))
+
+        for timeline_index in ('on', 'off'):
+            with self.subTest(timeline_index=timeline_index), \
+                    mock.patch.dict(os.environ, {'TIMELINE_INDEX': timeline_index}):
+                # both within the timelines open until five hours after creating
+                clipped = uids(self.created + timedelta(hours=3))
+                self.assertTrue(clipped)
+                self.assertEqual(clipped, uids(self.created + timedelta(hours=4)))
+
+    def test_fetch_data_get_sends_stored_gzip(self) -> None:
+        result = {'key': 'ABC-1', 'fields': {'description': 'x' * 2000}}
+        asyncio.run(self.storage.save_request(Request(issue='ABC-1', result=result)))
+        stored = asyncio.run(self.storage.get_latest_result_gzip('ABC-1'))
+
+        compressed = self.client.get('/api/jira/fetch-data/ABC-1', headers={'Accept-Encoding': 'gzip'})
+        plain = self.client.get('/api/jira/fetch-data/ABC-1', headers={'Accept-Encoding': 'identity'})
+
+        self.assertEqual('gzip', compressed.headers['Content-Encoding'])
+        self.assertEqual(stored, compressed.data)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(result, plain.get_json())
+        self.assertEqual(404, self.client.get('/api/jira/fetch-data/ABC-9').status_code)
+
+    def test_cursor_round_trip(self) -> None:
+        asyncio.run(self.storage.save_requests([
+            Request(issue=f'ABC-{i}', requested=self.created + timedelta(hours=hour), result={'i': i})
+            for i in (2, 1, 3) for hour in (0, 1)
+        ]))
+        for url, expected in (
+                ('/api/jira/issues?limit=2', ['ABC-1', 'ABC-2', 'ABC-3']),
+                ('/api/jira/issue-data?limit=2', ['ABC-1', 'ABC-2', 'ABC-3']),
+                ('/api/jira/requests?limit=4', ['ABC-1', 'ABC-1', 'ABC-2', 'ABC-2', 'ABC-3', 'ABC-3']),
+        ):
+            with self.subTest(url=url):
+                issues = []
+                cursor = None
+                while True:
+                    page = self.client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+                    issues.extend(result['issue'] for result in page['results'])
+                    cursor = page['next']
+                    if not cursor:
+                        break
+                self.assertEqual(expected, issues)
+
+    def test_bad_arguments(self) -> None:
+        for url in ('/api/jira/issues', '/api/jira/requests'):
+            for query in ('cursor=not-a-cursor', 'cursor=WyJBQkMtMSJd', 'limit=0', 'limit=1001', 'limit=ten'):
+                with self.subTest(url=url, query=query):
+                    response = self.client.get(f'{url}?{query}')
+                    self.assertEqual(400, response.status_code)
+                    self.assertIn('error', response.get_json())
+        self.assertEqual(400, self.client.get('/api/jira/issues?created_from=yesterday').status_code)
+        self.assertEqual(400, self.client.get('/api/jira/requests?requested_to=tomorrow').status_code)
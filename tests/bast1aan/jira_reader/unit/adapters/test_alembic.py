@@ -0,0 +1,52 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from bast1aan.jira_reader.adapters.alembic import jira_reader
+from bast1aan.jira_reader.adapters.alembic.jira_reader import AlembicSQLInitializer, SchemaNotReady
+from bast1aan.jira_reader.adapters.sqlstorage import Base
+from tests.bast1aan.jira_reader.adapters.sqlstorage import TestSQLStorage
+
+
+class AlembicSQLInitializerTestCase(unittest.IsolatedAsyncioTestCase):
+    def test_head_revision(self):
+        self.assertIsNotNone(jira_reader.head_revision())
+
+    async def test_migrations_are_skipped_at_head(self):
+        storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        await storage.set_up()
+        async with storage._async_engine.connect() as conn:
+            self.assertTrue(await conn.run_sync(jira_reader.is_at_head))
+
+        with mock.patch.object(jira_reader, 'run_migrations') as run_migrations:
+            await storage.set_up()
+        run_migrations.assert_not_called()
+
+    async def test_without_migrate_waits_for_another_process(self):
+        storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata, migrate=False, timeout=0.2, poll_interval=0.05))
+        with self.assertRaises(SchemaNotReady):
+            await storage.set_up()
+
+    async def test_concurrent_set_ups_migrate_once(self):
+        migrations = []
+
+        def run_migrations(connection, metadata) -> None:
+            migrations.append(connection)
+            real_run_migrations(connection, metadata)
+
+        real_run_migrations = jira_reader.run_migrations
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(os.environ, SQLSTORAGE_SQLITE=f'sqlite:///{directory}/jira_reader.db'), \
+                mock.patch.object(jira_reader, 'run_migrations', run_migrations):
+            storages = [TestSQLStorage(AlembicSQLInitializer(Base.metadata)) for _ in range(2)]
+            await asyncio.gather(*(storage.set_up() for storage in storages))
+            try:
+                self.assertEqual(1, len(migrations))
+                for storage in storages:
+                    async with storage._async_engine.connect() as conn:
+                        self.assertTrue(await conn.run_sync(jira_reader.is_at_head))
+            finally:
+                for storage in storages:
+                    await storage.dispose()
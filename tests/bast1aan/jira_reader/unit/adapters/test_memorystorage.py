@@ -0,0 +1,268 @@
+import gzip
+import json
+import unittest
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+from dateutil.tz import tzoffset
+
+from bast1aan.jira_reader import entities
+from bast1aan.jira_reader.adapters.alembic.jira_reader import AlembicSQLInitializer
+from bast1aan.jira_reader.adapters.memorystorage import MemoryStorage
+from bast1aan.jira_reader.adapters.sqlstorage import Base
+from bast1aan.jira_reader.jira import ComputeTicketHistory
+from tests.bast1aan.jira_reader.adapters.sqlstorage import TestSQLStorage
+
+Item = ComputeTicketHistory.Response.Item
+Action = ComputeTicketHistory.Response.Item.Action
+
+NOW = datetime.now()
+YESTERDAY = NOW - timedelta(days=1)
+
+
+def issue_data(issue: str, computed: datetime | None, summary: str = '', created_by: str | None = 'Someone') -> entities.IssueData:
+    return entities.IssueData(
+        issue=issue,
+        computed=computed,
+        history=[],
+        issue_id=0,
+        project_id=0,
+        summary=summary,
+        created=YESTERDAY,
+        created_by=created_by,
+    )
+
+
+class TestMemoryStorage(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.storage = MemoryStorage()
+
+    async def test_requests(self) -> None:
+        await self.storage.save_requests([
+            entities.Request(issue='ABC-2', requested=YESTERDAY, result=[]),
+            entities.Request(issue='ABC-1', requested=NOW, result=['latest']),
+            entities.Request(issue='ABC-1', requested=YESTERDAY, result=[]),
+        ])
+
+        self.assertEqual(
+            entities.Request(issue='ABC-1', requested=NOW, result=['latest']),
+            await self.storage.get_latest_request('ABC-1')
+        )
+        self.assertEqual(['latest'], json.loads(gzip.decompress(await self.storage.get_latest_result_gzip('ABC-1'))))
+        self.assertIsNone(await self.storage.get_latest_request('ABC-3'))
+        self.assertIsNone(await self.storage.get_latest_result_gzip('ABC-3'))
+
+    async def test_latest_issue_data_is_returned_as_stored(self) -> None:
+        latest = issue_data('ABC-1', YESTERDAY)
+        await self.storage.save_request(entities.Request(issue='ABC-1', requested=NOW, result=[]))
+        await self.storage.save_issue_datas([latest, issue_data('ABC-1', YESTERDAY - timedelta(days=1), 'older')])
+
+        self.assertIs(latest, await self.storage.get_issue_data('ABC-1'))
+        status = await self.storage.get_issue_status('ABC-1')
+        self.assertEqual(entities.IssueStatus(issue='ABC-1', requested=NOW, issue_data=latest), status)
+        self.assertTrue(status.history_is_outdated)
+        self.assertEqual(2, len([data async for data in self.storage.get_issue_datas()]))
+
+        with self.subTest('Saving a loaded issue data replaces it, also when its computed time changed'):
+            latest.computed = NOW + timedelta(hours=1)
+            await self.storage.save_issue_data(latest)
+            self.assertEqual(2, len([data async for data in self.storage.get_issue_datas()]))
+            self.assertFalse((await self.storage.get_issue_status('ABC-1')).history_is_outdated)
+
+    async def test_get_outdated_requests(self) -> None:
+        await self.storage.save_requests([
+            entities.Request(issue='ABC-1', requested=NOW, result=[]),  # newer than issue data
+            entities.Request(issue='ABC-2', requested=YESTERDAY, result=[]),  # issue data is up to date
+            entities.Request(issue='ABC-3', requested=YESTERDAY, result=[]),  # no issue data
+            entities.Request(issue='ABC-4', requested=YESTERDAY, result=[]),  # issue data incomplete
+        ])
+        for issue, created_by in (('ABC-1', 'Someone'), ('ABC-2', 'Someone'), ('ABC-4', None)):
+            await self.storage.save_issue_data(issue_data(issue, YESTERDAY + timedelta(hours=1), created_by=created_by))
+
+        self.assertEqual(
+            ['ABC-1', 'ABC-3', 'ABC-4'],
+            [request.issue async for request in self.storage.get_outdated_requests()]
+        )
+        self.assertEqual(
+            ['ABC-3'],
+            [request.issue async for request in self.storage.get_outdated_requests(after_issue='ABC-1', limit=1)]
+        )
+
+    async def test_pages(self) -> None:
+        datas = [issue_data(f'ABC-{i}', YESTERDAY + timedelta(hours=hour)) for i in (2, 1, 3) for hour in (1, 0)]
+        datas[0].project_id = 45
+        await self.storage.save_issue_datas(datas)
+        await self.storage.save_requests([
+            entities.Request(issue='ABC-2', requested=YESTERDAY, result=[]),
+            entities.Request(issue='ABC-1', requested=NOW, result=['latest']),
+            entities.Request(issue='ABC-1', requested=YESTERDAY, result=[]),
+        ])
+
+        first = [data async for data in self.storage.get_issue_data_page(limit=3)]
+        self.assertEqual([datas[3], datas[2], datas[1]], first)
+        self.assertEqual(
+            [datas[0], datas[5], datas[4]],
+            [data async for data in self.storage.get_issue_data_page(after=(first[-1].issue, first[-1].computed))]
+        )
+        self.assertEqual(
+            [datas[0]],
+            [data async for data in self.storage.get_issue_data_page(
+                latest_only=True, filter=entities.IssueDataFilter(project_id=45)
+            )]
+        )
+        self.assertEqual(
+            [datas[1], datas[5]],
+            [data async for data in self.storage.get_issue_data_page(
+                after=('ABC-1', YESTERDAY + timedelta(hours=1)),
+                filter=entities.IssueDataFilter(computed_to=YESTERDAY + timedelta(minutes=30))
+            )]
+        )
+        self.assertIsNone((await anext(self.storage.get_issue_data_page(with_history=False))).history)
+
+        with self.subTest('Only the latest request of each issue is kept'):
+            self.assertEqual(
+                [
+                    entities.Request(issue='ABC-1', requested=NOW, result=None),
+                    entities.Request(issue='ABC-2', requested=YESTERDAY, result=None),
+                ],
+                [request async for request in self.storage.get_request_page(with_result=False)]
+            )
+            self.assertEqual(
+                ['ABC-2'],
+                [request.issue async for request in self.storage.get_request_page(after=('ABC-1', NOW))]
+            )
+
+    async def test_get_recent_issue_datas_within_window(self) -> None:
+        created = datetime(2024, 1, 18, 9, 0, tzinfo=tzoffset(None, 3600))
+        data = entities.IssueData(
+            issue='ABC-1',
+            history={'items': [Item(None, 'Someone', created + timedelta(days=1), [Action('status', 'Done', 'Open')])], 'comments': []},
+            issue_id=0,
+            project_id=0,
+            summary='',
+            computed=NOW,
+            created=created,
+            created_by='Someone',
+        )
+        await self.storage.save_issue_data(data)
+
+        async def recent(from_: datetime | None, to_: datetime | None) -> list[entities.IssueData]:
+            return [data async for data in self.storage.get_recent_issue_datas(from_=from_, to_=to_)]
+
+        self.assertEqual([data], await recent(created, created + timedelta(days=1)))
+        self.assertEqual([data], await recent(created + timedelta(days=1), None))
+        self.assertEqual([], await recent(created + timedelta(days=2), None))
+        self.assertEqual([], await recent(None, created - timedelta(hours=1)))
+
+    async def test_timelines(self) -> None:
+        start = datetime(2024, 1, 18, 9, 0, tzinfo=tzoffset(None, 3600))
+        data = await self.storage.save_issue_data(issue_data('ABC-1', NOW))
+        self.assertEqual([data], [data async for data in self.storage.get_unindexed_issue_datas()])
+
+        timelines = [
+            entities.Timeline('ABC-1', start, start + timedelta(hours=1), name, '', entities.Timeline.TYPE_ASSIGNED, '')
+            for name in ('Someone', 'Another')
+        ]
+        await self.storage.save_timelines(data, timelines)
+
+        self.assertEqual([], [data async for data in self.storage.get_unindexed_issue_datas()])
+        self.assertEqual(timelines, [timeline async for timeline in self.storage.get_timelines()])
+        self.assertEqual(timelines[1:], [timeline async for timeline in self.storage.get_timelines('Another')])
+        self.assertEqual(
+            timelines,
+            [timeline async for timeline in self.storage.get_timelines(display_names=('Someone', 'Another'), issue='ABC-1')]
+        )
+        self.assertEqual([], [timeline async for timeline in self.storage.get_timelines(from_=start + timedelta(hours=2))])
+        self.assertEqual([], [timeline async for timeline in self.storage.get_timelines(to_=start)])
+
+    async def test_generation_changes_on_every_save(self) -> None:
+        generation = await self.storage.get_generation()
+        await self.storage.save_issue_data(issue_data('ABC-1', NOW))
+        await self.storage.save_issue_datas([issue_data('ABC-1', NOW)])
+        await self.storage.save_timelines(issue_data('ABC-1', NOW), [])
+        self.assertEqual(generation + 3, await self.storage.get_generation())
+
+
+class TestMemoryStorageWithBacking(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.backing = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        await self.backing.set_up()
+        await self.backing.clean_up()
+
+    async def test_writes_through_and_loads(self) -> None:
+        storage = MemoryStorage(backing=self.backing)
+        await storage.save_request(entities.Request(issue='ABC-1', requested=YESTERDAY, result=['result']))
+        await storage.save_issue_data(issue_data('ABC-1', NOW, 'summary'))
+
+        self.assertEqual('summary', (await self.backing.get_issue_data('ABC-1')).summary)
+
+        loaded = MemoryStorage(backing=self.backing)
+        await loaded.load()
+        self.assertEqual(await storage.get_issue_status('ABC-1'), await loaded.get_issue_status('ABC-1'))
+        self.assertEqual(await storage.get_latest_request('ABC-1'), await loaded.get_latest_request('ABC-1'))
+        # results are loaded from the backing storage when read
+        self.assertEqual(
+            await self.backing.get_latest_result_gzip('ABC-1'), await loaded.get_latest_result_gzip('ABC-1')
+        )
+        self.assertEqual([], [request async for request in loaded.get_outdated_requests()])
+        await self.backing.save_request(entities.Request(issue='ABC-1', requested=datetime.now(), result=['newer']))
+        loaded = MemoryStorage(backing=self.backing)
+        await loaded.load()
+        self.assertEqual([['newer']], [request.result async for request in loaded.get_outdated_requests()])
+        self.assertEqual(
+            ['ABC-1'],
+            [data.issue async for data in loaded.get_unindexed_issue_datas()]
+        )
+
+    async def test_request_pages_equal_backing(self) -> None:
+        storage = MemoryStorage(backing=self.backing)
+        await storage.save_requests([
+            entities.Request(issue=f'ABC-{i}', requested=YESTERDAY + timedelta(hours=hour), result=[i, hour])
+            for i in (2, 1, 3) for hour in (1, 0)
+        ])
+
+        async def pages(storage: entities.Storage, **kwargs) -> list[list[entities.Request]]:
+            pages = []
+            after = None
+            while page := [request async for request in storage.get_request_page(after=after, limit=4, **kwargs)]:
+                pages.append(page)
+                after = page[-1].issue, page[-1].requested
+            return pages
+
+        for kwargs in ({}, {'with_result': False}, {'issue': 'ABC-1'}, {'requested_from': YESTERDAY + timedelta(hours=1)}):
+            with self.subTest(**kwargs):
+                self.assertEqual(await pages(self.backing, **kwargs), await pages(storage, **kwargs))
+        self.assertEqual([4, 2], [len(page) for page in await pages(storage)])
+
+    async def test_computed_is_the_same_in_both_tiers(self) -> None:
+        storage = MemoryStorage(backing=self.backing)
+        await storage.save_issue_datas([issue_data('ABC-1', None)])
+        await storage.save_issue_data(issue_data('ABC-2', None))
+
+        for issue in ('ABC-1', 'ABC-2'):
+            with self.subTest(issue=issue):
+                saved = await storage.get_issue_data(issue)
+                self.assertEqual((await self.backing.get_issue_data(issue)).computed, saved.computed)
+                await storage.save_timelines(saved, [])
+        self.assertEqual([], [data async for data in self.backing.get_unindexed_issue_datas()])
+
+    async def test_timeline_checkpoints_are_read_from_backing(self) -> None:
+        storage = MemoryStorage(backing=self.backing)
+        checkpoints = [
+            entities.TimelineCheckpoint(issue, 'Someone', YESTERDAY, 3, {}, {}, digest=issue)
+            for issue in ('ABC-1', 'ABC-2')
+        ]
+        await storage.save_timeline_checkpoints(checkpoints)
+
+        loaded = MemoryStorage(backing=self.backing)
+        await loaded.load()
+        await loaded.save_timeline_checkpoints([replace(checkpoints[1], item_count=4)])
+        self.assertEqual(
+            [checkpoints[0], replace(checkpoints[1], item_count=4)],
+            sorted([checkpoint async for checkpoint in loaded.get_timeline_checkpoints('Someone')], key=lambda c: c.issue)
+        )
+        self.assertEqual([], [checkpoint async for checkpoint in loaded.get_timeline_checkpoints('Another')])
@@ -0,0 +1,72 @@
+import concurrent.futures
+import os
+import tempfile
+import unittest
+
+from bast1aan.jira_reader.adapters.shared_cache import SQLiteSharedCache
+from bast1aan.jira_reader.response_cache import CachedResponse, ResponseCache
+
+
+class SQLiteSharedCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite')
+
+    def test_shared_between_instances(self):
+        response = CachedResponse.of('body')
+        SQLiteSharedCache(self.path).put('a', 1, response)
+        other = SQLiteSharedCache(self.path)
+        self.assertEqual(response, other.get('a', 1))
+        self.assertIsNone(other.get('a', 2))
+        self.assertIsNone(other.get('b', 1))
+
+    def test_older_generations_are_removed(self):
+        cache = SQLiteSharedCache(self.path)
+        cache.put('a', 1, CachedResponse.of('a'))
+        cache.put('b', 2, CachedResponse.of('b'))
+        self.assertIsNone(cache.get('a', 1))
+        self.assertIsNotNone(cache.get('b', 2))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = SQLiteSharedCache(self.path, max_bytes=10)
+        cache.put('a', 1, CachedResponse.of('1234'))
+        cache.put('b', 1, CachedResponse.of('1234'))
+        cache.get('a', 1)
+        cache.put('c', 1, CachedResponse.of('1234'))
+        self.assertIsNotNone(cache.get('a', 1))
+        self.assertIsNone(cache.get('b', 1))
+        self.assertIsNotNone(cache.get('c', 1))
+
+    def test_response_cache_falls_back_to_shared(self):
+        rendered = ResponseCache(shared=SQLiteSharedCache(self.path)).put(('timeline', 'A'), 1, 'body')
+        other = ResponseCache(shared=SQLiteSharedCache(self.path))
+        self.assertEqual(rendered, other.get(('timeline', 'A'), 1))
+        self.assertIsNone(other.get(('timeline', 'A'), 2))
+
+    def test_shared_between_threads(self):
+        cache = SQLiteSharedCache(self.path)
+        self.addCleanup(cache.close)
+
+        def put_and_get(key: str) -> CachedResponse | None:
+            cache.put(key, 1, CachedResponse.of(key))
+            return cache.get(key, 1)
+
+        keys = [str(key) for key in range(50)]
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            self.assertEqual([CachedResponse.of(key) for key in keys], list(executor.map(put_and_get, keys)))
+
+    def test_closed(self):
+        cache = SQLiteSharedCache(self.path)
+        cache.put('a', 1, CachedResponse.of('a'))
+        cache.close()
+        self.assertIsNone(cache.get('a', 1))
+        cache.put('b', 1, CachedResponse.of('b'))
+
+    def test_not_a_database(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'not a database, but long enough to be read as one' * 100)
+        cache = SQLiteSharedCache(self.path)
+        self.addCleanup(cache.close)
+        cache.put('a', 1, CachedResponse.of('a'))
+        self.assertIsNone(cache.get('a', 1))
@@ -1,11 +1,22 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import gzip
+import json
+import os
+import tempfile
 import unittest
 from datetime import datetime, timedelta
+from unittest import mock
 
 import sqlalchemy.exc
+from dateutil.tz import tzoffset
+from sqlalchemy import text
 
-from bast1aan.jira_reader import entities
+from bast1aan.jira_reader import entities, json_mapper
 from bast1aan.jira_reader.adapters.alembic.jira_reader import AlembicSQLInitializer
-from bast1aan.jira_reader.adapters.sqlstorage import Base
+from bast1aan.jira_reader.adapters.sqlstorage import Base, OtherWriter, SQLiteProfile
+from bast1aan.jira_reader.jira import ComputeTicketHistory
 from tests.bast1aan.jira_reader.adapters.sqlstorage import TestSQLStorage
 
 
@@ -84,6 +95,43 @@ class TestRequest(unittest.IsolatedAsyncioTestCase):
 
         self.assertIsNone(saved_req.result)
 
+    async def test_save_requests(self) -> None:
+        now = datetime.now()
+        reqs = [
+            entities.Request(issue=f'ABC-{i}', requested=now, result=[{'i': i}])
+            for i in range(5)
+        ]
+        self.storage.BATCH_SIZE = 2
+        await self.storage.save_requests(reqs)
+
+        for req in reqs:
+            self.assertEqual(req, await self.storage.get_latest_request(req.issue))
+
+        with self.subTest('A failing batch saves nothing'):
+            later = now + timedelta(hours=1)
+            with self.assertRaises(sqlalchemy.exc.IntegrityError):
+                await self.storage.save_requests([
+                    entities.Request(issue='ABC-0', requested=later, result=['new']),
+                    entities.Request(issue='ABC-1', requested=later, result=['new']),
+                    entities.Request(issue='ABC-2', requested=now, result=['duplicate']),
+                ])
+            for req in reqs:
+                self.assertEqual(req, await self.storage.get_latest_request(req.issue))
+
+    async def test_get_latest_result_gzip(self) -> None:
+        await self.storage.save_request(entities.Request(issue='ABC-123', result={'some': 'result'}))
+        async with self.storage._async_session() as session:
+            await session.execute(text(
+                "INSERT INTO requests (issue, requested, result) VALUES ('ABC-456', '2024-01-01 00:00:00', '{\"json\": 1}')"
+            ))
+            await session.commit()
+
+        self.assertEqual({'some': 'result'}, json.loads(gzip.decompress(await self.storage.get_latest_result_gzip('ABC-123'))))
+        with self.subTest('Results stored before compression are compressed on reading'):
+            self.assertEqual({'json': 1}, json.loads(gzip.decompress(await self.storage.get_latest_result_gzip('ABC-456'))))
+            self.assertEqual({'json': 1}, (await self.storage.get_latest_request('ABC-456')).result)
+        self.assertIsNone(await self.storage.get_latest_result_gzip('ABC-789'))
+
 class TestIssueData(unittest.IsolatedAsyncioTestCase):
 
     async def asyncSetUp(self) -> None:
@@ -294,3 +342,462 @@ class TestIssueData(unittest.IsolatedAsyncioTestCase):
         result = [issue_data async for issue_data in self.storage.get_recent_issue_datas(from_=now - timedelta(hours=12))]
 
         self.assertCountEqual([abc123_today, abc456_today], result)
+
+    async def test_get_recent_issue_datas_within_window(self) -> None:
+        now = datetime.now()
+
+        def issue_data(issue: str, created: datetime, last_item: datetime) -> entities.IssueData:
+            return entities.IssueData(
+                issue=issue,
+                computed=now,
+                history={'items': [ComputeTicketHistory.Response.Item(None, 'Someone', last_item, [])], 'comments': []},
+                issue_id=0,
+                project_id=0,
+                summary='',
+                created=created,
+                created_by='Someone',
+            )
+
+        for data in (
+            issue_data('ABC-1', now - timedelta(days=10), now - timedelta(days=8)),
+            issue_data('ABC-2', now - timedelta(days=6), now - timedelta(days=4)),
+            issue_data('ABC-3', now - timedelta(days=2), now - timedelta(days=1)),
+        ):
+            await self.storage.save_issue_data(data)
+
+        async def window(from_: datetime | None, to_: datetime | None) -> list[str]:
+            return [data.issue async for data in self.storage.get_recent_issue_datas(from_=from_, to_=to_)]
+
+        self.assertEqual(['ABC-2', 'ABC-3'], await window(now - timedelta(days=5), None))
+        self.assertEqual(['ABC-1', 'ABC-2'], await window(None, now - timedelta(days=3)))
+        self.assertEqual(['ABC-2'], await window(now - timedelta(days=5), now - timedelta(days=3)))
+        self.assertEqual([], await window(now - timedelta(days=7), now - timedelta(days=6, hours=1)))
+
+    async def test_computed_history_is_stored_packed(self) -> None:
+        created = datetime(2024, 1, 18, 11, 5, 19, 636000, tzinfo=tzoffset(None, 3600))
+        history = {
+            'items': [{
+                'byEmailAddress': None,
+                'byDisplayName': 'Someone',
+                'created': created.isoformat(),
+                'actions': [{'field': 'assignee', 'toString': 'Someone', 'fromString': None}],
+                'id': 1001,
+            }],
+            'comments': [{
+                'id': 10,
+                'byEmailAddress': 'someone@example.com',
+                'byDisplayName': 'Someone',
+                'created': '2024-01-19T10:00:00',
+                'updated': '2024-01-19T10:05:00',
+            }],
+        }
+        await self.storage.save_issue_data(entities.IssueData(
+            issue='ABC-123',
+            computed=datetime.now(),
+            history=history,
+            issue_id=123,
+            project_id=45,
+            summary='We need to fix this',
+        ))
+
+        async with self.storage._async_session() as session:
+            row = (await session.execute(text('SELECT history, history_packed FROM issue_data'))).one()
+        self.assertIsNone(row.history)
+        self.assertIsNotNone(row.history_packed)
+
+        saved_ent = await self.storage.get_issue_data('ABC-123')
+
+        self.assertEqual(
+            ComputeTicketHistory.Response.Item(
+                byEmailAddress=None,
+                byDisplayName='Someone',
+                created=created,
+                actions=[ComputeTicketHistory.Response.Item.Action('assignee', 'Someone', None)],
+                id=1001,
+            ),
+            saved_ent.history['items'][0]
+        )
+        self.assertEqual(history, json.loads(json_mapper.dumps(saved_ent.history)))
+
+    async def test_json_history_is_still_read(self) -> None:
+        async with self.storage._async_session() as session:
+            await session.execute(text(
+                "INSERT INTO issue_data (issue, computed, history) "
+                "VALUES ('ABC-123', '2024-01-19 10:00:00', '{\"items\": [], \"comments\": []}')"
+            ))
+            await session.commit()
+
+        saved_ent = await self.storage.get_issue_data('ABC-123')
+
+        self.assertEqual({'items': [], 'comments': []}, saved_ent.history)
+        with self.subTest('Also by the scans reading plain rows'):
+            scanned = [data async for data in self.storage.get_issue_datas()]
+            self.assertEqual([saved_ent], scanned)
+            self.assertEqual(saved_ent.get_id(), scanned[0].get_id())
+            # as loaded, before reading the histories
+            loaded = await self.storage.get_issue_data('ABC-123')
+            scanned = [data async for data in self.storage.get_issue_datas()]
+            self.assertIsNotNone(loaded.content_hash('history'))
+            self.assertEqual(loaded.content_hash('history'), scanned[0].content_hash('history'))
+
+    async def test_history_changed_in_place_is_not_equal(self) -> None:
+        await self.storage.save_issue_data(entities.IssueData(
+            issue='ABC-123', computed=datetime(2024, 1, 19, 10), history={'items': [], 'comments': []},
+            issue_id=1, project_id=2, summary='summary',
+        ))
+        changed = await self.storage.get_issue_data('ABC-123')
+        stored = await self.storage.get_issue_data('ABC-123')
+        self.assertEqual(stored, changed)
+
+        changed.history['items'].append({'changed': True})
+
+        self.assertIsNone(changed.content_hash('history'))
+        self.assertNotEqual(await self.storage.get_issue_data('ABC-123'), changed)
+
+    async def test_save_issue_datas(self) -> None:
+        now = datetime.now()
+        datas = [
+            entities.IssueData(
+                issue=f'ABC-{i}',
+                computed=now,
+                history=[{'i': i}],
+                issue_id=i,
+                project_id=45,
+                summary='We need to fix this',
+            ) for i in range(5)
+        ]
+        self.storage.BATCH_SIZE = 2
+        await self.storage.save_issue_datas(datas)
+
+        saved = [obj async for obj in self.storage.get_issue_datas()]
+        self.assertEqual(datas, saved)
+
+        with self.subTest('Loaded datas are updated, new datas for the same issue and time replace stored ones'):
+            saved[0].summary = 'updated'
+            replacing = entities.IssueData(
+                issue='ABC-1',
+                computed=now,
+                history=[{'i': 'replaced'}],
+                issue_id=1,
+                project_id=45,
+                summary='replaced',
+            )
+            await self.storage.save_issue_datas([saved[0], replacing])
+
+            self.assertEqual(
+                [saved[0], replacing, *datas[2:]],
+                [obj async for obj in self.storage.get_issue_datas()]
+            )
+
+    async def test_generation_changes_on_every_save(self) -> None:
+        data = entities.IssueData(
+            issue='ABC-123',
+            computed=datetime.now(),
+            history=[],
+            issue_id=1,
+            project_id=45,
+            summary='We need to fix this',
+        )
+        generation = await self.storage.get_generation()
+        self.assertEqual(generation, await self.storage.get_generation())
+
+        await self.storage.save_issue_data(data)
+        self.assertEqual(generation + 1, await self.storage.get_generation())
+
+        await self.storage.save_issue_datas([data])
+        self.assertEqual(generation + 2, await self.storage.get_generation())
+
+        await self.storage.save_timelines(data, [])
+        self.assertEqual(generation + 3, await self.storage.get_generation())
+
+    async def test_get_issue_status(self) -> None:
+        now = datetime.now()
+        yesterday = now - timedelta(days=1)
+
+        self.assertEqual(
+            entities.IssueStatus(issue='ABC-123', requested=None, issue_data=None),
+            await self.storage.get_issue_status('ABC-123')
+        )
+
+        await self.storage.save_request(entities.Request(issue='ABC-123', requested=yesterday, result=[]))
+        await self.storage.save_request(entities.Request(issue='ABC-123', requested=now, result=[]))
+        await self.storage.save_request(entities.Request(issue='ABC-456', requested=now + timedelta(days=1), result=[]))
+
+        self.assertEqual(
+            entities.IssueStatus(issue='ABC-123', requested=now, issue_data=None),
+            await self.storage.get_issue_status('ABC-123')
+        )
+
+        issue_data = entities.IssueData(
+            issue='ABC-123',
+            computed=yesterday,
+            history=[],
+            issue_id=0,
+            project_id=0,
+            summary='',
+        )
+        await self.storage.save_issue_data(issue_data)
+        await self.storage.save_issue_data(entities.IssueData(
+            issue='ABC-123',
+            computed=yesterday - timedelta(days=1),
+            history=[],
+            issue_id=0,
+            project_id=0,
+            summary='older',
+        ))
+
+        status = await self.storage.get_issue_status('ABC-123')
+        self.assertEqual(
+            entities.IssueStatus(issue='ABC-123', requested=now, issue_data=issue_data),
+            status
+        )
+        self.assertTrue(status.history_is_outdated)
+
+    async def test_get_issue_statuses(self) -> None:
+        now = datetime.now()
+        yesterday = now - timedelta(days=1)
+
+        await self.storage.save_requests([
+            entities.Request(issue='ABC-2', requested=yesterday, result=[]),
+            entities.Request(issue='ABC-1', requested=yesterday, result=[]),
+            entities.Request(issue='ABC-1', requested=now, result=[]),
+        ])
+        issue_data = entities.IssueData(issue='ABC-1', computed=yesterday, history=[], issue_id=0, project_id=0, summary='')
+        await self.storage.save_issue_data(entities.IssueData(
+            issue='ABC-1', computed=yesterday - timedelta(days=1), history=[], issue_id=0, project_id=0, summary='older'
+        ))
+        await self.storage.save_issue_data(issue_data)
+
+        self.assertEqual([
+            entities.IssueStatus(issue='ABC-1', requested=now, issue_data=issue_data),
+            entities.IssueStatus(issue='ABC-2', requested=yesterday, issue_data=None),
+        ], [status async for status in self.storage.get_issue_statuses()])
+
+    async def test_get_outdated_requests(self) -> None:
+        now = datetime.now()
+        yesterday = now - timedelta(days=1)
+
+        await self.storage.save_requests([
+            entities.Request(issue='ABC-1', requested=yesterday, result=[]),
+            entities.Request(issue='ABC-1', requested=now, result=['latest']),  # newer than issue data
+            entities.Request(issue='ABC-2', requested=yesterday, result=[]),  # issue data is up to date
+            entities.Request(issue='ABC-3', requested=yesterday, result=[]),  # no issue data
+            entities.Request(issue='ABC-4', requested=yesterday, result=[]),  # issue data incomplete
+        ])
+        for issue, created_by in (('ABC-1', 'Someone'), ('ABC-2', 'Someone'), ('ABC-4', None)):
+            await self.storage.save_issue_data(entities.IssueData(
+                issue=issue,
+                computed=yesterday + timedelta(hours=1),
+                history=[],
+                issue_id=0,
+                project_id=0,
+                summary='',
+                created=yesterday,
+                created_by=created_by,
+            ))
+
+        self.assertEqual(
+            [
+                entities.Request(issue='ABC-1', requested=now, result=['latest']),
+                entities.Request(issue='ABC-3', requested=yesterday, result=[]),
+                entities.Request(issue='ABC-4', requested=yesterday, result=[]),
+            ],
+            [request async for request in self.storage.get_outdated_requests()]
+        )
+        self.assertEqual(
+            ['ABC-3'],
+            [request.issue async for request in self.storage.get_outdated_requests(after_issue='ABC-1', limit=1)]
+        )
+
+    async def test_get_issue_data_page(self) -> None:
+        computed = datetime(2024, 1, 10, 12, 0)
+        datas = [
+            entities.IssueData(
+                issue=f'ABC-{i}',
+                computed=computed + timedelta(days=day),
+                history=[{'i': i, 'day': day}],
+                issue_id=i,
+                project_id=45 if i % 2 else 46,
+                summary='We need to fix this',
+                created=datetime(2024, 1, i + 1, 9, 0),
+                created_by='Someone',
+            ) for i in range(5) for day in range(2)
+        ]
+        await self.storage.save_issue_datas(datas)
+
+        async def pages(limit: int, **kwargs) -> list[list[entities.IssueData]]:
+            result = []
+            after = None
+            while page := [data async for data in self.storage.get_issue_data_page(after=after, limit=limit, **kwargs)]:
+                result.append(page)
+                after = page[-1].issue, page[-1].computed
+            return result
+
+        self.assertEqual([datas[0:3], datas[3:6], datas[6:9], datas[9:]], await pages(3))
+        self.assertEqual([datas[1::2]], await pages(5, latest_only=True))
+        with self.subTest('Filtered by project, created and computed'):
+            self.assertEqual(
+                [datas[3:4], datas[7:8]],
+                await pages(1, latest_only=True, filter=entities.IssueDataFilter(project_id=45))
+            )
+            self.assertEqual(
+                [datas[4:8]],
+                await pages(5, filter=entities.IssueDataFilter(created_from=datetime(2024, 1, 3), created_to=datetime(2024, 1, 5)))
+            )
+            self.assertEqual(
+                [datas[0::2]],
+                await pages(10, filter=entities.IssueDataFilter(computed_to=computed + timedelta(days=1)))
+            )
+        with self.subTest('Without history'):
+            page = [data async for data in self.storage.get_issue_data_page(limit=1, with_history=False)]
+            self.assertEqual([dataclasses.replace(datas[0], history=None)], page)
+
+    async def test_get_request_page(self) -> None:
+        requested = datetime(2024, 1, 10, 12, 0)
+        reqs = [
+            entities.Request(issue=f'ABC-{i}', requested=requested + timedelta(days=day), result=[{'i': i}])
+            for i in range(3) for day in range(2)
+        ]
+        await self.storage.save_requests(reqs)
+
+        first = [request async for request in self.storage.get_request_page(limit=4)]
+        self.assertEqual(reqs[:4], first)
+        self.assertEqual(
+            reqs[4:],
+            [request async for request in self.storage.get_request_page(after=(first[-1].issue, first[-1].requested))]
+        )
+        self.assertEqual(
+            [reqs[3]],
+            [request async for request in self.storage.get_request_page(
+                issue='ABC-1', requested_from=requested + timedelta(hours=1)
+            )]
+        )
+        self.assertEqual(
+            [dataclasses.replace(request, result=None) for request in reqs[0::2]],
+            [request async for request in self.storage.get_request_page(
+                requested_to=requested + timedelta(hours=1), with_result=False
+            )]
+        )
+
+    async def test_pages_are_read_from_indexes(self) -> None:
+        async with self.storage._async_engine.connect() as conn:
+            for sql in (
+                'SELECT * FROM issue_data WHERE (issue, computed) > (:issue, :time) ORDER BY issue, computed LIMIT 10',
+                'SELECT * FROM issue_data WHERE project_id = 45 AND (issue, computed) > (:issue, :time) '
+                'ORDER BY issue, computed LIMIT 10',
+                'SELECT * FROM requests WHERE (issue, requested) > (:issue, :time) ORDER BY issue, requested LIMIT 10',
+            ):
+                plan = ' '.join(row[-1] for row in await conn.execute(
+                    text(f'EXPLAIN QUERY PLAN {sql}'), {'issue': 'ABC-1', 'time': '2024-01-01 00:00:00.000000'}
+                ))
+                self.assertIn('USING INDEX', plan, sql)
+                self.assertNotIn('TEMP B-TREE', plan, sql)
+
+
+class TestTimelineCheckpoint(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        await self.storage.set_up()
+        await self.storage.clean_up()
+
+    async def test_save_and_get(self) -> None:
+        processed = datetime(2024, 1, 18, 11, 5, 19, 636000, tzinfo=tzoffset(None, 3600))
+        checkpoint = entities.TimelineCheckpoint(
+            issue='ABC-123',
+            display_name='Someone',
+            processed=processed,
+            item_count=12,
+            states={'ASSIGNED': processed - timedelta(hours=1)},
+            state_added={'AssigneeProcessor': processed - timedelta(hours=1)},
+            digest='0123456789abcdef',
+        )
+        await self.storage.save_timeline_checkpoints([
+            checkpoint,
+            entities.TimelineCheckpoint('ABC-123', 'Someone Else', processed, 12, {}, {}),
+        ])
+        self.assertEqual([checkpoint], [c async for c in self.storage.get_timeline_checkpoints('Someone')])
+
+        # replaces the checkpoint of the same issue and person
+        checkpoint.item_count = 14
+        checkpoint.states = {}
+        await self.storage.save_timeline_checkpoints([checkpoint])
+        self.assertEqual([checkpoint], [c async for c in self.storage.get_timeline_checkpoints('Someone')])
+
+
+class TestSQLiteProfile(unittest.IsolatedAsyncioTestCase):
+
+    async def test_pragmas_are_applied_on_connect(self) -> None:
+        storage = TestSQLStorage(
+            AlembicSQLInitializer(Base.metadata),
+            SQLiteProfile(synchronous='full', cache_size=-1024, busy_timeout=1234),
+        )
+        await storage.set_up()
+
+        async with storage._async_session() as session:
+            self.assertEqual(2, await session.scalar(text('PRAGMA synchronous')))
+            self.assertEqual(-1024, await session.scalar(text('PRAGMA cache_size')))
+            self.assertEqual(1234, await session.scalar(text('PRAGMA busy_timeout')))
+
+    def test_invalid_journal_mode(self) -> None:
+        with self.assertRaises(ValueError):
+            SQLiteProfile(journal_mode='WAL; DROP TABLE requests')
+
+
+class TestEventLoops(unittest.IsolatedAsyncioTestCase):
+
+    async def test_each_loop_has_its_own_engine(self) -> None:
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(os.environ, SQLSTORAGE_SQLITE=f'sqlite:///{directory}/jira_reader.db'):
+            storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+            await storage.set_up()
+            await storage.save_request(entities.Request(issue='ABC-123', result=['saved']))
+
+            async def in_thread() -> tuple[object, entities.Request]:
+                return storage._async_engine, await storage.get_latest_request('ABC-123')
+
+            with concurrent.futures.ThreadPoolExecutor(1) as executor:
+                engine, request = executor.submit(asyncio.run, in_thread()).result()
+                self.assertEqual(['saved'], request.result)
+                self.assertIsNot(engine, storage._async_engine)
+                # the engine of a closed loop is dropped when another loop gets one
+                other_engine, _ = executor.submit(asyncio.run, in_thread()).result()
+            self.assertEqual([storage._async_engine, other_engine], list(storage._engines.values()))
+            await storage.dispose()
+            self.assertEqual([other_engine], list(storage._engines.values()))
+
+    async def test_in_memory_database_has_one_engine(self) -> None:
+        storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        await storage.set_up()
+
+        async def in_thread() -> object:
+            return storage._async_engine
+
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            self.assertIs(storage._async_engine, executor.submit(asyncio.run, in_thread()).result())
+
+
+class TestClaimWriter(unittest.TestCase):
+
+    def test_only_writer(self) -> None:
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(os.environ, SQLSTORAGE_SQLITE=f'sqlite:///{directory}/jira_reader.db'):
+            storages = [TestSQLStorage(AlembicSQLInitializer(Base.metadata)) for _ in range(3)]
+            storages[0].claim_writer()
+            storages[1].claim_writer()
+            with self.assertRaises(OtherWriter):
+                storages[2].claim_writer(only=True)
+
+            # until the writers exit
+            storages[0]._writer_lock.close()
+            storages[1]._writer_lock.close()
+            storages[2].claim_writer(only=True)
+            with self.assertRaises(OtherWriter):
+                TestSQLStorage(AlembicSQLInitializer(Base.metadata)).claim_writer()
+            storages[2]._writer_lock.close()
+
+    def test_in_memory_database_has_no_other_writers(self) -> None:
+        storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        storage.claim_writer(only=True)
+        TestSQLStorage(AlembicSQLInitializer(Base.metadata)).claim_writer(only=True)
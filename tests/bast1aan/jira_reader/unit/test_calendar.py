@@ -0,0 +1,61 @@
+import unittest
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+
+from bast1aan.jira_reader.calendar import Calendar, event_from_timeline
+from bast1aan.jira_reader.entities import Timeline
+from bast1aan.jira_reader.ical import to_ical
+
+
+class EventFromTimelineTestCase(unittest.TestCase):
+    timeline = Timeline(
+        issue='ABC-123',
+        start=datetime(2023, 11, 29, 17, 9, 16, tzinfo=timezone(timedelta(hours=1))),
+        end=datetime(2023, 11, 30, 10, 0, tzinfo=timezone(timedelta(hours=1))),
+        display_name='Person 1',
+        email='person1@example.com',
+        type=Timeline.TYPE_ASSIGNED,
+        issue_summary='We need to fix this',
+    )
+
+    def test_uid_is_stable_when_summary_or_end_change(self):
+        event = event_from_timeline(self.timeline)
+        changed = event_from_timeline(replace(self.timeline, issue_summary='Fixed', end=datetime(2023, 12, 1, tzinfo=timezone.utc)))
+        self.assertEqual(event.id, changed.id)
+        self.assertNotEqual(event.content_hash, changed.content_hash)
+
+    def test_uid_does_not_depend_on_timezone(self):
+        self.assertEqual(
+            event_from_timeline(self.timeline).id,
+            event_from_timeline(replace(self.timeline, start=self.timeline.start.astimezone(timezone.utc))).id,
+        )
+
+    def test_uid_differs_per_issue_person_type_and_start(self):
+        uid = event_from_timeline(self.timeline).id
+        for changes in (
+            {'issue': 'ABC-124'},
+            {'display_name': 'Person 2'},
+            {'type': Timeline.TYPE_IN_PROGESS},
+            {'start': self.timeline.start + timedelta(seconds=1)},
+        ):
+            with self.subTest(**changes):
+                self.assertNotEqual(uid, event_from_timeline(replace(self.timeline, **changes)).id)
+
+    def test_uid_is_of_the_start_before_clipping(self):
+        clipped = replace(self.timeline, start=datetime(2023, 11, 30, tzinfo=timezone.utc), unclipped_start=self.timeline.start)
+        self.assertEqual(event_from_timeline(self.timeline).id, event_from_timeline(clipped).id)
+        self.assertEqual(clipped.start, event_from_timeline(clipped).start)
+
+    def test_content_hash_is_stable(self):
+        self.assertEqual(event_from_timeline(self.timeline).content_hash, event_from_timeline(self.timeline).content_hash)
+
+    def test_content_hash_in_ical(self):
+        event = event_from_timeline(self.timeline)
+        changed = event_from_timeline(replace(self.timeline, issue_summary='Fixed'))
+
+        ical = to_ical(Calendar('calendar'), [event]).decode()
+        changed_ical = to_ical(Calendar('calendar'), [changed]).decode()
+
+        self.assertIn(f'X-JIRA-READER-CONTENT-HASH:{event.content_hash}\r\n', ical)
+        self.assertIn(f'X-JIRA-READER-CONTENT-HASH:{changed.content_hash}\r\n', changed_ical)
+        self.assertIn(f'UID:{event.id}\r\n', changed_ical)
@@ -0,0 +1,73 @@
+import gzip
+import unittest
+
+from flask import Flask, Response
+
+from bast1aan.jira_reader import compression
+
+app = Flask(__name__)
+app.after_request(compression.compress_response)
+
+BODY = '{"results": [%s]}' % ', '.join(['"some timeline"'] * 200)
+
+
+@app.get('/json')
+def json_body() -> Response:
+    response = app.response_class(BODY, mimetype='application/json')
+    response.set_etag('abc')
+    return response
+
+@app.get('/small')
+def small_body() -> Response:
+    return app.response_class('{}', mimetype='application/json')
+
+@app.get('/image')
+def image_body() -> Response:
+    return app.response_class(BODY, mimetype='image/png')
+
+@app.get('/streamed')
+def streamed_body() -> Response:
+    return app.response_class((chunk for chunk in (BODY[:100], BODY[100:])), mimetype='text/calendar')
+
+
+class CompressResponseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_gzip(self):
+        response = self.client.get('/json', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertEqual('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(BODY, gzip.decompress(response.data).decode('utf-8'))
+        self.assertLess(len(response.data), len(BODY))
+        self.assertEqual(('abc', True), response.get_etag())
+
+    def test_not_accepted(self):
+        for accept_encoding in (None, 'identity', 'gzip;q=0'):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get('/json', headers={'Accept-Encoding': accept_encoding} if accept_encoding else {})
+                self.assertNotIn('Content-Encoding', response.headers)
+                self.assertEqual(BODY, response.text)
+
+    def test_below_min_size_or_not_compressible(self):
+        for path in ('/small', '/image'):
+            with self.subTest(path=path):
+                response = self.client.get(path, headers={'Accept-Encoding': 'gzip'})
+                self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_streamed(self):
+        response = self.client.get('/streamed', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertEqual(BODY, gzip.decompress(response.data).decode('utf-8'))
+
+
+class CompressStreamTestCase(unittest.TestCase):
+    def test_chunks_give_one_stream(self):
+        self.assertEqual(
+            BODY.encode('utf-8'),
+            gzip.decompress(b''.join(compression.compress_stream([BODY[:10].encode('utf-8'), BODY[10:].encode('utf-8')], 'gzip')))
+        )
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            compression.compress(b'', 'deflate')
@@ -1,12 +1,16 @@
 import json
+import random
+import tracemalloc
 import unittest
-from datetime import datetime
+from dataclasses import fields, make_dataclass, replace
+from datetime import datetime, timedelta
 
 from dateutil.tz import tzoffset
 
 from bast1aan.jira_reader import async_executor, entities, json_mapper
 from bast1aan.jira_reader.async_executor import ExecutorException
-from bast1aan.jira_reader.jira import ComputeTicketHistory, RequestTicketData, calculate_timelines
+from bast1aan.jira_reader.jira import ComputeTicketHistory, RequestTicketData, calculate_timelines, compute_issue_data, \
+    event_span
 from tests.bast1aan.jira_reader.adapters.async_executor import TestHttpAdapter
 from tests.bast1aan.jira_reader.util import get_module_from_file, scriptdir
 
@@ -70,7 +74,120 @@ class TestRequestTicketData(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(exc_info.exception.args[0], 404)
 
 
+class ComputeIssueDataTestCase(unittest.TestCase):
+
+    @staticmethod
+    def ticket(history_ids: list[int], comment_updates: dict[int, str]) -> dict:
+        return {
+            'id': '10001',
+            'fields': {'project': {'id': '100'}, 'summary': 'Summary', 'reporter': {'displayName': 'Someone'}},
+            'changelog': {'histories': [{
+                'id': str(history_id),
+                'author': {'emailAddress': 'someone@example.com', 'displayName': 'Someone'},
+                'created': f'2024-01-18T11:{history_id % 60:02d}:00.000+0100',
+                'items': [{'field': 'status', 'toString': 'In Progress', 'fromString': 'Open'}],
+            } for history_id in history_ids]},
+            'renderedFields': {
+                'created': '2024-01-18T10:00:00.000+0100',
+                'comment': {'comments': [{
+                    'id': str(comment_id),
+                    'author': {'emailAddress': 'someone@example.com', 'displayName': 'Someone'},
+                    'created': '18/Jan/24 10:00 AM',
+                    'updated': updated,
+                } for comment_id, updated in comment_updates.items()]},
+            },
+        }
+
+    def test_incremental_equals_full(self) -> None:
+        previous = compute_issue_data(entities.Request(issue='ABC-123', result=self.ticket(
+            [1, 2], {10: '18/Jan/24 10:00 AM', 11: '18/Jan/24 10:00 AM'}
+        )))
+        request = entities.Request(issue='ABC-123', result=self.ticket(
+            [1, 2, 3], {10: '18/Jan/24 10:00 AM', 11: '18/Jan/24 12:00 PM', 12: '18/Jan/24 12:00 PM'}
+        ))
+
+        incremental = compute_issue_data(request, previous)
+
+        self.assertEqual(compute_issue_data(request), incremental)
+        self.assertEqual([1, 2, 3], [item.id for item in incremental.history['items']])
+        # unchanged entries are taken from the previous history
+        self.assertIs(previous.history['items'][1], incremental.history['items'][1])
+        self.assertIs(previous.history['comments'][0], incremental.history['comments'][0])
+        self.assertIsNot(previous.history['comments'][1], incremental.history['comments'][1])
+
+    def test_previous_without_ids_is_computed_in_full(self) -> None:
+        request = entities.Request(issue='ABC-123', result=self.ticket([1], {}))
+        previous = compute_issue_data(request)
+        previous.history['items'][0].id = None
+
+        self.assertEqual(1, compute_issue_data(request, previous).history['items'][0].id)
+
+    def test_history_records_are_compact(self) -> None:
+        request = entities.Request(issue='ABC-123', result=self.ticket([1, 2], {10: '2024-01-18T10:00:00.000+0100'}))
+        history = compute_issue_data(request).history
+        first, second = history['items']
+        for record in (first, first.actions[0], history['comments'][0]):
+            with self.subTest(record=type(record).__name__):
+                self.assertFalse(hasattr(record, '__dict__'))
+        # repeated strings of the payload are shared
+        self.assertIs(first.byDisplayName, second.byDisplayName)
+        self.assertIs(first.actions[0].toString, second.actions[0].toString)
+
+        Action = ComputeTicketHistory.Response.Item.Action
+        Unslotted = make_dataclass('Unslotted', [(field.name, field.type) for field in fields(Action)])
+
+        def allocated(cls: type) -> int:
+            tracemalloc.start()
+            try:
+                records = [cls('status', 'In Progress', 'Open') for _ in range(10000)]
+                return tracemalloc.get_traced_memory()[0] if records else 0
+            finally:
+                tracemalloc.stop()
+
+        self.assertLess(allocated(Action), 0.75 * allocated(Unslotted))
+
+
 class CalculateTimelinesTestCase(unittest.TestCase):
+    def test_known_history(self):
+        Item = ComputeTicketHistory.Response.Item
+        Action = ComputeTicketHistory.Response.Item.Action
+        Comment = ComputeTicketHistory.Response.Comment
+        created = datetime(2024, 1, 18, 9, 0, tzinfo=datetime.now().astimezone().tzinfo)
+
+        def hours(n: float) -> datetime:
+            return created + timedelta(hours=n)
+
+        issue_data = entities.IssueData(
+            issue='ABC-123',
+            history={'items': [
+                Item(None, 'Someone Else', hours(1), [Action('assignee', 'Someone', None)]),
+                Item(None, 'Someone', hours(2), [Action('status', 'In Progress', 'Open')]),
+                Item(None, 'Someone', hours(5), [
+                    Action('status', 'Review', 'In Progress'), Action('2nd Developer', 'Someone Else', None),
+                ]),
+                Item(None, 'Someone', hours(8), [Action('assignee', None, 'Someone')]),
+            ], 'comments': [
+                Comment(1, None, 'Someone', hours(3), hours(3)),  # while in progress, so not counted
+                Comment(2, None, 'Someone', hours(9), hours(9)),
+            ]},
+            issue_id=123,
+            project_id=45,
+            summary='Fix this',
+            created=created,
+            created_by='Someone',
+        )
+
+        self.assertEqual(
+            (
+                entities.Timeline('ABC-123', hours(0), hours(0.25), 'Someone', '', 'creating_ticket', 'Fix this'),
+                entities.Timeline('ABC-123', hours(1), hours(2), 'Someone', '', 'assigned', 'Fix this'),
+                entities.Timeline('ABC-123', hours(2), hours(5), 'Someone', '', 'in_progress', 'Fix this'),
+                entities.Timeline('ABC-123', hours(5), hours(8), 'Someone', '', 'assigned', 'Fix this'),
+                entities.Timeline('ABC-123', hours(9), hours(9.25), 'Someone', '', 'writing_comment', 'Fix this'),
+            ),
+            tuple(calculate_timelines(issue_data, 'Someone'))
+        )
+
     def test_one(self):
         input = get_module_from_file('test_jira/calculate_timelines/input.py')
         expected = get_module_from_file('test_jira/calculate_timelines/expected.py')
@@ -128,3 +245,168 @@ class CalculateTimelinesTestCase(unittest.TestCase):
 
         self.assertEqual(expected.expected, timelines)
 
+    def test_resume_from_checkpoint(self):
+        Item = ComputeTicketHistory.Response.Item
+        Action = ComputeTicketHistory.Response.Item.Action
+        created = datetime(2024, 1, 18, 9, 0, tzinfo=tzoffset(None, 3600))
+
+        def issue_data(hours: int) -> entities.IssueData:
+            return entities.IssueData(
+                issue='ABC-123',
+                history={'items': [
+                    Item(None, 'Someone Else', created + timedelta(hours=hour), [
+                        Action('assignee', toString='Someone' if hour % 3 else 'Someone Else', fromString=None),
+                        Action('status', toString='In Progress' if hour % 2 else 'Open', fromString=None),
+                    ], id=hour)
+                    for hour in range(1, hours)
+                ], 'comments': []},
+                issue_id=123,
+                project_id=45,
+                summary='Fix this',
+                created=created,
+                created_by='Someone Else',
+            )
+
+        checkpoints = []
+        tuple(calculate_timelines(issue_data(20), 'Someone', from_=created + timedelta(hours=10, minutes=30), on_checkpoint=checkpoints.append))
+        self.assertEqual([10], [checkpoint.item_count - 2 for checkpoint in checkpoints])  # with the creating items
+
+        from_ = created + timedelta(hours=25, minutes=30)
+        resumed_checkpoints = []
+        resumed = tuple(calculate_timelines(
+            issue_data(40), 'Someone', from_=from_, checkpoint=checkpoints[0], on_checkpoint=resumed_checkpoints.append
+        ))
+
+        self.assertEqual(tuple(calculate_timelines(issue_data(40), 'Someone', from_=from_)), resumed)
+        self.assertEqual(created + timedelta(hours=25), resumed_checkpoints[0].processed)
+
+        # not resumed from a checkpoint taken after from_
+        earlier = created + timedelta(hours=5, minutes=30)
+        self.assertEqual(
+            tuple(calculate_timelines(issue_data(40), 'Someone', from_=earlier)),
+            tuple(calculate_timelines(issue_data(40), 'Someone', from_=earlier, checkpoint=resumed_checkpoints[0])),
+        )
+
+    def test_with_to(self):
+        Item = ComputeTicketHistory.Response.Item
+        Action = ComputeTicketHistory.Response.Item.Action
+        created = datetime(2024, 1, 18, 9, 0, tzinfo=tzoffset(None, 3600))
+        issue_data = entities.IssueData(
+            issue='ABC-123',
+            history={'items': [
+                Item(None, 'Someone Else', created + timedelta(hours=1), [Action('assignee', 'Someone', None)]),
+                Item(None, 'Someone', created + timedelta(hours=2), [Action('status', 'In Progress', 'Open')]),
+                Item(None, 'Someone', created + timedelta(hours=5), [Action('status', 'Done', 'In Progress')]),
+                Item(None, 'Someone', created + timedelta(hours=8), [Action('assignee', None, 'Someone')]),
+            ], 'comments': []},
+            issue_id=123,
+            project_id=45,
+            summary='Fix this',
+            created=created,
+            created_by='Someone Else',
+        )
+        to_ = created + timedelta(hours=4)
+
+        self.assertEqual(
+            tuple(
+                replace(timeline, end=min(timeline.end, to_))
+                for timeline in calculate_timelines(issue_data, 'Someone') if timeline.start < to_
+            ),
+            tuple(calculate_timelines(issue_data, 'Someone', to_=to_))
+        )
+        # the creation time is taken as local time, like calculate_timelines does
+        self.assertEqual(
+            (created.replace(tzinfo=datetime.now().astimezone().tzinfo), created + timedelta(hours=8)),
+            event_span(issue_data)
+        )
+
+    def test_window_equals_clipped_full_replay(self):
+        Item = ComputeTicketHistory.Response.Item
+        Action = ComputeTicketHistory.Response.Item.Action
+        Comment = ComputeTicketHistory.Response.Comment
+        people = ('Someone', 'Someone Else', None)
+        statuses = ('Open', 'In Progress', 'Review', 'In Progress', 'Done')
+        created = datetime(2024, 1, 18, 9, 0, tzinfo=tzoffset(None, 3600))
+
+        def random_issue_data(rng: random.Random) -> entities.IssueData:
+            items = []
+            values = {'assignee': None, '2nd Developer': None, 'status': 'Open'}
+            for index in range(rng.randint(0, 25)):
+                actions = []
+                for field in rng.sample(sorted(values), rng.randint(1, 2)):
+                    new = rng.choice(statuses if field == 'status' else people)
+                    actions.append(Action(field, toString=new, fromString=values[field]))
+                    values[field] = new
+                moment = created + timedelta(minutes=rng.randint(1, 3000))
+                items.append(Item(None, 'Someone Else', moment, actions, id=index))
+            items.sort(key=lambda item: item.created)
+            comments = []
+            for index in range(rng.randint(0, 3)):
+                moment = created + timedelta(minutes=rng.randint(1, 3000))
+                comments.append(Comment(index, None, rng.choice(people[:2]), moment, moment))
+            return entities.IssueData(
+                issue='ABC-123',
+                history={'items': items, 'comments': comments},
+                issue_id=123,
+                project_id=45,
+                summary='Fix this',
+                created=created,
+                created_by=rng.choice(people[:2]),
+            )
+
+        def clipped(timelines, from_, to_):
+            return tuple(
+                replace(timeline, start=max(timeline.start, from_), end=min(timeline.end, to_))
+                for timeline in timelines if timeline.end >= from_ and timeline.start < to_
+            )
+
+        rng = random.Random(39)
+        for run in range(300):
+            issue_data = random_issue_data(rng)
+            from_, to_ = sorted(created + timedelta(minutes=rng.randint(-60, 3100)) for _ in range(2))
+            with self.subTest(run=run):
+                for display_name in ('Someone', 'Someone Else'):
+                    expected = clipped(calculate_timelines(issue_data, display_name), from_, to_)
+                    self.assertEqual(
+                        expected,
+                        tuple(calculate_timelines(issue_data, display_name, from_=from_, to_=to_))
+                    )
+                    # also when resumed from a checkpoint taken before the window
+                    checkpoints = []
+                    earlier = from_ - timedelta(minutes=rng.randint(1, 600))
+                    tuple(calculate_timelines(issue_data, display_name, from_=earlier, on_checkpoint=checkpoints.append))
+                    self.assertEqual(
+                        expected,
+                        tuple(calculate_timelines(
+                            issue_data, display_name, from_=from_, to_=to_, checkpoint=checkpoints[0] if checkpoints else None
+                        ))
+                    )
+
+    def test_not_resumed_when_history_before_checkpoint_changed(self):
+        Item = ComputeTicketHistory.Response.Item
+        Action = ComputeTicketHistory.Response.Item.Action
+        created = datetime(2024, 1, 18, 9, 0, tzinfo=tzoffset(None, 3600))
+
+        def issue_data(assignee: str) -> entities.IssueData:
+            return entities.IssueData(
+                issue='ABC-123',
+                history={'items': [
+                    Item(None, 'Someone Else', created + timedelta(hours=1), [Action('assignee', toString=assignee, fromString=None)], id=1),
+                    Item(None, 'Someone Else', created + timedelta(hours=2), [Action('status', toString='In Progress', fromString=None)], id=2),
+                    Item(None, 'Someone Else', created + timedelta(hours=30), [Action('labels', toString='label', fromString=None)], id=3),
+                ], 'comments': []},
+                issue_id=123,
+                project_id=45,
+                summary='Fix this',
+                created=created,
+                created_by='Someone Else',
+            )
+
+        checkpoints = []
+        tuple(calculate_timelines(issue_data('Someone'), 'Someone', from_=created + timedelta(hours=2, minutes=30), on_checkpoint=checkpoints.append))
+
+        # the same number of items up to the checkpoint, but Someone was never assigned
+        changed = issue_data('Someone Else')
+        from_ = created + timedelta(hours=20)
+        self.assertEqual((), tuple(calculate_timelines(changed, 'Someone', from_=from_)))
+        self.assertEqual((), tuple(calculate_timelines(changed, 'Someone', from_=from_, checkpoint=checkpoints[0])))
@@ -1,8 +1,12 @@
 import json
 import unittest
+from dataclasses import asdict, fields, is_dataclass, replace
+from datetime import datetime
+
+from dateutil.tz import tzoffset
 
 from bast1aan.jira_reader.jira import ComputeTicketHistory
-from bast1aan.jira_reader import json_mapper
+from bast1aan.jira_reader import entities, json_mapper
 from tests.bast1aan.jira_reader.util import scriptdir, get_module_from_file
 
 
@@ -21,3 +25,72 @@ class AsdataclassTestCase(unittest.TestCase):
 
         self.assertEqual(expected.expected, converted)
 
+
+
+def json_fields(o: object) -> set[str]:
+    return {field.name for field in fields(o) if field.metadata.get('json', True)}
+
+
+class DumpsTestCase(unittest.TestCase):
+    def test_same_output_as_json_dumps_with_asdict(self):
+        class AsdictEncoder(json.JSONEncoder):
+            def default(self, o):
+                if is_dataclass(o):
+                    return {name: value for name, value in asdict(o).items() if name in json_fields(o)}
+                if isinstance(o, datetime):
+                    return o.isoformat()
+                return super().default(o)
+
+        created = datetime(2024, 1, 18, 11, 5, 19, 636000, tzinfo=tzoffset(None, 3600))
+        timeline = entities.Timeline('ABC-123', created, created, 'Sömeone', '', 'assigned', 'Fix "this"')
+        response = ComputeTicketHistory.Response(
+            items=[
+                ComputeTicketHistory.Response.Item(
+                    byEmailAddress=None,
+                    byDisplayName='Sömeone',
+                    created=created,
+                    actions=[ComputeTicketHistory.Response.Item.Action('assignee', 'Sömeone', None)],
+                )
+            ],
+            comments=[],
+            issue_id=123,
+            project_id=45,
+            summary='Fix "this"',
+            created=datetime(2024, 1, 18, 11, 5, 19),
+            created_by='Someone Else',
+        )
+        for o in (
+            response,
+            {'results': [timeline, timeline]},
+            replace(timeline, unclipped_start=datetime(2024, 1, 17)),
+            json.loads(json.dumps(response, cls=AsdictEncoder)),
+            [1, 2.5, float('nan'), True, None, 'é'],
+            {1: 2, 2.5: 3, None: 1, True: 0},
+            [[timeline]],
+            (),
+            {},
+        ):
+            with self.subTest(o=o):
+                self.assertEqual(json.dumps(o, cls=AsdictEncoder), json_mapper.dumps(o))
+
+    def test_circular_reference(self):
+        created = datetime(2024, 1, 18, 11, 5, 19)
+        circular_list = [1]
+        circular_list.append(circular_list)
+        circular_dict = {'a': 1}
+        circular_dict['self'] = circular_dict
+        timeline = entities.Timeline('ABC-123', created, created, 'Someone', '', 'assigned', 'Fix this')
+        circular_dataclass = {'results': [timeline, {'again': circular_list}]}
+        for o in (circular_list, circular_dict, circular_dataclass, {'timeline': timeline, 'self': circular_dict}):
+            with self.subTest(o=type(o)):
+                with self.assertRaisesRegex(ValueError, 'Circular reference detected'):
+                    json_mapper.dumps(o)
+        with self.subTest('The same object twice is no circle'):
+            shared = {'results': [timeline]}
+            self.assertEqual(f'[{json_mapper.dumps(shared)}, {json_mapper.dumps(shared)}]', json_mapper.dumps([shared, shared]))
+
+    def test_fields_left_out_of_json(self):
+        created = datetime(2024, 1, 18, 11, 5, 19)
+        timeline = entities.Timeline('ABC-123', created, created, 'Someone', '', 'assigned', 'Fix this', unclipped_start=created)
+        self.assertNotIn('unclipped_start', json.loads(json_mapper.dumps(timeline)))
+        self.assertNotIn('unclipped_start', json.loads(json_mapper.dumps({'results': [timeline]}))['results'][0])
@@ -0,0 +1,38 @@
+import unittest
+from dataclasses import dataclass
+
+from bast1aan.jira_reader.overridable import overridable
+
+
+class NotComparable:
+    def __eq__(self, other):
+        raise AssertionError('should not be compared')
+
+
+@overridable(expensive=('history',))
+@dataclass
+class Data:
+    history: object
+    issue: str
+
+
+@dataclass(eq=False)
+class HashedData(Data):
+    def content_hash(self, field_name: str) -> str | None:
+        return 'same' if field_name == 'history' else None
+
+
+class OverridableTestCase(unittest.TestCase):
+    def test_subclass_equals_base_class(self):
+        self.assertEqual(Data([1], 'ABC-123'), HashedData([1], 'ABC-123'))
+        self.assertNotEqual(Data([1], 'ABC-123'), HashedData([2], 'ABC-123'))
+
+    def test_cheap_fields_are_compared_first(self):
+        self.assertNotEqual(Data(NotComparable(), 'ABC-123'), Data(NotComparable(), 'ABC-456'))
+
+    def test_equal_content_hashes_skip_comparison(self):
+        self.assertEqual(HashedData(NotComparable(), 'ABC-123'), HashedData(NotComparable(), 'ABC-123'))
+
+    def test_unknown_expensive_field(self):
+        with self.assertRaises(TypeError):
+            overridable(expensive=('unknown',))(dataclass(type('D', (), {'__annotations__': {'a': int}})))
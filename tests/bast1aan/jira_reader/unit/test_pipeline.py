@@ -0,0 +1,90 @@
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+
+from bast1aan.jira_reader import entities, pipeline as pipeline_module
+from bast1aan.jira_reader.adapters.alembic.jira_reader import AlembicSQLInitializer
+from bast1aan.jira_reader.adapters.sqlstorage import Base
+from bast1aan.jira_reader.pipeline import HistoryPipeline, compute_outdated_histories
+from tests.bast1aan.jira_reader.adapters.sqlstorage import TestSQLStorage
+
+
+async def compute(request: entities.Request, previous: entities.IssueData | None = None) -> entities.IssueData:
+    if request.result == 'invalid':
+        raise ValueError('invalid')
+    return entities.IssueData(
+        issue=request.issue,
+        history=request.result,
+        issue_id=0,
+        project_id=0,
+        summary='computed',
+        created=request.requested,
+        created_by='Someone',
+    )
+
+
+class HistoryPipelineTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        await self.storage.set_up()
+        await self.storage.clean_up()
+        await self.storage.save_requests([
+            entities.Request(issue='ABC-1', requested=datetime.now() - timedelta(minutes=1), result=['one']),
+            entities.Request(issue='ABC-2', requested=datetime.now() - timedelta(minutes=1), result=['two']),
+        ])
+
+    async def get_storage(self) -> TestSQLStorage:
+        return self.storage
+
+    async def test_eager_computes_saved_request(self) -> None:
+        pipeline = HistoryPipeline(self.get_storage, mode=HistoryPipeline.EAGER, compute=compute)
+
+        pipeline.histories_read()
+        pipeline.request_saved('ABC-1')
+        pipeline.join()
+
+        self.assertEqual(['one'], (await self.storage.get_issue_data('ABC-1')).history)
+        self.assertIsNone(await self.storage.get_issue_data('ABC-2'))
+
+    async def test_lazy_computes_all_outdated_on_read(self) -> None:
+        pipeline = HistoryPipeline(self.get_storage, mode=HistoryPipeline.LAZY, compute=compute)
+
+        pipeline.request_saved('ABC-1')
+        pipeline.join()
+        self.assertIsNone(await self.storage.get_issue_data('ABC-1'))
+
+        pipeline.histories_read()
+        pipeline.join()
+
+        self.assertEqual(['one'], (await self.storage.get_issue_data('ABC-1')).history)
+        self.assertEqual(['two'], (await self.storage.get_issue_data('ABC-2')).history)
+
+    async def test_indexes_timelines_after_computing(self) -> None:
+        pipeline = HistoryPipeline(self.get_storage, mode=HistoryPipeline.EAGER, compute=compute, index_timelines=True)
+        indexed = []
+
+        async def update_timeline_index(storage: TestSQLStorage) -> int:
+            indexed.append(storage)
+            return 0
+
+        with mock.patch.object(pipeline_module, 'update_timeline_index', update_timeline_index):
+            pipeline.request_saved('ABC-1')
+            pipeline.join()
+            pipeline.issue_data_saved()
+            pipeline.join()
+
+        self.assertEqual([self.storage, self.storage], indexed)
+
+    def test_invalid_mode(self) -> None:
+        with self.assertRaises(ValueError):
+            HistoryPipeline(self.get_storage, mode='sometimes')
+
+    async def test_compute_outdated_histories_reports_errors(self) -> None:
+        await self.storage.save_request(entities.Request(issue='ABC-3', requested=datetime.now(), result='invalid'))
+
+        computed, errors = await compute_outdated_histories(self.storage, compute, batch_size=1)
+
+        self.assertEqual(['ABC-1', 'ABC-2'], computed)
+        self.assertEqual({'ABC-3': 'ValueError: invalid'}, errors)
@@ -0,0 +1,37 @@
+import unittest
+
+from bast1aan.jira_reader.response_cache import ResponseCache, CachedResponse
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def test_get_put(self):
+        cache = ResponseCache()
+        self.assertIsNone(cache.get('a', 1))
+        put = cache.put('a', 1, 'body')
+        self.assertEqual(CachedResponse.of(b'body'), put)
+        self.assertEqual(put, cache.get('a', 1))
+
+    def test_etag_depends_on_body(self):
+        self.assertEqual(CachedResponse.of('body').etag, CachedResponse.of('body').etag)
+        self.assertNotEqual(CachedResponse.of('body').etag, CachedResponse.of('other').etag)
+
+    def test_other_generation_is_a_miss(self):
+        cache = ResponseCache()
+        cache.put('a', 1, 'body')
+        self.assertIsNone(cache.get('a', 2))
+        self.assertIsNone(cache.get('a', 1), 'stale entries are removed')
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ResponseCache(max_bytes=10)
+        cache.put('a', 1, '1234')
+        cache.put('b', 1, '1234')
+        cache.get('a', 1)
+        cache.put('c', 1, '1234')
+        self.assertIsNotNone(cache.get('a', 1))
+        self.assertIsNone(cache.get('b', 1))
+        self.assertIsNotNone(cache.get('c', 1))
+
+    def test_too_large_is_not_cached(self):
+        cache = ResponseCache(max_bytes=3)
+        self.assertEqual(b'1234', cache.put('a', 1, '1234').body)
+        self.assertIsNone(cache.get('a', 1))
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# seconds importing rest_api may take in a fresh interpreter, generous to not fail on slow machines
+STARTUP_BUDGET = float(os.getenv('STARTUP_BUDGET', 3.0))
+
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import bast1aan.jira_reader.rest_api
+print(time.perf_counter() - start)
+print(' '.join(sorted({name.split('.')[0] for name in sys.modules})))
+"""
+
+
+class StartupTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        output = subprocess.run(
+            [sys.executable, '-c', SCRIPT], capture_output=True, text=True, check=True
+        ).stdout.splitlines()
+        cls.elapsed = float(output[0])
+        cls.modules = set(output[1].split())
+
+    def test_heavy_modules_are_imported_lazily(self):
+        for module in ('alembic', 'aiohttp', 'icalendar', 'dateutil'):
+            with self.subTest(module=module):
+                self.assertNotIn(module, self.modules)
+
+    def test_import_time(self):
+        self.assertLess(self.elapsed, STARTUP_BUDGET, f'importing rest_api took {self.elapsed:.3f}s')
@@ -0,0 +1,138 @@
+import asyncio
+import concurrent.futures
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+from bast1aan.jira_reader import entities
+from bast1aan.jira_reader.adapters.alembic.jira_reader import AlembicSQLInitializer
+from bast1aan.jira_reader.adapters.sqlstorage import Base
+from bast1aan.jira_reader.async_executor import Executor
+from bast1aan.jira_reader.jira import ComputeTicketHistory, RequestTicketData
+from bast1aan.jira_reader.sync import RefreshPolicy, SyncWorker
+from tests.bast1aan.jira_reader.adapters.async_executor import TestHttpAdapter
+from tests.bast1aan.jira_reader.adapters.sqlstorage import TestSQLStorage
+
+Item = ComputeTicketHistory.Response.Item
+Action = ComputeTicketHistory.Response.Item.Action
+
+
+def issue_data(issue: str, last_activity: datetime, created_by: str = 'Someone') -> entities.IssueData:
+    return entities.IssueData(
+        issue=issue,
+        history={
+            'items': [Item(
+                byEmailAddress=None,
+                byDisplayName=created_by,
+                created=last_activity,
+                actions=[Action(field='assignee', toString='Assignee', fromString=None)],
+            )],
+            'comments': [],
+        },
+        issue_id=0,
+        project_id=0,
+        summary='',
+        created=last_activity - timedelta(days=10),
+        created_by=created_by,
+    )
+
+
+class RefreshPolicyTestCase(unittest.TestCase):
+    now = datetime(2024, 5, 1, 12)
+    policy = RefreshPolicy()
+
+    def test_never_requested_is_due_now(self) -> None:
+        status = entities.IssueStatus(issue='ABC-1', requested=None, issue_data=None)
+        self.assertEqual(self.now, self.policy.due(status, self.now, set()))
+
+    def test_not_computed_waits_max_interval(self) -> None:
+        status = entities.IssueStatus(issue='ABC-1', requested=self.now, issue_data=None)
+        self.assertEqual(self.now + self.policy.max_interval, self.policy.due(status, self.now, set()))
+
+    def test_interval_grows_with_inactivity(self) -> None:
+        requested = self.now - timedelta(hours=1)
+        active = entities.IssueStatus('ABC-1', requested, issue_data('ABC-1', self.now))
+        inactive = entities.IssueStatus('ABC-2', requested, issue_data('ABC-2', self.now - timedelta(days=3)))
+        dormant = entities.IssueStatus('ABC-3', requested, issue_data('ABC-3', self.now - timedelta(days=3000)))
+
+        self.assertEqual(requested + timedelta(minutes=5), self.policy.due(active, self.now, set()))
+        self.assertEqual(requested + timedelta(minutes=20), self.policy.due(inactive, self.now, set()))
+        self.assertEqual(requested + timedelta(days=1), self.policy.due(dormant, self.now, set()))
+
+    def test_subscribers_refreshed_more_often(self) -> None:
+        requested = self.now - timedelta(hours=1)
+        status = entities.IssueStatus('ABC-1', requested, issue_data('ABC-1', self.now - timedelta(days=7)))
+
+        self.assertEqual(requested + timedelta(minutes=40), self.policy.due(status, self.now, set()))
+        self.assertEqual(requested + timedelta(minutes=10), self.policy.due(status, self.now, {'Assignee'}))
+        self.assertEqual(requested + timedelta(minutes=40), self.policy.due(status, self.now, {'Nobody'}))
+
+
+class SyncWorkerTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        await self.storage.set_up()
+        await self.storage.clean_up()
+        now = datetime.now()
+        await self.storage.save_requests([
+            entities.Request(issue='ABC-1', requested=now - timedelta(days=2), result={}),  # due long ago
+            entities.Request(issue='ABC-2', requested=now - timedelta(hours=1), result={}),  # due
+            entities.Request(issue='ABC-3', requested=now, result={}),  # not due
+        ])
+        for issue in ('ABC-1', 'ABC-2', 'ABC-3'):
+            await self.storage.save_issue_data(issue_data(issue, now))
+
+    async def get_storage(self) -> TestSQLStorage:
+        return self.storage
+
+    def request(self, issue: str) -> TestHttpAdapter.Request:
+        return TestHttpAdapter.Request(
+            url=f'https://jira-host/rest/api/3/issue/{issue}?expand=renderedFields,changelog',
+            headers=(('Accept', 'application/json'),),
+            auth=TestHttpAdapter.Auth(login='user@example.com', password='jira_api_token'),
+        )
+
+    async def test_due_issues_most_overdue_first(self) -> None:
+        worker = SyncWorker(self.get_storage, Executor(TestHttpAdapter({})))
+        self.assertEqual(['ABC-1', 'ABC-2'], await worker.due_issues())
+
+    async def test_sync_once(self) -> None:
+        adapter = TestHttpAdapter({self.request('ABC-1'): (200, {'key': 'ABC-1'})})
+        saved = []
+        worker = SyncWorker(self.get_storage, Executor(adapter), concurrency=1, on_saved=saved.append)
+
+        fetched = await worker.sync_once()
+
+        self.assertEqual(['ABC-1'], fetched)
+        self.assertEqual(['ABC-1'], saved)
+        self.assertEqual(
+            [self.request('ABC-1'), self.request('ABC-2')],
+            [request for request, _ in adapter.calls]
+        )
+        self.assertEqual({'key': 'ABC-1'}, (await self.storage.get_latest_request('ABC-1')).result)
+        self.assertEqual({}, (await self.storage.get_latest_request('ABC-2')).result)
+
+    async def test_fetches_from_other_threads_share_the_budget(self) -> None:
+        running = []
+        most = []
+        lock = threading.Lock()
+
+        async def execute(action: RequestTicketData) -> dict:
+            with lock:
+                running.append(action)
+                most.append(len(running))
+            await asyncio.sleep(0.05)
+            with lock:
+                running.remove(action)
+            return {}
+
+        worker = SyncWorker(self.get_storage, execute, concurrency=1)
+        # as the webhook inbox does, from a thread with its own event loop
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            other = executor.submit(asyncio.run, worker.fetch('ABC-3'))
+            self.assertEqual([True, True], await asyncio.gather(worker.fetch('ABC-1'), worker.fetch('ABC-2')))
+            self.assertTrue(other.result())
+
+        self.assertEqual([1, 1, 1], most)
@@ -0,0 +1,117 @@
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+
+from dateutil.tz import tzoffset
+
+from bast1aan.jira_reader import entities, timeline_index
+from bast1aan.jira_reader.adapters.alembic.jira_reader import AlembicSQLInitializer
+from bast1aan.jira_reader.adapters.sqlstorage import Base
+from bast1aan.jira_reader.jira import ComputeTicketHistory, calculate_timelines
+from bast1aan.jira_reader.timeline_index import query_timelines, update_timeline_index
+from tests.bast1aan.jira_reader.adapters.sqlstorage import TestSQLStorage
+
+Item = ComputeTicketHistory.Response.Item
+Action = ComputeTicketHistory.Response.Item.Action
+
+CREATED = datetime(2024, 1, 18, 9, 0, tzinfo=tzoffset(None, 3600))
+
+
+def issue_data(issue: str, assignee: str, hours: int = 8) -> entities.IssueData:
+    return entities.IssueData(
+        issue=issue,
+        history={'items': [
+            Item(None, 'Someone Else', CREATED + timedelta(hours=1), [Action('assignee', assignee, None)]),
+            Item(None, assignee, CREATED + timedelta(hours=2), [Action('status', 'In Progress', 'Open')]),
+            Item(None, assignee, CREATED + timedelta(hours=5), [Action('status', 'Done', 'In Progress')]),
+            Item(None, assignee, CREATED + timedelta(hours=hours), [Action('assignee', None, assignee)]),
+        ], 'comments': []},
+        issue_id=0,
+        project_id=0,
+        summary=f'Fix {issue}',
+        computed=datetime.now(),
+        created=CREATED,
+        created_by='Someone Else',
+    )
+
+
+class TimelineIndexTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        await self.storage.set_up()
+        await self.storage.clean_up()
+        await self.storage.save_issue_data(issue_data('ABC-1', 'Someone'))
+        await self.storage.save_issue_data(issue_data('ABC-2', 'Another'))
+
+    async def test_equals_calculated_timelines(self) -> None:
+        self.assertEqual(2, await update_timeline_index(self.storage))
+        self.assertEqual(0, await update_timeline_index(self.storage))
+
+        for display_name in ('Someone', 'Another', 'Someone Else'):
+            self.assertEqual(
+                [
+                    timeline
+                    for issue in ('ABC-1', 'ABC-2')
+                    for timeline in calculate_timelines(await self.storage.get_issue_data(issue), display_name)
+                ],
+                await query_timelines(self.storage, display_name)
+            )
+
+    async def test_window_is_clipped(self) -> None:
+        from_ = CREATED + timedelta(hours=3)
+        to_ = CREATED + timedelta(hours=4)
+        await update_timeline_index(self.storage)
+
+        timelines = await query_timelines(self.storage, 'Someone', from_=from_, to_=to_)
+
+        self.assertEqual(
+            [(entities.Timeline.TYPE_IN_PROGESS, from_, to_)],
+            [(timeline.type, timeline.start, timeline.end) for timeline in timelines]
+        )
+        self.assertEqual([], await query_timelines(self.storage, 'Someone', from_=CREATED + timedelta(days=1)))
+
+    async def test_new_issue_data_is_reindexed(self) -> None:
+        await update_timeline_index(self.storage)
+        await self.storage.save_issue_data(issue_data('ABC-1', 'Someone', hours=10))
+        self.assertEqual(1, await update_timeline_index(self.storage))
+
+        timelines = await query_timelines(self.storage, 'Someone', issue='ABC-1')
+
+        self.assertEqual(CREATED + timedelta(hours=10), timelines[-1].end)
+        self.assertEqual({'ABC-1'}, {timeline.issue for timeline in timelines})
+
+    async def test_several_people(self) -> None:
+        people = ('Someone', 'Another')
+        await update_timeline_index(self.storage)
+
+        timelines = await query_timelines(self.storage, display_names=people)
+
+        self.assertEqual(
+            sorted(
+                [timeline for display_name in people for timeline in await query_timelines(self.storage, display_name)],
+                key=lambda timeline: (timeline.issue, timeline.start)
+            ),
+            sorted(timelines, key=lambda timeline: (timeline.issue, timeline.start))
+        )
+        self.assertEqual([], await query_timelines(self.storage, display_names=()))
+
+    async def test_reads_do_not_index(self) -> None:
+        self.assertEqual([], await query_timelines(self.storage, 'Someone'))
+        await update_timeline_index(self.storage)
+        self.assertNotEqual([], await query_timelines(self.storage, 'Someone'))
+
+    async def test_failed_calculation_is_retried(self) -> None:
+        def failing(issue_data: entities.IssueData, display_name: str) -> list[entities.Timeline]:
+            if issue_data.issue == 'ABC-1':
+                raise ValueError('invalid history')
+            return calculate_timelines(issue_data, display_name)
+
+        with mock.patch.object(timeline_index, 'calculate_timelines', failing), \
+                self.assertLogs(timeline_index.logger, 'ERROR'):
+            self.assertEqual(1, await update_timeline_index(self.storage, batch_size=1))
+        self.assertEqual(['ABC-1'], [issue_data.issue async for issue_data in self.storage.get_unindexed_issue_datas()])
+
+        self.assertEqual(1, await update_timeline_index(self.storage))
+        self.assertEqual({'ABC-1'}, {timeline.issue for timeline in await query_timelines(self.storage, 'Someone')})
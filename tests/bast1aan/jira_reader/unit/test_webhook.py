@@ -0,0 +1,142 @@
+import unittest
+from datetime import datetime, timedelta
+
+from bast1aan.jira_reader import entities
+from bast1aan.jira_reader.adapters.alembic.jira_reader import AlembicSQLInitializer
+from bast1aan.jira_reader.adapters.sqlstorage import Base
+from bast1aan.jira_reader.jira import ComputeTicketHistory, calculate_timelines
+from bast1aan.jira_reader.webhook import WebhookInbox
+from tests.bast1aan.jira_reader.adapters.sqlstorage import TestSQLStorage
+
+Item = ComputeTicketHistory.Response.Item
+Action = ComputeTicketHistory.Response.Item.Action
+Comment = ComputeTicketHistory.Response.Comment
+
+
+def issue_updated(issue: str, changelog_id: str = '100') -> dict:
+    return {
+        'timestamp': 1714564800000,
+        'webhookEvent': 'jira:issue_updated',
+        'user': {'displayName': 'Someone', 'emailAddress': 'someone@example.com'},
+        'issue': {'key': issue, 'fields': {'summary': 'Renamed'}},
+        'changelog': {'id': changelog_id, 'items': [{'field': 'status', 'fromString': 'Open', 'toString': 'In Progress'}]},
+    }
+
+def comment_event(issue: str, webhook_event: str, updated: str = '2024-05-01T12:00:00.000+0000') -> dict:
+    return {
+        'timestamp': 1714564800000,
+        'webhookEvent': webhook_event,
+        'issue': {'key': issue},
+        'comment': {
+            'id': '200',
+            'author': {'displayName': 'Someone', 'emailAddress': 'someone@example.com'},
+            'created': '2024-05-01T12:00:00.000+0000',
+            'updated': updated,
+        },
+    }
+
+
+class WebhookInboxTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.storage = TestSQLStorage(AlembicSQLInitializer(Base.metadata))
+        await self.storage.set_up()
+        await self.storage.clean_up()
+        now = datetime.now()
+        await self.storage.save_request(entities.Request(issue='ABC-1', requested=now - timedelta(hours=1), result={}))
+        await self.storage.save_issue_data(entities.IssueData(
+            issue='ABC-1',
+            history={'items': [], 'comments': []},
+            issue_id=0,
+            project_id=0,
+            summary='Original',
+            computed=now - timedelta(minutes=30),
+            created=now - timedelta(days=1),
+            created_by='Someone',
+        ))
+        self.fetched = []
+        self.inbox = WebhookInbox(self.get_storage, self.fetch, window=0.05)
+
+    async def get_storage(self) -> TestSQLStorage:
+        return self.storage
+
+    async def fetch(self, issue: str) -> None:
+        self.fetched.append(issue)
+
+    async def test_applies_changelog_to_latest_issue_data(self) -> None:
+        self.assertEqual(WebhookInbox.APPLIED, await self.inbox.receive(issue_updated('ABC-1'), 'delivery-1'))
+
+        issue_data = await self.storage.get_issue_data('ABC-1')
+        self.assertEqual('Renamed', issue_data.summary)
+        self.assertEqual([Item(
+            byEmailAddress='someone@example.com',
+            byDisplayName='Someone',
+            created=datetime.fromtimestamp(1714564800).astimezone(),
+            actions=[Action(field='status', toString='In Progress', fromString='Open')],
+            id=100,
+        )], issue_data.history['items'])
+        self.inbox.join()
+        self.assertEqual([], self.fetched)
+
+    async def test_applies_comments(self) -> None:
+        self.assertEqual(WebhookInbox.APPLIED, await self.inbox.receive(comment_event('ABC-1', 'comment_created')))
+        self.assertEqual(WebhookInbox.APPLIED, await self.inbox.receive(
+            comment_event('ABC-1', 'comment_updated', updated='2024-05-02T12:00:00.000+0000')
+        ))
+
+        comments = (await self.storage.get_issue_data('ABC-1')).history['comments']
+        self.assertEqual([200], [comment.id for comment in comments])
+        self.assertEqual(datetime.fromisoformat('2024-05-02T12:00:00+00:00'), comments[0].updated.astimezone())
+        self.assertIsNone(comments[0].updated.tzinfo)
+
+    async def test_comment_timeline_starts_at_comment(self) -> None:
+        event = comment_event('ABC-1', 'comment_created')
+        event['comment']['created'] = '2024-05-01T14:00:00.000+0200'
+        await self.inbox.receive(event)
+
+        issue_data = await self.storage.get_issue_data('ABC-1')
+        timelines = [
+            timeline for timeline in calculate_timelines(issue_data, 'Someone')
+            if timeline.type == entities.Timeline.TYPE_WRITING_COMMENT
+        ]
+        self.assertEqual([datetime.fromisoformat('2024-05-01T12:00:00+00:00')], [timeline.start for timeline in timelines])
+
+    async def test_skips_changelog_already_known_by_id(self) -> None:
+        await self.inbox.receive(issue_updated('ABC-1'), 'delivery-1')
+        redelivered = issue_updated('ABC-1')
+        redelivered['timestamp'] += 1000
+
+        self.assertEqual(WebhookInbox.APPLIED, await self.inbox.receive(redelivered, 'delivery-2'))
+        self.assertEqual(1, len((await self.storage.get_issue_data('ABC-1')).history['items']))
+
+    async def test_drops_duplicate_deliveries(self) -> None:
+        await self.inbox.receive(issue_updated('ABC-1'), 'delivery-1')
+        self.assertEqual(WebhookInbox.DUPLICATE, await self.inbox.receive(issue_updated('ABC-1', '101'), 'delivery-1'))
+        self.assertEqual(WebhookInbox.DUPLICATE, await self.inbox.receive(issue_updated('ABC-1')))
+
+        self.assertEqual(1, len((await self.storage.get_issue_data('ABC-1')).history['items']))
+
+    async def test_coalesces_fetches(self) -> None:
+        self.assertEqual(WebhookInbox.SCHEDULED, await self.inbox.receive(issue_updated('ABC-2', '100')))
+        self.assertEqual(WebhookInbox.COALESCED, await self.inbox.receive(issue_updated('ABC-2', '101')))
+        self.assertEqual(WebhookInbox.SCHEDULED, await self.inbox.receive(comment_event('ABC-1', 'comment_deleted')))
+        self.inbox.join()
+
+        self.assertEqual(['ABC-2', 'ABC-1'], self.fetched)
+        self.assertEqual(WebhookInbox.SCHEDULED, await self.inbox.receive(issue_updated('ABC-2', '102')))
+        self.inbox.join()
+        self.assertEqual(['ABC-2', 'ABC-1', 'ABC-2'], self.fetched)
+
+    async def test_ignores_other_events(self) -> None:
+        self.assertEqual(WebhookInbox.IGNORED, await self.inbox.receive({'webhookEvent': 'jira:issue_deleted', 'issue': {'key': 'ABC-1'}}))
+        self.assertEqual(WebhookInbox.IGNORED, await self.inbox.receive({'webhookEvent': 'jira:issue_updated'}))
+
+    async def test_retries_delivery_that_failed(self) -> None:
+        storage, self.storage = self.storage, None
+        with self.assertRaises(AttributeError):
+            await self.inbox.receive(issue_updated('ABC-1'), 'delivery-1')
+
+        self.storage = storage
+        self.assertEqual(WebhookInbox.APPLIED, await self.inbox.receive(issue_updated('ABC-1'), 'delivery-1'))
+        self.assertEqual(1, len((await self.storage.get_issue_data('ABC-1')).history['items']))